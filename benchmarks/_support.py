@@ -0,0 +1,196 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+# Shared helpers for the benchmarks. These let pyfindvs be imported and
+# driven on machines without Visual Studio (including Linux) by
+# providing fake discovery results and a stand-in msbuild executable.
+
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+def install_fake_helper():
+    '''Makes pyfindvs importable when the _helper extension has not been
+    built, such as on Linux. Returns True if the fake was installed.'''
+    try:
+        import pyfindvs._helper
+        return False
+    except ImportError:
+        pass
+    helper = types.ModuleType('pyfindvs._helper')
+    helper.findall = lambda: []
+    helper.getversion = lambda path: '0.0.0.0'
+    sys.modules['pyfindvs._helper'] = helper
+    return True
+
+_STANDIN_MSBUILD = '''
+import re, sys
+# Stand-in for msbuild.exe: echoes one line per compiled source and a
+# warning for every tenth, like MSBuild's minimal verbosity output.
+project = sys.argv[-1]
+with open(project, 'r', encoding='utf-8') as f:
+    sources = re.findall(r'<(?:\\w+:)?ClCompile Include="([^"]+)"', f.read())
+out = sys.stdout
+for i, s in enumerate(sources):
+    out.write(s.rpartition('\\\\')[2].rpartition('/')[2] + '\\n')
+    if i % 10 == 9:
+        out.write('{}(1): warning C4100: unreferenced parameter [{}]\\n'.format(s, project))
+out.write('  spam.vcxproj -> spam.pyd\\n')
+'''
+
+def write_standin_msbuild(directory):
+    '''Writes a stand-in msbuild executable to *directory* and returns
+    its path.'''
+    script = os.path.join(directory, 'standin_msbuild.py')
+    with open(script, 'w', encoding='utf-8') as f:
+        f.write(_STANDIN_MSBUILD)
+    if sys.platform == 'win32':
+        exe = os.path.join(directory, 'msbuild.bat')
+        with open(exe, 'w') as f:
+            f.write('@"{}" "{}" %*\n'.format(sys.executable, script))
+    else:
+        exe = os.path.join(directory, 'msbuild')
+        with open(exe, 'w') as f:
+            f.write('#!{}\n'.format(sys.executable))
+            f.write(_STANDIN_MSBUILD)
+        os.chmod(exe, 0o755)
+    return exe
+
+def fake_instances(msbuild):
+    '''Returns discovery results for a Visual Studio 2017 install whose
+    msbuild is *msbuild*, and a Windows 10 SDK.'''
+    from pyfindvs import VisualStudioInstance, WindowsSDKInstance
+    vc = 'C:\\VS\\VC\\Tools\\MSVC\\14.16.27023\\bin\\'
+    known_paths = {'msbuild.exe': msbuild}
+    for tool in ('cl.exe', 'link.exe', 'lib.exe'):
+        known_paths[tool] = vc + 'HostX86\\x86\\' + tool
+        known_paths[tool + '_x64'] = vc + 'HostX64\\x64\\' + tool
+    vs = VisualStudioInstance(
+        'bench', 'Visual Studio Build Tools 2017', '15.9.28307.0', 'C:\\VS',
+        ['Microsoft.Build', 'Microsoft.VisualCpp.Tools.HostX86.TargetX86',
+         'Microsoft.VisualCpp.Tools.HostX86.TargetX64'],
+        known_paths,
+    )
+    sdk = WindowsSDKInstance(
+        'winsdk10', 'Windows 10 SDK', '10.0.17763.0', 'C:\\SDK', ['WinSDK'],
+        {'WinSDK.um': 'C:\\SDK\\Include\\10.0.17763.0\\um'},
+    )
+    return [vs, sdk]
+
+def patch_discovery(instances):
+    '''Makes MSBuildCompiler.initialize() use *instances*.'''
+    import pyfindvs
+    import pyfindvs.msbuildcompiler.compiler as compiler
+    sdks = [i for i in instances if isinstance(i, pyfindvs.WindowsSDKInstance)]
+    installs = [i for i in instances if i not in sdks]
+    def findfirst(*components, require_all=False, predicate=None, cache_in_background=True):
+        return next((i for i in installs
+                     if pyfindvs._matches(i, set(components), require_all, predicate)), None)
+    index = types.SimpleNamespace(instances=lambda: list(sdks))
+    compiler.findfirst = findfirst
+    compiler._find_winsdk = types.SimpleNamespace(index=lambda reset_cache=False: index)
+
+class IOCounter:
+    '''Counts files opened for reading and writing through an audit
+    hook. Audit hooks cannot be removed, so one counter is installed per
+    process and toggled with start() and stop().'''
+
+    _installed = None
+
+    def __init__(self):
+        self.active = False
+        self.reset()
+
+    @classmethod
+    def get(cls):
+        if cls._installed is None:
+            cls._installed = cls()
+            sys.addaudithook(cls._installed._hook)
+        return cls._installed
+
+    def reset(self):
+        self.reads = 0
+        self.writes = 0
+        self.written = set()
+
+    def _hook(self, event, args):
+        if not self.active or event != 'open':
+            return
+        path, mode, flags = args
+        if not isinstance(path, str):
+            return
+        if mode is None:
+            writing = bool(flags & (os.O_WRONLY | os.O_RDWR))
+        else:
+            writing = any(c in mode for c in 'wax+')
+        if writing:
+            self.writes += 1
+            self.written.add(path)
+        else:
+            self.reads += 1
+
+    def start(self):
+        self.reset()
+        self.active = True
+
+    def stop(self):
+        self.active = False
+        size = 0
+        for p in self.written:
+            try:
+                size += os.path.getsize(p)
+            except OSError:
+                pass
+        return {'files_read': self.reads, 'files_written': self.writes, 'bytes_written': size}
+
+def measure(func, *, allocations=True):
+    '''measure(func, *, allocations=True) -> dict
+
+    Calls *func* and returns its wall time, file I/O and, when
+    *allocations* is true, the peak size of Python allocations. *func*
+    may return a dict of additional measurements. Allocations are traced
+    in a separate call so that tracing does not affect the timing.
+    '''
+    io = IOCounter.get()
+    io.start()
+    start = time.perf_counter()
+    extra = func() or {}
+    r = {'seconds': time.perf_counter() - start}
+    r.update(io.stop())
+    r.update(extra)
+    if allocations:
+        tracemalloc.start()
+        try:
+            func()
+            r['alloc_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return r
+
+def environment():
+    return {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def write_results(results, file=None):
+    data = json.dumps({'environment': environment(), 'results': results}, indent=1)
+    if file:
+        with open(file, 'w', encoding='utf-8') as f:
+            f.write(data)
+    else:
+        print(data)
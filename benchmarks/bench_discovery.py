@@ -0,0 +1,82 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+# Measures discovery of Visual Studio instances from the installer's
+# state files with _find_vs2017. A fixture _Instances directory is
+# generated with state files shaped like the installer's, so this runs
+# anywhere, including Linux.
+#
+#   python benchmarks/bench_discovery.py [--instances 4] [--packages 1500] [--output results.json]
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from _support import measure, write_results
+
+import pyfindvs._find_vs2017 as find_vs2017
+
+def write_fixture(directory, instances, packages):
+    '''Writes *instances* state files, each listing *packages* packages,
+    under *directory*.'''
+    for i in range(instances):
+        instance_id = '{:08x}'.format(0x5a6b7c00 + i)
+        state = {
+            'installationName': 'VisualStudio/15.9.{}+28307.222'.format(i),
+            'installationPath': 'C:\\Program Files (x86)\\Microsoft Visual Studio\\2017\\Edition{}'.format(i),
+            'installationVersion': '15.9.28307.{}'.format(222 + i),
+            'launchParams': {'fileName': 'Common7\\IDE\\devenv.exe'},
+            'catalogInfo': {'id': 'VisualStudio/15.9.{}'.format(i), 'productName': 'Visual Studio'},
+            'localizedResources': [
+                {'language': 'de-de', 'title': 'Visual Studio Build Tools 2017'},
+                {'language': 'en-us', 'title': 'Visual Studio Build Tools 2017',
+                 'description': 'The Visual Studio Build Tools allows you to build native and managed applications.'},
+            ],
+            'packages': [
+                {'id': 'Microsoft.Package.{}'.format(p), 'version': '15.9.28307.{}'.format(p),
+                 'type': 'Vsix', 'chip': 'x64', 'language': 'en-US'}
+                for p in range(packages)
+            ] + [{'id': 'Microsoft.Build', 'version': '15.9.21', 'type': 'Msi'}],
+        }
+        os.makedirs(os.path.join(directory, instance_id), exist_ok=True)
+        with open(os.path.join(directory, instance_id, 'state.json'), 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure discovery from installer state files')
+    parser.add_argument('--output', help='write JSON results to this file instead of stdout')
+    parser.add_argument('--instances', type=int, default=4, help='number of instances in the fixture')
+    parser.add_argument('--packages', type=int, default=1500, help='packages listed by each instance')
+    parser.add_argument('--repeat', type=int, default=5, help='number of times to run discovery')
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='pyfindvs-bench-instances-')
+    try:
+        write_fixture(directory, args.instances, args.packages)
+        results = []
+        for _ in range(args.repeat):
+            def cold():
+                find_vs2017._cache.clear()
+                return {'instances_found': len(find_vs2017.findall(directory))}
+            def warm():
+                return {'instances_found': len(find_vs2017.findall(directory))}
+            for name, func in (('cold', cold), ('warm', warm)):
+                r = measure(func)
+                r.update(name=name, instances=args.instances, packages=args.packages)
+                results.append(r)
+        for r in results:
+            print('{name:<5} {seconds:8.4f}s {instances_found:3} instances {files_read:4} files read '
+                  '{alloc_peak_bytes:11,} peak bytes'.format(**r), file=sys.stderr)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    write_results(results, args.output)
+
+if __name__ == '__main__':
+    main()
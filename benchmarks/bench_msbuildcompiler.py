@@ -0,0 +1,147 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+# Measures the time MSBuildCompiler spends in Python for each build:
+# copying options, merging them into the project, writing the project
+# and handling MSBuild's output. Builds run end-to-end against a
+# stand-in msbuild executable with fake discovery results, so this runs
+# anywhere, including Linux.
+#
+#   python benchmarks/bench_msbuildcompiler.py [--quick] [--output results.json]
+#
+# Results are written as JSON. 'msbuild_seconds' is the lifetime of the
+# stand-in msbuild process and 'overhead_seconds' is everything else.
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from _support import (install_fake_helper, fake_instances, measure, patch_discovery,
+                      write_results, write_standin_msbuild)
+
+install_fake_helper()
+
+import distutils.log
+import pyfindvs.msbuildcompiler.compiler as compiler
+from pyfindvs.msbuildcompiler import MSBuildCompiler
+
+class _TimedPopen(subprocess.Popen):
+    total = 0.0
+
+    def __init__(self, *args, **kwargs):
+        self._started = time.perf_counter()
+        super().__init__(*args, **kwargs)
+
+    def wait(self, timeout=None):
+        r = super().wait(timeout)
+        if self._started is not None:
+            type(self).total += time.perf_counter() - self._started
+            self._started = None
+        return r
+
+class _SubprocessProxy:
+    Popen = _TimedPopen
+
+    def __getattr__(self, name):
+        return getattr(subprocess, name)
+
+def _make_sources(directory, count):
+    os.makedirs(directory, exist_ok=True)
+    sources = []
+    for i in range(count):
+        s = os.path.join(directory, 'source{}.c'.format(i))
+        if not os.path.isfile(s):
+            with open(s, 'w') as f:
+                f.write('int f{}(void) {{ return {}; }}\n'.format(i, i))
+        sources.append(s)
+    return sources
+
+class Scenario:
+    def __init__(self, name, extensions, sources, include_dirs=0, macros=0):
+        self.name = name
+        self.extensions = extensions
+        self.sources = sources
+        self.include_dirs = include_dirs
+        self.macros = macros
+
+    def run(self, workdir):
+        src = _make_sources(os.path.join(workdir, 'src'), self.sources)
+        include_dirs = [os.path.join(workdir, 'include', str(i)) for i in range(self.include_dirs)]
+        macros = [('MACRO_{}'.format(i), str(i)) for i in range(self.macros)]
+        build = os.path.join(workdir, 'build')
+
+        def build_all():
+            shutil.rmtree(build, ignore_errors=True)
+            _TimedPopen.total = 0.0
+            # One compiler is shared by every extension, as in build_ext
+            cc = MSBuildCompiler()
+            cc.initialize('win-amd64')
+            for e in range(self.extensions):
+                temp = os.path.join(build, 'temp', 'ext{}'.format(e))
+                objects = cc.compile(src, output_dir=temp, macros=macros, include_dirs=include_dirs)
+                cc.link('shared_object', objects, os.path.join(build, 'ext{}.pyd'.format(e)),
+                        build_temp=temp)
+            return {'msbuild_seconds': _TimedPopen.total}
+
+        r = measure(build_all)
+        r['overhead_seconds'] = r['seconds'] - r['msbuild_seconds']
+        r['overhead_per_extension_ms'] = 1000 * r['overhead_seconds'] / self.extensions
+        r.update(name=self.name, extensions=self.extensions, sources=self.sources,
+                 include_dirs=self.include_dirs, macros=self.macros)
+        return r
+
+SCENARIOS = [
+    Scenario('sources-1', 1, 1),
+    Scenario('sources-10', 1, 10),
+    Scenario('sources-100', 1, 100),
+    Scenario('sources-1000', 1, 1000),
+    Scenario('sources-5000', 1, 5000),
+    Scenario('large-options', 1, 100, include_dirs=500, macros=1000),
+    Scenario('many-extensions', 50, 10, include_dirs=20, macros=20),
+]
+
+QUICK = {'sources-1', 'sources-100', 'large-options'}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the Python-side cost of MSBuildCompiler builds')
+    parser.add_argument('--output', help='write JSON results to this file instead of stdout')
+    parser.add_argument('--quick', action='store_true', help='run a small subset of scenarios')
+    parser.add_argument('--scenario', action='append', help='run only the named scenarios')
+    parser.add_argument('--repeat', type=int, default=1, help='number of times to run each scenario')
+    args = parser.parse_args(argv)
+
+    scenarios = SCENARIOS
+    if args.scenario:
+        scenarios = [s for s in scenarios if s.name in args.scenario]
+    elif args.quick:
+        scenarios = [s for s in scenarios if s.name in QUICK]
+
+    # Output is still handled, but not printed
+    distutils.log.set_threshold(distutils.log.FATAL)
+    workdir = tempfile.mkdtemp(prefix='pyfindvs-bench-')
+    try:
+        patch_discovery(fake_instances(write_standin_msbuild(workdir)))
+        compiler.subprocess = _SubprocessProxy()
+        results = []
+        for s in scenarios:
+            for _ in range(args.repeat):
+                r = s.run(os.path.join(workdir, s.name))
+                print('{name:<18} {seconds:8.3f}s total {overhead_seconds:8.3f}s overhead '
+                      '{files_written:5} files written {alloc_peak_bytes:11,} peak bytes'.format(**r),
+                      file=sys.stderr)
+                results.append(r)
+    finally:
+        compiler.subprocess = subprocess
+        shutil.rmtree(workdir, ignore_errors=True)
+    write_results(results, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+# Measures indexing a Windows Kits root with _find_winsdk.SDKIndex. A
+# synthetic tree with the directory layout (but not the contents) of
+# several Windows 10 SDKs is generated, so this runs anywhere, including
+# Linux.
+#
+#   python benchmarks/bench_winsdk.py [--versions 6] [--headers 2000] [--output results.json]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+from _support import install_fake_helper, measure, write_results
+
+install_fake_helper()
+
+from pyfindvs._find_winsdk import SDKIndex, _TOOLS
+
+# Versions before 10.0.15063 kept their tools in the unversioned bin
+_VERSIONS = ['10.0.10240.0', '10.0.10586.0', '10.0.14393.0', '10.0.15063.0',
+             '10.0.16299.0', '10.0.17134.0', '10.0.17763.0', '10.0.18362.0']
+
+def _touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+
+def make_tree(root, versions, headers):
+    for i, version in enumerate(versions):
+        for part in ('ucrt', 'um', 'shared', 'winrt'):
+            for h in range(headers // 4):
+                _touch(os.path.join(root, 'Include', version, part, 'h{}.h'.format(h)))
+        for part in ('ucrt', 'um'):
+            for arch in ('x86', 'x64', 'arm', 'arm64'):
+                for l in range(headers // 20):
+                    _touch(os.path.join(root, 'Lib', version, part, arch, 'l{}.lib'.format(l)))
+        bin_dir = os.path.join(root, 'bin', version) if i >= 3 else os.path.join(root, 'bin')
+        for arch in ('x86', 'x64', 'arm64'):
+            for tool in _TOOLS:
+                _touch(os.path.join(bin_dir, arch, tool))
+            for t in range(headers // 20):
+                _touch(os.path.join(bin_dir, arch, 'tool{}.exe'.format(t)))
+    # Not a version, and must not be reported as one
+    _touch(os.path.join(root, 'Include', 'wdf', 'kmdf', 'wdf.h'))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure indexing of a Windows Kits root')
+    parser.add_argument('--output', help='write JSON results to this file instead of stdout')
+    parser.add_argument('--versions', type=int, default=6, help='number of SDK versions in the tree')
+    parser.add_argument('--headers', type=int, default=2000, help='files in each Include directory')
+    parser.add_argument('--repeat', type=int, default=5, help='number of times to index the tree')
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix='pyfindvs-bench-winsdk-')
+    try:
+        make_tree(root, _VERSIONS[:args.versions], args.headers)
+        results = []
+        for _ in range(args.repeat):
+            def scan():
+                index = SDKIndex.scan(root)
+                return {'versions_found': len(index)}
+            r = measure(scan)
+            r.update(name='scan', versions=args.versions, headers=args.headers)
+            results.append(r)
+
+            index = SDKIndex.scan(root)
+            r = measure(lambda: {'views': len([index.instance(v) for v in index.versions])})
+            r.update(name='views', versions=args.versions, headers=args.headers)
+            results.append(r)
+        for r in results:
+            print('{name:<6} {seconds:8.4f}s {files_read:5} files read {alloc_peak_bytes:11,} peak bytes'
+                  .format(**r), file=sys.stderr)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    write_results(results, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -10,9 +10,20 @@ __version__ = '0.4.0'
 
 import glob
 import os.path
-from ._helper import findall as _findall
+import threading
+import time
 
-__all__ = ['VisualStudioInstance', 'findall', 'findwithall', 'findwithany']
+from . import metrics
+
+try:
+    from ._helper import findall as _findall
+except ImportError:
+    # The native helper is only needed when the installer's state files
+    # cannot be read
+    _findall = None
+
+__all__ = ['VisualStudioInstance', 'findall', 'findfirst', 'findwithall', 'findwithany',
+           'iterinstances']
 
 def _make_versioninfo(version):
     r = []
@@ -77,10 +88,19 @@ class VisualStudioInstance:
         self.version_info = _make_versioninfo(version)
         self.path = path.rstrip('\\/')
         self.packages = frozenset(packages)
-        if known_paths:
-            self.known_paths = dict(known_paths)
-        else:
-            self.known_paths = _get_known_paths(path, self.version_info, self.packages)
+        self._known_paths = dict(known_paths) if known_paths else None
+
+    @property
+    def known_paths(self):
+        # Searching for the paths is deferred until they are needed, so
+        # that discovery does not pay for instances that are not used
+        if self._known_paths is None:
+            self._known_paths = _get_known_paths(self.path, self.version_info, self.packages)
+        return self._known_paths
+
+    @known_paths.setter
+    def known_paths(self, value):
+        self._known_paths = value
 
     def __repr__(self):
         return "<{} at {}>".format(type(self).__name__, self.path)
@@ -92,6 +112,83 @@ class WindowsSDKInstance(VisualStudioInstance):
     pass
 
 _findall_cache = None
+_findall_lock = threading.RLock()
+_background = None
+
+_CACHE_LOOKUPS = metrics.REGISTRY.counter(
+    'pyfindvs_findall_cache', 'Discovery requests by whether cached instances were used')
+_DISCOVERY_SECONDS = metrics.REGISTRY.histogram(
+    'pyfindvs_discovery_seconds',
+    'Time taken to find every installed instance (scan="all") or the first match (scan="first")')
+
+def _iter_vs2017():
+    import pyfindvs._find_vs2017
+    directory = pyfindvs._find_vs2017.instances_dir()
+    if directory and os.path.isdir(directory):
+        for r in pyfindvs._find_vs2017.iterstates(directory):
+            yield VisualStudioInstance(*r)
+    elif _findall is not None:
+        try:
+            records = _findall()
+        except OSError:
+            records = []
+        for r in records:
+            yield VisualStudioInstance(*r)
+
+def _providers():
+    # In priority order: Visual Studio 2017 and later, Visual Studio 2015,
+    # then the Windows SDKs
+    import pyfindvs._find_vs2015, pyfindvs._find_winsdk
+    return [_iter_vs2017, pyfindvs._find_vs2015.findall, pyfindvs._find_winsdk.findall]
+
+def _scan():
+    for provider in _providers():
+        yield from provider()
+
+def _wait_for_background():
+    if _background is not None and _background is not threading.current_thread():
+        _background.join()
+
+def iterinstances(reset_cache=False):
+    '''iterinstances(reset_cache=False) -> iterator of VisualStudioInstance
+
+    Yields installed instances as they are found: Visual Studio 2017 and
+    later first, then Visual Studio 2015, then the Windows SDKs. When
+    iteration completes, the instances are cached for findall(). No lock
+    is held while the caller has an instance, so other discovery is not
+    blocked by an unfinished iterator.
+
+    Pass True for *reset_cache* to scan installed instances again.
+    Otherwise, cached information may be returned.
+    '''
+    global _findall_cache
+    # A scan that findfirst() is completing in the background finishes
+    # first, so that it cannot replace the cache after a reset
+    _wait_for_background()
+    with _findall_lock:
+        r = list(_findall_cache or ())
+    if r and not reset_cache:
+        _CACHE_LOOKUPS.inc(result='hit')
+        yield from r
+        return
+    _CACHE_LOOKUPS.inc(result='miss')
+    start = time.perf_counter()
+    found = []
+    for inst in _scan():
+        found.append(inst)
+        yield inst
+    _DISCOVERY_SECONDS.observe(time.perf_counter() - start, scan='all')
+    with _findall_lock:
+        _findall_cache = found
+
+def _complete_cache(found, scan, start):
+    # Continues the scan that findfirst() stopped, keeping the instances
+    # it had already found
+    global _findall_cache
+    with _findall_lock:
+        found.extend(scan)
+        _DISCOVERY_SECONDS.observe(time.perf_counter() - start, scan='all')
+        _findall_cache = found
 
 def findall(reset_cache=False):
     '''findall(reset_cache=False) -> list[VisualStudioInstance]
@@ -101,18 +198,54 @@ def findall(reset_cache=False):
     Pass True for *reset_cache* to scan installed instances again.
     Otherwise, cached information may be returned.
     '''
-    global _findall_cache
-    r = _findall_cache
-    if not r or reset_cache:
-        try:
-            r = [VisualStudioInstance(*v) for v in _findall()]
-        except OSError:
-            r = []
-        import pyfindvs._find_vs2015, pyfindvs._find_winsdk
-        r.extend(pyfindvs._find_vs2015.findall())
-        r.extend(pyfindvs._find_winsdk.findall())
-        _findall_cache = r
-    return r
+    return list(iterinstances(reset_cache))
+
+def _matches(vs, components, require_all, predicate):
+    if components:
+        matched = components & vs.packages
+        if not matched or (require_all and len(matched) != len(components)):
+            return False
+    return predicate is None or predicate(vs)
+
+def findfirst(*components, require_all=False, predicate=None, cache_in_background=True):
+    '''findfirst(*components, require_all=False, predicate=None, cache_in_background=True)
+        -> VisualStudioInstance or None
+
+    Returns the first instance, in iterinstances() order, with any of the
+    specified packages installed (or all of them, if *require_all* is
+    True) for which *predicate* returns True. Discovery stops as soon as
+    a match is found. If *cache_in_background* is True, the remaining
+    instances are then found in a background thread and cached, with
+    those already found, for findall().
+    '''
+    global _background, _findall_cache
+    components = set(components)
+    _wait_for_background()
+    with _findall_lock:
+        if _findall_cache:
+            _CACHE_LOOKUPS.inc(result='hit')
+            return next((vs for vs in _findall_cache
+                         if _matches(vs, components, require_all, predicate)), None)
+        _CACHE_LOOKUPS.inc(result='miss')
+        start = time.perf_counter()
+        found = []
+        scan = _scan()
+        for vs in scan:
+            found.append(vs)
+            if _matches(vs, components, require_all, predicate):
+                break
+        else:
+            _DISCOVERY_SECONDS.observe(time.perf_counter() - start, scan='all')
+            _findall_cache = found
+            return None
+        _DISCOVERY_SECONDS.observe(time.perf_counter() - start, scan='first')
+        if cache_in_background:
+            _background = threading.Thread(target=_complete_cache, args=(found, scan, start),
+                                           name='pyfindvs-findall', daemon=True)
+            _background.start()
+        else:
+            scan.close()
+        return vs
 
 def findwithall(*components):
     '''findwithall(*components) -> list[VisualStudioInstance]
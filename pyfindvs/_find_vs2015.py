@@ -7,8 +7,6 @@
 
 import os.path
 from . import VisualStudioInstance, _join_and_glob, _PACKAGE_MAP
-from ._helper import getversion
-from .reghelper import HKLM_32
 
 _VS2015_KEYS = [
     # We include msenv.dll to find the version number, but remove it before returning
@@ -30,6 +28,13 @@ for tool in ['cl.exe', 'link.exe', 'lib.exe']:
     ])
 
 def findall():
+    try:
+        from ._helper import getversion
+        from .reghelper import HKLM_32
+    except ImportError:
+        # The registry and the native helper are only available on Windows
+        return []
+
     known_paths = {}
     value_cache = {}
     with HKLM_32[r'Software\Microsoft'] as root:
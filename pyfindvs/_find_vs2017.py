@@ -0,0 +1,107 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+# Reads Visual Studio 2017 and later instances from the installer's
+# state files, without the Setup Configuration COM server. Each instance
+# has a directory named by its instance ID under
+# %ProgramData%\Microsoft\VisualStudio\Packages\_Instances containing a
+# state.json file.
+
+import json
+import os
+from . import VisualStudioInstance
+
+_INSTANCES_SUBDIR = os.path.join('Microsoft', 'VisualStudio', 'Packages', '_Instances')
+
+_STATE_FILE = 'state.json'
+
+_DEFAULT_LANGUAGE = 'en-us'
+
+# state.json path -> ((mtime_ns, size), record)
+_cache = {}
+
+def instances_dir():
+    '''Returns the directory containing the instance state directories,
+    or None if %ProgramData% is not set.'''
+    program_data = os.getenv('ProgramData')
+    return os.path.join(program_data, _INSTANCES_SUBDIR) if program_data else None
+
+def _display_name(data):
+    resources = data.get('localizedResources') or []
+    for r in resources:
+        if (r.get('language') or '').lower() == _DEFAULT_LANGUAGE and r.get('title'):
+            return r['title']
+    for r in resources:
+        if r.get('title'):
+            return r['title']
+    return (data.get('catalogInfo') or {}).get('productName') or 'Visual Studio'
+
+def read_state(file, instance_id=None):
+    '''read_state(file, instance_id=None) -> tuple or None
+
+    Returns (instance_id, name, version, path, packages) from a state.json
+    file, as the COM helper does, or None if it does not describe an
+    installed instance. *instance_id* defaults to the name of the
+    directory containing the file.
+    '''
+    with open(file, 'r', encoding='utf-8-sig') as f:
+        data = json.load(f)
+    version = data.get('installationVersion')
+    path = data.get('installationPath')
+    if not version or not path:
+        return None
+    if instance_id is None:
+        instance_id = os.path.basename(os.path.dirname(os.path.abspath(file)))
+    packages = [p['id'] for p in data.get('packages') or () if p.get('id')]
+    return instance_id, _display_name(data), version, path, packages
+
+def _read_cached(file, instance_id):
+    st = os.stat(file)
+    stamp = st.st_mtime_ns, st.st_size
+    cached = _cache.get(file)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    record = read_state(file, instance_id)
+    _cache[file] = stamp, record
+    return record
+
+def iterstates(directory=None):
+    '''iterstates(directory=None) -> iterator of tuple
+
+    Yields the record of each instance under *directory* (defaults to
+    instances_dir()) as its state file is read. Files that have not
+    changed since they were last read are not parsed again.
+    '''
+    directory = directory or instances_dir()
+    if not directory:
+        return
+    try:
+        entries = sorted(os.scandir(directory), key=lambda e: e.name)
+    except OSError:
+        return
+    for e in entries:
+        if not e.is_dir():
+            continue
+        try:
+            record = _read_cached(os.path.join(e.path, _STATE_FILE), e.name)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # Missing, partially written or unrecognized state files
+            continue
+        if record:
+            yield record
+
+def findall(directory=None):
+    '''findall(directory=None) -> list[VisualStudioInstance] or None
+
+    Returns the instances described by the state files under *directory*
+    (defaults to instances_dir()), or None if the directory does not
+    exist.
+    '''
+    directory = directory or instances_dir()
+    if not directory or not os.path.isdir(directory):
+        return None
+    return [VisualStudioInstance(*r) for r in iterstates(directory)]
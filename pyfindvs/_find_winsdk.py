@@ -5,64 +5,174 @@
 # Distributed under the terms of the MIT License
 #-------------------------------------------------------------------------
 
-import os.path
-from . import _join_and_glob, WindowsSDKInstance
-from ._helper import getversion
-from .reghelper import HKLM_32
-
-_WIN10SDK_KEYS = [
-    # Added just for detection purposes, and removed before returning
-    ('WinSDK_Root', r'Windows Kits\Installed Roots', 'KitsRoot10', ''),
-    ('WinSDK_Version', r'Windows Kits\Installed Roots', 'KitsRoot10', r'Include\*'),
-    
-    ('WinSDK.ucrt', r'Windows Kits\Installed Roots', 'KitsRoot10', r'Include\*\ucrt'),
-    ('WinSDK.um', r'Windows Kits\Installed Roots', 'KitsRoot10', r'Include\*\um'),
-    ('WinSDK.shared', r'Windows Kits\Installed Roots', 'KitsRoot10', r'Include\*\shared'),
-    ('WinSDK.libucrt', r'Windows Kits\Installed Roots', 'KitsRoot10', r'Lib\*\ucrt\x86'),
-    ('WinSDK.libucrt_x64', r'Windows Kits\Installed Roots', 'KitsRoot10', r'Lib\*\ucrt\x64'),
-    ('WinSDK.lib', r'Windows Kits\Installed Roots', 'KitsRoot10', r'Lib\*\um\x86'),
-    ('WinSDK.lib_x64', r'Windows Kits\Installed Roots', 'KitsRoot10', r'Lib\*\um\x64'),
-]
-
-for tool in ['rc.exe', 'signtool.exe', 'makecat.exe', 'midl.exe', 'mc.exe']:
-    _WIN10SDK_KEYS.extend([
-        # Old bin was not separated by version
-        (tool, r'Windows Kits\Installed Roots', 'KitsRoot10', 'bin\\x86\\' + tool),
-        (tool + '_x64', r'Windows Kits\Installed Roots', 'KitsRoot10', 'bin\\x64\\' + tool),
-        # Newer bin folder are separated by version
-        (tool, r'Windows Kits\Installed Roots', 'KitsRoot10', 'bin\\*\\x86\\' + tool),
-        (tool + '_x64', r'Windows Kits\Installed Roots', 'KitsRoot10', 'bin\\*\\x64\\' + tool),
-    ])
+import os
+import re
+from . import WindowsSDKInstance, _make_versioninfo
 
-def findall():
+_VERSION_RE = re.compile(r'^\d+(\.\d+)+$')
+
+# Include\<version>\<name>
+_INCLUDE_KEYS = {
+    'ucrt': 'WinSDK.ucrt',
+    'um': 'WinSDK.um',
+    'shared': 'WinSDK.shared',
+}
+
+# Lib\<version>\<name>\<arch>
+_LIB_KEYS = {
+    ('ucrt', 'x86'): 'WinSDK.libucrt',
+    ('ucrt', 'x64'): 'WinSDK.libucrt_x64',
+    ('um', 'x86'): 'WinSDK.lib',
+    ('um', 'x64'): 'WinSDK.lib_x64',
+}
+
+# bin\<arch>\<tool> (before 10.0.15063) or bin\<version>\<arch>\<tool>
+_BIN_ARCH_SUFFIX = {
+    'x86': '',
+    'x64': '_x64',
+}
+
+_TOOLS = ['rc.exe', 'signtool.exe', 'makecat.exe', 'midl.exe', 'mc.exe']
+
+def _entries(path):
+    # Names are matched case-insensitively, as they are on Windows
+    try:
+        with os.scandir(path) as it:
+            return {e.name.lower(): e for e in it}
+    except OSError:
+        return {}
+
+def _subdirs(entries):
+    return {name: e for name, e in entries.items() if e.is_dir()}
+
+def _find_tools(arch_dirs):
     known_paths = {}
-    value_cache = {}
-    with HKLM_32[r'Software\Microsoft'] as root:
-        for key, subkey, value_name, glob in _WIN10SDK_KEYS:
-            try:
-                v = value_cache[subkey, value_name]
-            except KeyError:
-                try:
-                    with root[subkey] as sk:
-                        value_cache[subkey, value_name] = v = sk.get_value(value_name)
-                except OSError:
-                    value_cache[subkey, value_name] = v = None
-
-            if v:
-                path = _join_and_glob(v, glob)
-                if path:
-                    known_paths[key] = path
-
-    root_path = known_paths.pop('WinSDK_Root', None)
-    ver_path = known_paths.pop('WinSDK_Version', None)
-    if not root_path or not ver_path:
-        return []
-
-    return [WindowsSDKInstance(
-        'winsdk10',
-        'Windows 10 SDK',
-        os.path.split(ver_path)[1],
-        root_path,
-        ['WinSDK', 'WinSDK.10'],
-        known_paths
-    )]
+    for arch, suffix in _BIN_ARCH_SUFFIX.items():
+        e = arch_dirs.get(arch)
+        if e is None:
+            continue
+        names = _entries(e.path)
+        for tool in _TOOLS:
+            if tool in names:
+                known_paths[tool + suffix] = names[tool].path
+    return known_paths
+
+class SDKIndex:
+    '''The Windows 10 SDK versions installed under a Windows Kits root.
+
+    The Include, Lib and bin trees are walked once by scan(), and the
+    known_paths of every version are kept, so selecting a version does
+    not touch the file system again. Versions are ordered newest first
+    by their numeric version.
+    '''
+
+    def __init__(self, root):
+        self.root = root
+        self._known_paths = {}
+
+    @classmethod
+    def scan(cls, root):
+        index = cls(root)
+        top = _subdirs(_entries(root))
+
+        includes = {}
+        if 'include' in top:
+            for e in _subdirs(_entries(top['include'].path)).values():
+                if _VERSION_RE.match(e.name):
+                    includes[e.name] = e.path
+
+        bins = _subdirs(_entries(top['bin'].path)) if 'bin' in top else {}
+        # Tools from the unversioned bin directory are used for every
+        # version that does not have its own
+        shared_tools = _find_tools(bins)
+        libs = _subdirs(_entries(top['lib'].path)) if 'lib' in top else {}
+
+        for version, include in includes.items():
+            known_paths = {}
+            components = _subdirs(_entries(include))
+            for name, key in _INCLUDE_KEYS.items():
+                if name in components:
+                    known_paths[key] = components[name].path
+
+            lib = libs.get(version.lower())
+            if lib is not None:
+                components = _subdirs(_entries(lib.path))
+                for (name, arch), key in _LIB_KEYS.items():
+                    if name in components:
+                        path = os.path.join(components[name].path, arch)
+                        if os.path.isdir(path):
+                            known_paths[key] = path
+
+            known_paths.update(shared_tools)
+            if version.lower() in bins:
+                known_paths.update(_find_tools(_subdirs(_entries(bins[version.lower()].path))))
+            index._known_paths[version] = known_paths
+        return index
+
+    @property
+    def versions(self):
+        return sorted(self._known_paths, key=_make_versioninfo, reverse=True)
+
+    @property
+    def latest(self):
+        versions = self.versions
+        return versions[0] if versions else None
+
+    def known_paths(self, version=None):
+        '''Returns the known_paths of *version*, or of the latest version
+        if None. Raises KeyError if the version is not installed.'''
+        return dict(self._known_paths[version or self.latest])
+
+    def instance(self, version=None):
+        '''Returns a WindowsSDKInstance for *version*, or for the latest
+        version if None.'''
+        version = version or self.latest
+        return WindowsSDKInstance(
+            'winsdk10',
+            'Windows 10 SDK',
+            version,
+            self.root,
+            ['WinSDK', 'WinSDK.10'],
+            self.known_paths(version)
+        )
+
+    def instances(self):
+        return [self.instance(v) for v in self.versions]
+
+    def __contains__(self, version):
+        return version in self._known_paths
+
+    def __len__(self):
+        return len(self._known_paths)
+
+    def __repr__(self):
+        return '<{} at {} ({} versions)>'.format(type(self).__name__, self.root, len(self))
+
+def _kits_root():
+    try:
+        from .reghelper import HKLM_32
+    except ImportError:
+        return None
+    try:
+        with HKLM_32[r'Software\Microsoft\Windows Kits\Installed Roots'] as key:
+            return key.get_value('KitsRoot10')
+    except OSError:
+        return None
+
+_index_cache = None
+
+def index(reset_cache=False):
+    '''index(reset_cache=False) -> SDKIndex or None
+
+    Returns the index of the installed Windows 10 SDKs, or None if the
+    Windows Kits root is not registered.
+    '''
+    global _index_cache
+    if _index_cache is None or reset_cache:
+        root = _kits_root()
+        _index_cache = SDKIndex.scan(root) if root else None
+    return _index_cache
+
+def findall():
+    sdks = index(reset_cache=True)
+    return sdks.instances() if sdks else []
@@ -0,0 +1,255 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+# A small in-process registry of counters and histograms for discovery
+# and builds. Recording is disabled by default, in which case updates
+# return immediately. Set PYFINDVS_METRICS=1 or call enable() to record,
+# and set PYFINDVS_METRICS_FILE to also write the metrics to that file
+# when the process exits.
+
+import atexit
+import json
+import math
+import os
+import threading
+import time
+
+__all__ = ['Counter', 'Histogram', 'Registry', 'REGISTRY', 'FORMATS', 'enable', 'is_enabled',
+           'write_at_exit', 'write_textfile']
+
+# Export formats: the Prometheus text format read by textfile collectors,
+# OpenMetrics, and JSON
+FORMATS = ('prometheus', 'openmetrics', 'json')
+
+DEFAULT_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+DEFAULT_BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_enabled = bool(os.getenv('PYFINDVS_METRICS'))
+
+def enable(enabled=True):
+    '''Starts (or, with False, stops) recording metrics.'''
+    global _enabled
+    _enabled = enabled
+
+def is_enabled():
+    return _enabled
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, _escape(v)) for k, v in pairs) + '}'
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+class Counter:
+    '''A count that only increases, kept separately for each set of
+    label values.'''
+
+    type = 'counter'
+
+    def __init__(self, name, help, lock):
+        self.name = name
+        self.help = help
+        self._lock = lock
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        if not _enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def _samples(self):
+        for key, value in sorted(self.values.items()):
+            yield '{}_total{} {}'.format(self.name, _format_labels(key), _format_value(value))
+
+    def to_dict(self):
+        return [{'labels': dict(key), 'value': value} for key, value in sorted(self.values.items())]
+
+class Histogram:
+    '''Counts of observed values in cumulative buckets, with their sum,
+    kept separately for each set of label values.'''
+
+    type = 'histogram'
+
+    def __init__(self, name, help, lock, buckets=DEFAULT_SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self._lock = lock
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.values = {}
+
+    def observe(self, value, **labels):
+        if not _enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0, 0]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        '''Returns a context manager that observes the seconds spent in
+        it, or does nothing when metrics are disabled.'''
+        if not _enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def _cumulative(self, counts):
+        total = 0
+        for bound, count in zip(self.buckets, counts):
+            total += count
+            yield bound, total
+
+    def _samples(self):
+        for key, (counts, total, count) in sorted(self.values.items()):
+            for bound, n in self._cumulative(counts):
+                yield '{}_bucket{} {}'.format(self.name, _format_labels(key, [('le', _format_value(bound))]), n)
+            yield '{}_sum{} {}'.format(self.name, _format_labels(key), _format_value(total))
+            yield '{}_count{} {}'.format(self.name, _format_labels(key), count)
+
+    def to_dict(self):
+        return [{
+            'labels': dict(key),
+            'buckets': {_format_value(bound): n for bound, n in self._cumulative(counts)},
+            'sum': total,
+            'count': count,
+        } for key, (counts, total, count) in sorted(self.values.items())]
+
+class Registry:
+    '''The metrics of a process, by name.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.metrics = {}
+
+    def _get(self, cls, name, help, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help, self._lock, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError("metric '{}' is already a {}".format(name, metric.type))
+        return metric
+
+    def counter(self, name, help):
+        return self._get(Counter, name, help)
+
+    def histogram(self, name, help, buckets=DEFAULT_SECONDS_BUCKETS):
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def reset(self):
+        with self._lock:
+            for metric in self.metrics.values():
+                metric.values.clear()
+
+    def to_text(self, openmetrics=False):
+        '''Returns the metrics in the Prometheus text format, or in the
+        OpenMetrics format if *openmetrics* is True.'''
+        lines = []
+        with self._lock:
+            for name, metric in sorted(self.metrics.items()):
+                # Counter families are named without the _total suffix in
+                # OpenMetrics but with it in the Prometheus format
+                family = name + '_total' if metric.type == 'counter' and not openmetrics else name
+                lines.append('# HELP {} {}'.format(family, metric.help))
+                lines.append('# TYPE {} {}'.format(family, metric.type))
+                lines.extend(metric._samples())
+        if openmetrics:
+            lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        with self._lock:
+            return {name: {'type': m.type, 'help': m.help, 'samples': m.to_dict()}
+                    for name, m in sorted(self.metrics.items())}
+
+REGISTRY = Registry()
+
+def write_textfile(file, format=None, registry=None):
+    '''write_textfile(file, format=None, registry=None)
+
+    Atomically writes the metrics of *registry* (default: REGISTRY) to
+    *file* in *format*, one of FORMATS. The format defaults to 'json'
+    for .json files and 'prometheus' otherwise.
+    '''
+    registry = registry or REGISTRY
+    if format is None:
+        format = 'json' if file.lower().endswith('.json') else 'prometheus'
+    if format == 'json':
+        text = json.dumps(registry.to_dict(), indent=1)
+    elif format in ('prometheus', 'openmetrics'):
+        text = registry.to_text(openmetrics=format == 'openmetrics')
+    else:
+        raise ValueError("unknown metrics format '{}'".format(format))
+    os.makedirs(os.path.dirname(os.path.abspath(file)), exist_ok=True)
+    tmp = '{}.{}.tmp'.format(file, os.getpid())
+    with open(tmp, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(text)
+    os.replace(tmp, file)
+
+_exit_files = []
+
+def write_at_exit(file, format=None):
+    '''Enables metrics and writes them to *file* when the process exits.'''
+    enable()
+    if not _exit_files:
+        atexit.register(_write_exit_files)
+    if (file, format) not in _exit_files:
+        _exit_files.append((file, format))
+
+def _write_exit_files():
+    for file, format in _exit_files:
+        try:
+            write_textfile(file, format)
+        except (OSError, ValueError):
+            pass
+
+if os.getenv('PYFINDVS_METRICS_FILE'):
+    write_at_exit(os.getenv('PYFINDVS_METRICS_FILE'))
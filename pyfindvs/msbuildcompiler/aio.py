@@ -0,0 +1,146 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+from distutils.errors import CCompilerError
+
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import weakref
+
+class BuildTimeoutError(CCompilerError):
+    '''Raised when an asynchronous build does not finish in time. The
+    build's process tree has been terminated.'''
+
+class _Unlimited:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+_semaphores = weakref.WeakKeyDictionary()
+
+# The longest line LineProcess reads. asyncio's default of 64 KiB is
+# exceeded by the command lines in detailed MSBuild logs.
+LINE_LIMIT = 16 * 1024 * 1024
+
+def build_semaphore(limit):
+    '''Returns the semaphore that limits the running event loop to
+    *limit* concurrent builds, or a context manager that does not limit
+    them if *limit* is None.'''
+    if limit is None:
+        return _Unlimited()
+    loop = asyncio.get_running_loop()
+    sems = _semaphores.setdefault(loop, {})
+    sem = sems.get(limit)
+    if sem is None:
+        sem = sems[limit] = asyncio.BoundedSemaphore(limit)
+    return sem
+
+async def kill_process_tree(proc):
+    '''Terminates *proc* and every process it started, such as MSBuild's
+    worker nodes and the compilers they run, then waits for it to exit.'''
+    if proc.returncode is not None:
+        return
+    if sys.platform == 'win32':
+        killer = await asyncio.create_subprocess_exec(
+            'taskkill', '/T', '/F', '/PID', str(proc.pid),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        await killer.wait()
+    else:
+        # The process was started in its own session, so its group
+        # contains all of its descendants
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+    await proc.wait()
+
+class LineProcess:
+    '''Runs *cmd* and iterates over its combined output one line at a
+    time as it is written. If the process does not exit within *timeout*
+    seconds, or the iteration is cancelled or abandoned, the whole
+    process tree is terminated. *returncode* is set once it exits.
+    Lines may be up to *limit* bytes long.
+    '''
+
+    def __init__(self, cmd, timeout=None, env=None, cwd=None, limit=LINE_LIMIT):
+        self.cmd = cmd
+        self.timeout = timeout
+        self.env = env
+        self.cwd = cwd
+        self.limit = limit
+        self.returncode = None
+
+    async def _start(self):
+        if sys.platform == 'win32':
+            kwargs = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            kwargs = {'start_new_session': True}
+        return await asyncio.create_subprocess_exec(
+            *self.cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            env=self.env, cwd=self.cwd, limit=self.limit, **kwargs)
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        deadline = None if self.timeout is None else loop.time() + self.timeout
+        proc = await self._start()
+        try:
+            while True:
+                if deadline is None:
+                    line = await proc.stdout.readline()
+                else:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    line = await asyncio.wait_for(proc.stdout.readline(), remaining)
+                if not line:
+                    break
+                yield line.decode('utf-8', 'replace').rstrip('\r\n')
+            if deadline is None:
+                await proc.wait()
+            else:
+                await asyncio.wait_for(proc.wait(), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            await kill_process_tree(proc)
+            raise BuildTimeoutError("'{}' did not finish within {} seconds".format(
+                os.path.basename(self.cmd[0]), self.timeout)) from None
+        finally:
+            # Cancelled, or the consumer stopped iterating early
+            if proc.returncode is None:
+                await kill_process_tree(proc)
+            self.returncode = proc.returncode
+
+class BuildStream:
+    '''An asynchronous iterator over the output of a build, returned by
+    MSBuildCompiler.stream(). Each item is a Diagnostic for errors and
+    warnings, or the line of output as a str. *result* is the build's
+    BuildResult, which is set before the build starts. Iterating raises
+    CCompilerError if the build fails.
+    '''
+
+    def __init__(self, run):
+        self._run = run
+        self.result = None
+
+    def __aiter__(self):
+        return self._run(self).__aiter__()
+
+    async def wait(self):
+        '''Runs the build to completion without handling its output and
+        returns the BuildResult.'''
+        async for _ in self:
+            pass
+        return self.result
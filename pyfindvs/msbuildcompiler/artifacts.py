@@ -0,0 +1,234 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+from distutils import log
+
+from pyfindvs import metrics
+
+from .cmdline import expand
+from .objcache import _copy_atomic
+from .singleflight import build_fingerprint, relative_path
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+# Bumped whenever the key or entry layout changes
+_CACHE_VERSION = 2
+
+_MANIFEST = 'manifest.json'
+
+# Records when the cache was last evicted
+_EVICT_STAMP = '.evicted'
+
+_LOOKUPS = metrics.REGISTRY.counter(
+    'pyfindvs_artifact_cache', 'Artifact cache lookups, stores and evictions')
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _file_record(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns, _sha256(path)]
+
+def _unchanged(path, record):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if [st.st_size, st.st_mtime_ns] == record[:2]:
+        return True
+    # A copy or touch may leave the contents unchanged
+    return st.st_size == record[0] and _sha256(path) == record[2]
+
+class ArtifactCache:
+    '''A local cache of linked extensions, shared between environments.
+
+    Entries are keyed on the generated project, the contents of its
+    sources and the toolchain identity, and hold the output with its PDB
+    and import library. Each entry also records the headers that were
+    included when it was built, and is only used while they are
+    unchanged. Paths under the directories in a *roots* dict of names to
+    paths, such as the source root, are keyed and recorded relative to
+    them, so an entry stored from one checkout or environment is used by
+    another with the same contents. Restored files are copied, or hard
+    linked when *hardlink* is True; a hard linked output that is later
+    rebuilt in place also changes the cached copy, so only use it where
+    outputs are not rebuilt. The cache is evicted to *max_size* at most once every
+    *evict_interval* seconds.
+    '''
+
+    def __init__(self, root, max_size=10 * 1024 ** 3, evict_interval=3600, hardlink=False):
+        self.root = os.path.abspath(root)
+        self.max_size = max_size
+        self.evict_interval = evict_interval
+        self.hardlink = hardlink
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def key(self, t, toolchain, roots=None):
+        '''Returns the cache key for the build described by Template *t*
+        with the strings in *toolchain* identifying the tools.'''
+        return build_fingerprint(t, [_CACHE_VERSION] + list(toolchain), roots=roots)
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _restore(self, src, dest):
+        # Linkers update PDBs in place, so they are always copied
+        if self.hardlink and not dest.lower().endswith('.pdb'):
+            tmp = '{}.{}.tmp'.format(dest, uuid.uuid4().hex)
+            try:
+                os.link(src, tmp)
+                os.replace(tmp, dest)
+                return
+            except OSError:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+        _copy_atomic(src, dest)
+
+    def fetch(self, key, dest_dir, roots=None):
+        '''fetch(key, dest_dir, roots=None) -> list or None
+
+        Restores the files cached for *key* into *dest_dir* and returns
+        their paths, or returns None if there is no entry or a header it
+        was built with has changed.
+        '''
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, _MANIFEST), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if all(_unchanged(expand(p, roots or {}), r) for p, r in manifest['depends'].items()):
+                # Touch the entry so eviction is least-recently-used
+                os.utime(os.path.join(path, _MANIFEST))
+                os.makedirs(dest_dir, exist_ok=True)
+                restored = []
+                for name in manifest['files']:
+                    restored.append(os.path.join(dest_dir, name))
+                    self._restore(os.path.join(path, name), restored[-1])
+                self.hits += 1
+                _LOOKUPS.inc(result='hit')
+                return restored
+        except (OSError, ValueError, KeyError):
+            pass
+        self.misses += 1
+        _LOOKUPS.inc(result='miss')
+        return None
+
+    def store(self, key, files, depends, roots=None):
+        '''Stores *files* for *key*, recording the contents of the
+        headers in *depends* that the build included.'''
+        path = self._path(key)
+        tmp = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+        try:
+            os.makedirs(tmp)
+            names = []
+            for f in files:
+                names.append(os.path.basename(f))
+                shutil.copyfile(f, os.path.join(tmp, names[-1]))
+            with open(os.path.join(tmp, _MANIFEST), 'w', encoding='utf-8') as f:
+                json.dump({'files': names,
+                           'depends': {relative_path(p, roots): _file_record(p) for p in sorted(set(depends))}},
+                          f, indent=1)
+            if os.path.isdir(path):
+                # Directories cannot be replaced in one rename on Windows
+                self._remove(path)
+            os.rename(tmp, path)
+        except OSError as e:
+            # Another build is storing the same entry, or a header is gone
+            log.debug('unable to store {} in the artifact cache: {}'.format(key, e))
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.stores += 1
+        _LOOKUPS.inc(result='store')
+        self.maybe_evict()
+
+    def _remove(self, path):
+        # Renamed first so that readers never see a partial entry
+        old = '{}.{}.old'.format(path, uuid.uuid4().hex)
+        try:
+            os.rename(path, old)
+        except OSError:
+            return False
+        shutil.rmtree(old, ignore_errors=True)
+        return True
+
+    def _entries(self):
+        try:
+            subdirs = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return
+        for d in subdirs:
+            if not d.is_dir():
+                continue
+            for e in os.scandir(d.path):
+                if not e.is_dir() or e.name.endswith(('.tmp', '.old')):
+                    continue
+                try:
+                    stamp = os.stat(os.path.join(e.path, _MANIFEST)).st_mtime
+                    size = sum(f.stat().st_size for f in os.scandir(e.path))
+                except OSError:
+                    continue
+                yield e.path, stamp, size
+
+    def size(self):
+        return sum(size for _, _, size in self._entries())
+
+    def maybe_evict(self):
+        '''Evicts the cache if it has not been evicted for evict_interval
+        seconds.'''
+        stamp = os.path.join(self.root, _EVICT_STAMP)
+        try:
+            if time.time() - os.stat(stamp).st_mtime < self.evict_interval:
+                return
+        except OSError:
+            pass
+        try:
+            with open(stamp, 'w'):
+                pass
+        except OSError:
+            return
+        self.evict()
+
+    def evict(self, max_size=None):
+        '''Removes the least recently used entries until the cache is no
+        larger than *max_size* (default: the cache's max_size).'''
+        if max_size is None:
+            max_size = self.max_size
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if total <= max_size:
+                break
+            if not self._remove(path):
+                continue
+            total -= size
+            self.evictions += 1
+            _LOOKUPS.inc(result='eviction')
+        return total
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+        }
+
+    def __repr__(self):
+        return '<{} at {}>'.format(type(self).__name__, self.root)
@@ -0,0 +1,508 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+from .options import OptionsBase
+
+import os.path
+import re
+import shlex
+
+_PROPERTY_RE = re.compile(r'\$\((\w+)\)')
+
+def metadata(opts):
+    '''metadata(opts) -> dict
+
+    Returns the non-empty values of an options object as strings, in
+    the same form that they are written to a project file. Mappings
+    (such as item definitions read back from a project) are returned
+    unchanged.
+    '''
+    if not isinstance(opts, OptionsBase):
+        return dict(opts)
+    r = {}
+    for prop_name in dir(opts):
+        if prop_name[0] not in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
+            continue
+        value = getattr(opts, prop_name)
+        value = '' if value is None else str(value)
+        if value and value not in ('%({})'.format(prop_name), '$({})'.format(prop_name)):
+            r[prop_name] = value
+    return r
+
+def expand(value, properties):
+    '''Expands $(Property) references in *value* from *properties*.
+    Unknown properties expand to an empty string, as in MSBuild.'''
+    if not value or '$(' not in value:
+        return value or ''
+    return _PROPERTY_RE.sub(lambda m: properties.get(m.group(1), ''), value)
+
+def object_file(source, metadata, properties):
+    '''Returns the object file that MSBuild would write for *source*
+    with the given ClCompile item metadata.'''
+    obj = expand(metadata.get('ObjectFileName') or '$(IntDir)', properties)
+    if not obj or obj.endswith(('\\', '/')):
+        return obj + os.path.splitext(os.path.basename(source))[0] + '.obj'
+    return obj
+
+def split_list(value, properties=None):
+    '''Splits a ';'-separated option value, dropping inherited
+    %(Metadata) references and empty entries.'''
+    if properties is not None:
+        value = expand(value, properties)
+    return [v.strip() for v in (value or '').split(';')
+            if v.strip() and not v.strip().startswith('%(')]
+
+def split_args(value, properties=None):
+    '''Splits an AdditionalOptions value into separate arguments.'''
+    if properties is not None:
+        value = expand(value, properties)
+    return [a for a in shlex.split(value or '', posix=False) if not a.startswith('%(')]
+
+def is_true(value):
+    return str(value).lower() == 'true'
+
+_COMPILE_AS = {
+    'compileasc': '/TC',
+    'compileascpp': '/TP',
+}
+
+# Arguments that only affect preprocessing, and are not passed when
+# compiling already preprocessed sources
+_PREPROCESS_ARG_PREFIXES = ('/I', '-I', '/D', '-D', '/U', '-U', '/FI', '-FI', '/X', '-X')
+
+def _property_defines(properties):
+    # Definitions MSBuild adds from project properties
+    defines = []
+    charset = properties.get('CharacterSet', '').lower()
+    if charset == 'unicode':
+        defines.extend(['_UNICODE', 'UNICODE'])
+    elif charset == 'multibyte':
+        defines.append('_MBCS')
+    if properties.get('ConfigurationType', '').lower() == 'dynamiclibrary':
+        defines.append('_WINDLL')
+    return defines
+
+# Arguments that only report on the compile, such as timings, and would
+# otherwise add output that varies between runs to preprocessing
+_REPORTING_ARG_PREFIXES = tuple(p + a for p in '/-' for a in (
+    'Bt', 'Bv', 'showIncludes', 'sourceDependencies', 'd1reportTime', 'd2cgsummary',
+    'd1reportAllClassLayout', 'd1reportSingleClassLayout', 'd1templateStats'))
+
+def _preprocess_args(m, props):
+    args = ['/D' + d for d in _property_defines(props)]
+    if is_true(m.get('IgnoreStandardIncludePath')):
+        args.append('/X')
+    if is_true(m.get('UndefineAllPreprocessorDefinitions')):
+        args.append('/u')
+    compile_as = _COMPILE_AS.get(m.get('CompileAs', '').lower())
+    if compile_as:
+        args.append(compile_as)
+    args.extend('/I' + v for v in split_list(m.get('AdditionalIncludeDirectories'), props))
+    args.extend('/D' + v for v in split_list(m.get('PreprocessorDefinitions'), props))
+    args.extend('/U' + v for v in split_list(m.get('UndefinePreprocessorDefinitions'), props))
+    args.extend('/FI' + v for v in split_list(m.get('ForcedIncludeFiles'), props))
+    return args
+
+def cl_preprocess_args(opts, properties=None):
+    '''cl_preprocess_args(opts, properties=None) -> list[str]
+
+    Returns the cl.exe arguments that affect preprocessing for the given
+    ClCompile options or item metadata. Additional options that only
+    report on the compile, such as /Bt+, are left out.
+    '''
+    m = metadata(opts)
+    props = properties or {}
+    args = _preprocess_args(m, props)
+    args.extend(a for a in split_args(m.get('AdditionalOptions'), props)
+                if not a.startswith(_REPORTING_ARG_PREFIXES))
+    return args
+
+_CL_CHOICES = {
+    'BasicRuntimeChecks': {
+        'default': None,
+        'stackframeruntimecheck': '/RTCs',
+        'uninitializedlocalusagecheck': '/RTCu',
+        'enablefastchecks': '/RTC1',
+    },
+    'CallingConvention': {'cdecl': '/Gd', 'fastcall': '/Gr', 'stdcall': '/Gz', 'vectorcall': '/Gv'},
+    'ControlFlowGuard': {'false': None, 'guard': '/guard:cf'},
+    'DebugInformationFormat': {
+        'none': None,
+        'oldstyle': '/Z7',
+        'programdatabase': '/Zi',
+        'editandcontinue': '/ZI',
+    },
+    'EnableEnhancedInstructionSet': {
+        'notset': None,
+        'noextensions': '/arch:IA32',
+        'streamingsimdextensions': '/arch:SSE',
+        'streamingsimdextensions2': '/arch:SSE2',
+        'advancedvectorextensions': '/arch:AVX',
+        'advancedvectorextensions2': '/arch:AVX2',
+    },
+    'ExceptionHandling': {'false': None, 'async': '/EHa', 'sync': '/EHsc', 'synccthrow': '/EHs'},
+    'FavorSizeOrSpeed': {'neither': None, 'size': '/Os', 'speed': '/Ot'},
+    'FloatingPointModel': {'precise': '/fp:precise', 'strict': '/fp:strict', 'fast': '/fp:fast'},
+    'InlineFunctionExpansion': {
+        'default': None,
+        'disabled': '/Ob0',
+        'onlyexplicitinline': '/Ob1',
+        'anysuitable': '/Ob2',
+    },
+    'Optimization': {'disabled': '/Od', 'minspace': '/O1', 'maxspeed': '/O2', 'full': '/Ox'},
+    'RuntimeLibrary': {
+        'multithreaded': '/MT',
+        'multithreadeddebug': '/MTd',
+        'multithreadeddll': '/MD',
+        'multithreadeddebugdll': '/MDd',
+    },
+    'WarningLevel': {
+        'turnoffallwarnings': '/W0',
+        'level1': '/W1',
+        'level2': '/W2',
+        'level3': '/W3',
+        'level4': '/W4',
+        'enableallwarnings': '/Wall',
+    },
+}
+
+# (argument when true, argument when false)
+_CL_SWITCHES = {
+    'BufferSecurityCheck': ('/GS', '/GS-'),
+    'CreateHotpatchableImage': ('/hotpatch', None),
+    'DisableLanguageExtensions': ('/Za', None),
+    'EnableFiberSafeOptimizations': ('/GT', None),
+    'ForceConformanceInForLoopScope': ('/Zc:forScope', '/Zc:forScope-'),
+    'FunctionLevelLinking': ('/Gy', '/Gy-'),
+    'IntrinsicFunctions': ('/Oi', None),
+    'OmitDefaultLibName': ('/Zl', None),
+    'OmitFramePointers': ('/Oy', '/Oy-'),
+    'OpenMPSupport': ('/openmp', None),
+    'RuntimeTypeInfo': ('/GR', '/GR-'),
+    'SDLCheck': ('/sdl', '/sdl-'),
+    'ShowIncludes': ('/showIncludes', None),
+    'StringPooling': ('/GF', None),
+    'SuppressStartupBanner': ('/nologo', None),
+    'TreatWarningAsError': ('/WX', None),
+    'TreatWChar_tAsBuiltInType': ('/Zc:wchar_t', '/Zc:wchar_t-'),
+    'UseFullPaths': ('/FC', None),
+    'WholeProgramOptimization': ('/GL', None),
+}
+
+_CL_LISTS = {
+    'DisableSpecificWarnings': '/wd',
+    'TreatSpecificWarningsAsErrors': '/we',
+    'ForcedUsingFiles': '/FU',
+}
+
+_CL_PATHS = {
+    'AssemblerListingLocation': '/Fa',
+    'ObjectFileName': '/Fo',
+    'PrecompiledHeaderOutputFile': '/Fp',
+    'ProgramDataBaseFileName': '/Fd',
+}
+
+# Metadata handled by cl_preprocess_args, or that does not change the
+# command line
+_CL_HANDLED = {
+    'AdditionalIncludeDirectories', 'AdditionalOptions', 'CompileAs', 'ForcedIncludeFiles',
+    'IgnoreStandardIncludePath', 'MultiProcessorCompilation', 'PrecompiledHeader',
+    'PrecompiledHeaderFile', 'PreprocessorDefinitions', 'UndefineAllPreprocessorDefinitions',
+    'UndefinePreprocessorDefinitions', 'ErrorReporting',
+}
+
+# Defaults that MSBuild applies to every ClCompile item
+_CL_DEFAULTS = {
+    'BufferSecurityCheck': 'true',
+    'CallingConvention': 'Cdecl',
+    'ExceptionHandling': 'Sync',
+    'FloatingPointModel': 'Precise',
+    'ForceConformanceInForLoopScope': 'true',
+    'SuppressStartupBanner': 'true',
+    'TreatWChar_tAsBuiltInType': 'true',
+}
+
+def _translate(m, props, choices, switches, lists, paths, handled, unsupported):
+    args = []
+    for name, value in sorted(m.items()):
+        value = expand(value, props)
+        if not value or value.startswith('%(') or name in handled:
+            continue
+        if name in choices:
+            choice = choices[name].get(value.lower(), False)
+            if choice:
+                args.append(choice)
+            elif choice is False and unsupported is not None:
+                unsupported.append(name)
+        elif name in switches:
+            arg = switches[name][0 if is_true(value) else 1]
+            if arg:
+                args.append(arg)
+        elif name in lists:
+            args.extend(lists[name] + v for v in split_list(value))
+        elif name in paths:
+            args.append(paths[name] + value)
+        elif unsupported is not None:
+            unsupported.append(name)
+    return args
+
+def cl_compile_args(opts, properties=None, unsupported=None, preprocess=True):
+    '''cl_compile_args(opts, properties=None, unsupported=None, preprocess=True) -> list[str]
+
+    Returns the cl.exe arguments for the given ClCompile options or item
+    metadata, not including the source file or /c. Pass False for
+    *preprocess* to omit arguments that only affect preprocessing.
+    Names of options that cannot be translated are appended to
+    *unsupported* when it is provided.
+    '''
+    m = dict(_CL_DEFAULTS)
+    m.update(metadata(opts))
+    props = properties or {}
+    args = _translate(m, props, _CL_CHOICES, _CL_SWITCHES, _CL_LISTS, _CL_PATHS, _CL_HANDLED,
+                      unsupported)
+
+    pch = m.get('PrecompiledHeader', '').lower()
+    if pch in ('use', 'create'):
+        args.append(('/Yu' if pch == 'use' else '/Yc') + expand(m.get('PrecompiledHeaderFile', ''), props))
+
+    if preprocess:
+        args.extend(_preprocess_args(m, props))
+        args.extend(split_args(m.get('AdditionalOptions'), props))
+    else:
+        args.extend(a for a in split_args(m.get('AdditionalOptions'), props)
+                    if not a.startswith(_PREPROCESS_ARG_PREFIXES))
+    return args
+
+_MACHINE = {
+    'machinex86': '/MACHINE:X86',
+    'machinex64': '/MACHINE:X64',
+    'machinearm': '/MACHINE:ARM',
+    'machinearm64': '/MACHINE:ARM64',
+    'notset': None,
+}
+
+_PLATFORM_MACHINE = {
+    'win32': '/MACHINE:X86',
+    'x64': '/MACHINE:X64',
+}
+
+_SUBSYSTEM = {
+    'notset': None,
+    'console': '/SUBSYSTEM:CONSOLE',
+    'windows': '/SUBSYSTEM:WINDOWS',
+    'native': '/SUBSYSTEM:NATIVE',
+}
+
+_LINK_CHOICES = {
+    'ForceFileOutput': {
+        'enabled': '/FORCE',
+        'multiplydefinedsymbolonly': '/FORCE:MULTIPLE',
+        'undefinedsymbolonly': '/FORCE:UNRESOLVED',
+    },
+    'GenerateDebugInformation': {
+        'true': '/DEBUG',
+        'false': None,
+        'no': None,
+        'debugfastlink': '/DEBUG:FASTLINK',
+        'debugfull': '/DEBUG:FULL',
+    },
+    'LinkTimeCodeGeneration': {
+        'default': None,
+        'uselinktimecodegeneration': '/LTCG',
+        'usefastlinktimecodegeneration': '/LTCG:incremental',
+        'pginstrument': '/LTCG:PGInstrument',
+        'pgoptimization': '/LTCG:PGOptimize',
+        'pgupdate': '/LTCG:PGUpdate',
+    },
+    'SubSystem': _SUBSYSTEM,
+    'TargetMachine': _MACHINE,
+}
+
+_LINK_SWITCHES = {
+    'DataExecutionPrevention': ('/NXCOMPAT', '/NXCOMPAT:NO'),
+    'EnableCOMDATFolding': ('/OPT:ICF', '/OPT:NOICF'),
+    'FixedBaseAddress': ('/FIXED', '/FIXED:NO'),
+    'GenerateMapFile': ('/MAP', None),
+    'IgnoreAllDefaultLibraries': ('/NODEFAULTLIB', None),
+    'ImageHasSafeExceptionHandlers': ('/SAFESEH', '/SAFESEH:NO'),
+    'LargeAddressAware': ('/LARGEADDRESSAWARE', '/LARGEADDRESSAWARE:NO'),
+    'LinkDLL': ('/DLL', None),
+    'MapExports': ('/MAPINFO:EXPORTS', None),
+    'NoEntryPoint': ('/NOENTRY', None),
+    'OptimizeReferences': ('/OPT:REF', '/OPT:NOREF'),
+    'Profile': ('/PROFILE', None),
+    'RandomizedBaseAddress': ('/DYNAMICBASE', '/DYNAMICBASE:NO'),
+    'SetChecksum': ('/RELEASE', None),
+    'SupportNobindOfDelayLoadedDLL': ('/DELAY:NOBIND', None),
+    'SupportUnloadOfDelayLoadedDLL': ('/DELAY:UNLOAD', None),
+    'SuppressStartupBanner': ('/NOLOGO', None),
+    'TerminalServerAware': ('/TSAWARE', '/TSAWARE:NO'),
+    'TreatLinkerWarningAsErrors': ('/WX', '/WX:NO'),
+}
+
+_LINK_LISTS = {
+    'AdditionalDependencies': '',
+    'AdditionalLibraryDirectories': '/LIBPATH:',
+    'DelayLoadDLLs': '/DELAYLOAD:',
+    'ForceSymbolReferences': '/INCLUDE:',
+    'IgnoreSpecificDefaultLibraries': '/NODEFAULTLIB:',
+}
+
+_LINK_PATHS = {
+    'BaseAddress': '/BASE:',
+    'EntryPointSymbol': '/ENTRY:',
+    'HeapReserveSize': '/HEAP:',
+    'ImportLibrary': '/IMPLIB:',
+    'ManifestFile': '/ManifestFile:',
+    'MapFileName': '/MAP:',
+    'MergeSections': '/MERGE:',
+    'ModuleDefinitionFile': '/DEF:',
+    'OutputFile': '/OUT:',
+    'ProfileGuidedDatabase': '/PGD:',
+    'ProgramDatabaseFile': '/PDB:',
+    'SectionAlignment': '/ALIGN:',
+    'StackReserveSize': '/STACK:',
+    'Version': '/VERSION:',
+}
+
+_LINK_HANDLED = {'AdditionalOptions', 'LinkErrorReporting', 'ShowProgress'}
+
+# Defaults that MSBuild applies to every Link item
+_LINK_DEFAULTS = {
+    'DataExecutionPrevention': 'true',
+    'RandomizedBaseAddress': 'true',
+    'SuppressStartupBanner': 'true',
+}
+
+# Libraries that MSBuild links by default (CoreLibraryDependencies)
+DEFAULT_LINK_LIBRARIES = (
+    'kernel32.lib', 'user32.lib', 'gdi32.lib', 'winspool.lib', 'comdlg32.lib', 'advapi32.lib',
+    'shell32.lib', 'ole32.lib', 'oleaut32.lib', 'uuid.lib', 'odbc32.lib', 'odbccp32.lib',
+)
+
+def link_args(opts, properties=None, unsupported=None):
+    '''link_args(opts, properties=None, unsupported=None) -> list[str]
+
+    Returns the link.exe arguments for the given Link options or item
+    metadata, not including the input files. The target machine, manifest
+    and incremental linking arguments come from *properties* in the same
+    way as MSBuild.
+    '''
+    m = dict(_LINK_DEFAULTS)
+    m.update(metadata(opts))
+    props = properties or {}
+    args = _translate(m, props, _LINK_CHOICES, _LINK_SWITCHES, _LINK_LISTS, _LINK_PATHS,
+                      _LINK_HANDLED, unsupported)
+    args.extend(DEFAULT_LINK_LIBRARIES)
+
+    if not _MACHINE.get(m.get('TargetMachine', '').lower()):
+        machine = _PLATFORM_MACHINE.get(props.get('Platform', '').lower())
+        if machine:
+            args.append(machine)
+    args.append('/INCREMENTAL' if is_true(props.get('LinkIncremental')) else '/INCREMENTAL:NO')
+    if is_true(props.get('GenerateManifest', 'true')):
+        args.extend(['/MANIFEST', '/MANIFEST:EMBED'])
+        if props.get('ConfigurationType', '').lower() in ('application', 'executable'):
+            args.append("/MANIFESTUAC:level='asInvoker' uiAccess='false'")
+        else:
+            args.append('/MANIFESTUAC:NO')
+    else:
+        args.append('/MANIFEST:NO')
+
+    args.extend(split_args(m.get('AdditionalOptions'), props))
+    return args
+
+_LIB_CHOICES = {
+    'SubSystem': _SUBSYSTEM,
+    'TargetMachine': _MACHINE,
+}
+
+_LIB_SWITCHES = {
+    'IgnoreAllDefaultLibraries': ('/NODEFAULTLIB', None),
+    'LinkTimeCodeGeneration': ('/LTCG', None),
+    'SuppressStartupBanner': ('/NOLOGO', None),
+    'TreatLibWarningAsErrors': ('/WX', '/WX:NO'),
+    'Verbose': ('/VERBOSE', None),
+}
+
+_LIB_LISTS = {
+    'AdditionalDependencies': '',
+    'AdditionalLibraryDirectories': '/LIBPATH:',
+    'ExportNamedFunctions': '/EXPORT:',
+    'ForceSymbolReferences': '/INCLUDE:',
+    'IgnoreSpecificDefaultLibraries': '/NODEFAULTLIB:',
+    'RemoveObjects': '/REMOVE:',
+}
+
+_LIB_PATHS = {
+    'ModuleDefinitionFile': '/DEF:',
+    'Name': '/NAME:',
+    'OutputFile': '/OUT:',
+}
+
+_LIB_HANDLED = {'AdditionalOptions', 'DisplayLibrary', 'ErrorReporting'}
+
+_LIB_DEFAULTS = {
+    'SuppressStartupBanner': 'true',
+}
+
+def lib_args(opts, properties=None, unsupported=None):
+    '''lib_args(opts, properties=None, unsupported=None) -> list[str]
+
+    Returns the lib.exe arguments for the given Lib options or item
+    metadata, not including the input files.
+    '''
+    m = dict(_LIB_DEFAULTS)
+    m.update(metadata(opts))
+    props = properties or {}
+    args = _translate(m, props, _LIB_CHOICES, _LIB_SWITCHES, _LIB_LISTS, _LIB_PATHS,
+                      _LIB_HANDLED, unsupported)
+    if not _MACHINE.get(m.get('TargetMachine', '').lower()):
+        machine = _PLATFORM_MACHINE.get(props.get('Platform', '').lower())
+        if machine:
+            args.append(machine)
+    args.extend(split_args(m.get('AdditionalOptions'), props))
+    return args
+
+_RC_SWITCHES = {
+    'IgnoreStandardIncludePath': ('/X', None),
+    'NullTerminateStrings': ('/n', None),
+    'ShowProgress': ('/v', None),
+    'SuppressStartupBanner': ('/nologo', None),
+}
+
+_RC_LISTS = {
+    'AdditionalIncludeDirectories': '/I',
+    'PreprocessorDefinitions': '/D',
+    'UndefinePreprocessorDefinitions': '/u',
+}
+
+_RC_PATHS = {
+    'Culture': '/l',
+    'ResourceOutputFileName': '/fo',
+}
+
+_RC_HANDLED = {'AdditionalOptions'}
+
+_RC_DEFAULTS = {
+    'SuppressStartupBanner': 'true',
+}
+
+def rc_args(opts, properties=None, unsupported=None):
+    '''rc_args(opts, properties=None, unsupported=None) -> list[str]
+
+    Returns the rc.exe arguments for the given ResourceCompile options or
+    item metadata, not including the source file.
+    '''
+    m = dict(_RC_DEFAULTS)
+    m.update(metadata(opts))
+    props = properties or {}
+    args = ['/D' + d for d in _property_defines(props) if d != '_WINDLL']
+    args.extend(_translate(m, props, {}, _RC_SWITCHES, _RC_LISTS, _RC_PATHS, _RC_HANDLED,
+                           unsupported))
+    args.extend(split_args(m.get('AdditionalOptions'), props))
+    return args
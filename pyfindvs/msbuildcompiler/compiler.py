@@ -6,21 +6,44 @@
 #-------------------------------------------------------------------------
 
 from distutils.errors import DistutilsExecError, DistutilsPlatformError, \
-                             DistutilsInternalError, CCompilerError
+                             DistutilsInternalError, DistutilsOptionError, CCompilerError
 from distutils import log
 from distutils.util import get_platform, execute
 
 from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
+from functools import partial
 from io import TextIOWrapper
-from pyfindvs import findwithany
+from pyfindvs import _find_winsdk, findfirst, metrics
+from pyfindvs.toolindex import ToolIndex, _is_build_tools
 
+from .aio import BuildStream, BuildTimeoutError, LineProcess, build_semaphore
+from .artifacts import ArtifactCache
+from .cmdline import cl_compile_args, cl_preprocess_args, object_file
+from .depends import DependencyDatabase, read_tlogs
+from .diagnostics import BuildResult
+from .driver import DirectDriver
+from .distributed import LocalWorker, RemoteWorker, ShardScheduler, Unit, WorkerError, check_args
+from .lockfile import read_lock, write_lock
+from .matrix import combine_templates, config_name, write_traversal, write_wrapper
+from .objcache import compiler_identity
 from .options import *
+from .peimports import parse as parse_imports, suggest_delay_loads
+from .pch import PCH_NAME, common_prefix, write_pch
+from .performance import PerformanceReport, write_reports
+from .pgo import PGOBuild
+from .singleflight import SingleFlight, SingleFlightTimeoutError, build_fingerprint
 from .template import Template
+from .unity import plan_batches, write_unity_files
 
+import asyncio
+import hashlib
 import os.path
+import shutil
 import subprocess
 import sys
+import time
 
 # A set containing the DLLs that are guaranteed to be available for
 # all micro versions of this Python version. Known extension
@@ -38,12 +61,154 @@ _TOOL_KEY_SUFFIX = {
     'win-amd64': '_x64',
 }
 
+_BUILDS = metrics.REGISTRY.counter(
+    'pyfindvs_builds', 'Extension builds by outcome')
+_BUILD_SECONDS = metrics.REGISTRY.histogram(
+    'pyfindvs_build_seconds', 'Wall time of each extension build')
+_BUILD_LOG_BYTES = metrics.REGISTRY.histogram(
+    'pyfindvs_build_log_bytes', 'Size of the build output and log file of each extension build',
+    buckets=metrics.DEFAULT_BYTES_BUCKETS)
+
+# Subdirectories of the VC tools directory that may contain the
+# libraries for each platform (VS 2017 layout first, then VS 2015)
+_VC_LIB_SUBDIRS = {
+    'win32': ['lib\\x86', 'lib'],
+    'win-amd64': ['lib\\x64', 'lib\\amd64'],
+}
+
 class MSBuildCompiler(object):
     """Concrete class that implements an interface to Microsoft Visual C++,
        as defined by the CCompiler abstract class."""
 
     compiler_type = 'msvc'
 
+    # 'msbuild' builds the generated project with MSBuild. 'direct' runs
+    # cl.exe, rc.exe, link.exe and lib.exe itself, which avoids MSBuild's
+    # startup and evaluation but only supports the options that can be
+    # translated to command lines, and not Midl sources.
+    backend = 'msbuild'
+
+    # Verbosity of the MSBuild output streamed by link(). 'detailed' and
+    # 'diagnostic' also write the full log to verbose.log in the
+    # intermediate directory.
+    log_verbosity = 'minimal'
+
+    # Rebuild with a detailed file log after a failed build, if one was
+    # not already produced.
+    detailed_log_on_failure = True
+
+    # Collect MSBuild's performance summary and per-source compile times
+    # into BuildResult.performance. Setting performance_report_file also
+    # writes every report collected by this compiler to that file in
+    # performance_report_format ('json' or 'trace').
+    performance_report = False
+    performance_report_file = None
+    performance_report_format = 'json'
+
+    # An ObjectCache used to restore and store compiled objects. Sources
+    # whose preprocessed text and options match a cached object are
+    # linked from the cache instead of being compiled.
+    object_cache = None
+
+    # An ArtifactCache used to restore and store linked extensions. When
+    # the project, sources, included headers and toolchain match a cached
+    # build, link() restores its outputs instead of building. Defaults to
+    # a cache in PYFINDVS_ARTIFACT_CACHE, if set.
+    artifact_cache = None
+
+    # Precompile the leading includes shared by every C/C++ source when
+    # an extension has at least auto_pch_min_sources of them.
+    auto_pch = False
+    auto_pch_min_sources = 2
+
+    # Compile C/C++ sources in generated unity translation units of up to
+    # unity_batch_size sources each. Sources matching a pattern in
+    # unity_exclude, or defining conflicting file-scope symbols, are
+    # compiled on their own.
+    unity_build = False
+    unity_batch_size = 8
+    unity_exclude = ()
+
+    # A command (list or shell string) that exercises the built extension.
+    # When set, link() builds an instrumented extension, runs the command
+    # and relinks with the collected profile. The profile is reused while
+    # the project and sources are unchanged.
+    pgo_training_command = None
+
+    # Compile sources in shards on worker agents before MSBuild runs.
+    # Each worker is 'local' (a local process pool) or a 'host:port'
+    # address of a worker started with
+    # 'python -m pyfindvs.msbuildcompiler.distributed'. Requests carry
+    # distributed_token, or PYFINDVS_WORKER_TOKEN, which must match the
+    # worker's. Sources with options that workers do not accept are left
+    # to MSBuild. Shards that fail or time out are compiled locally.
+    distributed_workers = None
+    distributed_shard_size = 8
+    distributed_timeout = 300
+    distributed_token = None
+
+    # Record the headers each source includes in a dependency database in
+    # the intermediate directory, and use it to decide which sources to
+    # rebuild.
+    track_dependencies = False
+
+    # Preferences used to choose between tools found in several installs:
+    # an instance_id or path to use first, and whether to prefer Build
+    # Tools (True) or IDE (False) installs. The newest toolset is
+    # preferred otherwise.
+    prefer_instance = None
+    prefer_build_tools = None
+
+    # Path to a toolchain lock file from export_toolchain_lock(). When set,
+    # or when PYFINDVS_TOOLCHAIN_LOCK is, initialize() loads the toolchain
+    # from the lock instead of running discovery, and fails if any locked
+    # tool has changed. Set to False to always run discovery.
+    toolchain_lock = None
+
+    # Use tools from an activated developer environment (vcvarsall.bat).
+    # None means only when DISTUTILS_USE_SDK and VCINSTALLDIR are set.
+    use_developer_environment = None
+
+    # Write the item definitions set on this compiler to a shared,
+    # content-hashed .props file in the intermediate directory. Each
+    # generated project imports it and only contains the definitions that
+    # differ, with lists such as per-call include directories written as
+    # additions to the shared ones, so projects built with the same
+    # options share one property sheet. Global properties are always
+    # written into the project.
+    shared_props = False
+
+    # After linking an extension, read its import table and list the DLLs
+    # that could be delay loaded in BuildResult.imports. 'report' only
+    # logs them; 'apply' also relinks with them in DelayLoadDLLs and
+    # records the import table size and module import time before and
+    # after. If the relink fails, the extension is relinked with its
+    # original settings and the errors are recorded in 'relink_errors'.
+    optimize_imports = None
+
+    # Limits for builds started with link_async() or stream(): the number
+    # that may run at once in each event loop, and the seconds each may
+    # take before its process tree is terminated. None means no limit.
+    max_concurrent_builds = None
+    build_timeout = None
+
+    # A directory shared by builds on this machine. When set, or when
+    # PYFINDVS_SINGLE_FLIGHT_DIR is, link() only runs one build at a time
+    # for each fingerprint of the project, sources and toolchain. Other
+    # processes building the same fingerprint wait for it and copy its
+    # outputs, or build themselves after single_flight_timeout seconds.
+    single_flight_dir = None
+    single_flight_timeout = 600
+
+    # A named set of options applied after the platform and debug
+    # options. 'fast' minimizes build time for the edit and compile loop:
+    # unoptimized code, debug information embedded in objects, fastlink
+    # PDBs, incremental linking and no manifest. Each profile builds in
+    # its own subdirectory of the intermediate directory, so switching
+    # profiles does not force a full rebuild. None uses the defaults.
+    build_profile = None
+    BUILD_PROFILES = ('fast',)
+
     def __init__(self, verbose=0, dry_run=0, force=0):
         self.dry_run = dry_run
         self.force = force
@@ -57,8 +222,10 @@ class MSBuildCompiler(object):
         self.midl_options = MidlOptions()
 
         self.additional_items = []
+        self.performance_reports = []
 
         self.plat_name = None
+        self.tools = {}
         self.initialized = False
 
     def initialize(self, plat_name=None):
@@ -77,19 +244,75 @@ class MSBuildCompiler(object):
         self.rc_options._for_plat(plat_name)
         self.midl_options._for_plat(plat_name)
 
-        # Get the available VS installs
-        instances = findwithany(*_REQUIRED_PACKAGES[plat_name])
-        if not instances:
+        self.plat_name = plat_name
+        self._tool_key_suffix = _TOOL_KEY_SUFFIX[plat_name]
+
+        if self.artifact_cache is None and os.getenv('PYFINDVS_ARTIFACT_CACHE'):
+            self.artifact_cache = ArtifactCache(os.getenv('PYFINDVS_ARTIFACT_CACHE'))
+
+        lock = self.toolchain_lock
+        if lock is None:
+            lock = os.getenv('PYFINDVS_TOOLCHAIN_LOCK')
+        if lock:
+            self._initialize_from_lock(lock)
+        elif self._use_developer_environment():
+            self._initialize_from_environment()
+        else:
+            self._initialize_from_discovery()
+
+        # When vcruntime140.dll becomes necessary, we should restore this code
+        #vcruntime = self.vc_env.get('vcruntime140.dll')
+        #if vcruntime:
+        #    self.additional_items.append({"ItemType": "Content", "Include": vcruntime})
+
+        self.initialized = True
+
+    @property
+    def _collect_performance(self):
+        return bool(self.performance_report or self.performance_report_file)
+
+    def _find_toolset_instance(self):
+        # Discovery stops at the first install with the tools for this
+        # platform, trying the preferred kinds of install first
+        suffix = self._tool_key_suffix
+        def has_tools(i):
+            return all(i.known_paths.get(t) for t in ('msbuild.exe', 'cl.exe' + suffix))
+        preferences = []
+        if self.prefer_instance is not None:
+            preferences.append(lambda i: self.prefer_instance in (i.instance_id, i.path))
+        if self.prefer_build_tools is not None:
+            preferences.append(lambda i: _is_build_tools(i) == self.prefer_build_tools)
+        preferences.append(lambda i: True)
+        packages = [p for p in _REQUIRED_PACKAGES[self.plat_name] if p != 'WinSDK']
+        for preferred in preferences:
+            vs = findfirst(*packages, predicate=lambda i: preferred(i) and has_tools(i))
+            if vs is not None:
+                return vs
+        return None
+
+    def _initialize_from_discovery(self):
+        # Get the first suitable VS install and the installed SDKs
+        vs = self._find_toolset_instance()
+        if vs is None:
             raise DistutilsPlatformError("no suitable Visual Studio "
                 "installations found. Visit https://aka.ms/vcpython "
                 "for information on obtaining one.")
+        sdks = _find_winsdk.index()
+        instances = [vs] + (sdks.instances() if sdks else [])
+
+        # Every installed SDK is an instance, so a pinned SDK version is
+        # selected by dropping the others
+        pinned = self.options.DefaultWindowsSDKVersion
+        if pinned and any(i.instance_id == 'winsdk10' and i.version == pinned for i in instances):
+            instances = [i for i in instances if i.instance_id != 'winsdk10' or i.version == pinned]
 
-        self._tool_key_suffix = _TOOL_KEY_SUFFIX[plat_name]
         self.vc_env = ChainMap(*(inst.known_paths
             for inst in sorted(instances, key=lambda i: i.version_info, reverse=True)))
+        self.tools = ToolIndex.for_instances(instances, self.prefer_instance,
+            self.prefer_build_tools).resolve_platform(self.plat_name)
 
-        self.msbuild = self.vc_env['msbuild.exe']
-        if 'MSVC\\14.1' in self.vc_env.get('cl.exe'):
+        self.msbuild = self._find_exe('msbuild.exe')
+        if 'MSVC\\14.1' in (self.tools.get('cl.exe') or ''):
             self.options.PlatformToolset = 'v141'
 
         if not self.options.DefaultWindowsSDKVersion:
@@ -99,19 +322,56 @@ class MSBuildCompiler(object):
                 sdkver = 8, 1
             self.options.DefaultWindowsSDKVersion = '.'.join(str(i) for i in sdkver)
 
-        # When vcruntime140.dll becomes necessary, we should restore this code
-        #vcruntime = self.vc_env.get('vcruntime140.dll')
-        #if vcruntime:
-        #    self.additional_items.append({"ItemType": "Content", "Include": vcruntime})
+    def _initialize_from_lock(self, lock):
+        data = read_lock(lock, self.plat_name)
+        log.info("using toolchain from '{}'".format(lock))
+        self.vc_env = ChainMap(data['known_paths'])
+        self.tools = ToolIndex.from_known_paths(data['known_paths']).resolve_platform(self.plat_name)
+        self.msbuild = data['msbuild']
+        self.options.PlatformToolset = data['PlatformToolset']
+        if not self.options.DefaultWindowsSDKVersion:
+            self.options.DefaultWindowsSDKVersion = data['DefaultWindowsSDKVersion']
 
-        self.initialized = True
+    def _use_developer_environment(self):
+        if self.use_developer_environment is not None:
+            return self.use_developer_environment
+        return bool(os.getenv('DISTUTILS_USE_SDK') and os.getenv('VCINSTALLDIR'))
+
+    def _initialize_from_environment(self):
+        # Tools are taken from PATH, as set up by vcvarsall.bat
+        known_paths = {}
+        for tool in ('msbuild.exe', 'cl.exe', 'link.exe', 'lib.exe', 'rc.exe'):
+            path = shutil.which(tool)
+            if path:
+                known_paths[tool + self._tool_key_suffix] = path
+                known_paths.setdefault(tool, path)
+        if 'msbuild.exe' not in known_paths:
+            raise DistutilsPlatformError("msbuild.exe was not found on PATH in the "
+                "activated developer environment")
+        log.info('using tools from the activated developer environment')
+
+        self.vc_env = ChainMap(known_paths)
+        self.tools = ToolIndex.from_known_paths(known_paths).resolve_platform(self.plat_name)
+        self.msbuild = known_paths['msbuild.exe']
+        tools_version = os.getenv('VCToolsVersion') or os.getenv('VisualStudioVersion') or ''
+        if tools_version.startswith(('14.1', '15.')):
+            self.options.PlatformToolset = 'v141'
+        sdk_version = (os.getenv('WindowsSDKVersion') or '').strip('\\')
+        if sdk_version and not self.options.DefaultWindowsSDKVersion:
+            self.options.DefaultWindowsSDKVersion = sdk_version
+
+    def export_toolchain_lock(self, file):
+        """Writes the resolved toolchain to a lock file that can be used
+        as toolchain_lock to skip discovery."""
+        if not self.initialized:
+            self.initialize()
+        write_lock(file, self.plat_name, dict(self.tools), self.msbuild,
+                   self.options.PlatformToolset, self.options.DefaultWindowsSDKVersion)
 
     def _find_exe(self, tool, raise_if_missing=True):
-        plattool = tool + self._tool_key_suffix
-        try:
-            return self.vc_env[plattool]
-        except LookupError:
-            pass
+        path = self.tools.get(tool)
+        if path:
+            return path
         if raise_if_missing:
             raise DistutilsPlatformError(tool + " is not available on this platform")
 
@@ -156,6 +416,23 @@ class MSBuildCompiler(object):
         '.idl': 'Midl',
     }
 
+    def _apply_profile(self, all_options, debug):
+        if debug:
+            for opts in all_options:
+                opts._for_debug()
+        if self.build_profile is None:
+            return
+        if self.build_profile not in self.BUILD_PROFILES:
+            raise DistutilsOptionError("unknown build profile '{}'".format(self.build_profile))
+        for opts in all_options:
+            getattr(opts, '_for_' + self.build_profile)()
+
+    def _int_dir(self, path):
+        path = os.path.abspath(path)
+        if self.build_profile:
+            path = os.path.join(path, self.build_profile)
+        return path
+
     def compile(self, sources,
                 output_dir=None, macros=None, include_dirs=None, debug=0,
                 extra_preargs=None, extra_postargs=None, depends=None):
@@ -168,9 +445,7 @@ class MSBuildCompiler(object):
         global_options = copy(self.options)
         compile_options = [copy(self.cl_options), copy(self.rc_options), copy(self.midl_options)]
         all_options = compile_options + [global_options]
-        if debug:
-            for opts in all_options:
-                opts._for_debug()
+        self._apply_profile(all_options, debug)
         if macros:
             for opts in compile_options:
                 opts._add_opt('PreprocessorDefinitions', ['{}={}'.format(k, v) for k, v in macros if v])
@@ -182,14 +457,19 @@ class MSBuildCompiler(object):
             global_options._add_opt('AdditionalOptions', extra_preargs, ' ')
         if extra_postargs:
             global_options._add_opt('AdditionalOptions', extra_postargs, ' ')
+        if self._collect_performance:
+            compile_options[0]._add_opt('AdditionalOptions', '/Bt+', ' ')
+        if self.object_cache is not None:
+            # Cached objects must not refer to a PDB or embed a timestamp
+            if compile_options[0].DebugInformationFormat == 'ProgramDatabase':
+                compile_options[0].DebugInformationFormat = 'OldStyle'
+            compile_options[0]._add_opt('AdditionalOptions', '/Brepro', ' ')
 
         if output_dir:
-            global_options.IntDir = os.path.abspath(output_dir)
+            global_options.IntDir = self._int_dir(output_dir)
         if not global_options.IntDir.endswith('\\'):
             global_options.IntDir += '\\'
 
-        t.merge_options(*all_options)
-
         all_sources = { }
         for s in sources:
             _, ext = os.path.splitext(s)
@@ -204,6 +484,24 @@ class MSBuildCompiler(object):
                 continue
             all_sources.setdefault(s_kind, []).append(s)
 
+        if (self.track_dependencies or depends) and not self.dry_run:
+            self._remove_stale_objects(all_sources.get('ClCompile', ()), depends, global_options.IntDir)
+
+        if self.auto_pch and 'ClCompile' in all_sources:
+            pch_item = self._auto_pch(all_sources['ClCompile'], compile_options[0], global_options.IntDir)
+            if pch_item:
+                all_sources['ClCompile'].append(pch_item)
+
+        if self.unity_build and 'ClCompile' in all_sources:
+            all_sources['ClCompile'] = self._unity_sources(all_sources['ClCompile'], global_options.IntDir)
+
+        shared = None
+        if self.shared_props:
+            props_file = self._write_shared_props(debug, global_options.IntDir)
+            t.add_shared_props(props_file)
+            shared = t.get_shared_definitions()
+        t.merge_options(*all_options, shared=shared)
+
         for s_kind, items in all_sources.items():
             t.add_items(s_kind, items)
 
@@ -214,6 +512,76 @@ class MSBuildCompiler(object):
         return [proj_file]
 
 
+    def _write_shared_props(self, debug, int_dir):
+        item_options = [copy(self.cl_options), copy(self.rc_options), copy(self.midl_options),
+                        copy(self.link_options), copy(self.lib_options)]
+        self._apply_profile(item_options, debug)
+        props = Template('props.template')
+        props.merge_options(*item_options)
+        content = str(props)
+        file = os.path.join(int_dir, 'pyfindvs.{}.g.props'.format(
+            hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]))
+        # The name changes with the content, so an existing file is current
+        if not os.path.isfile(file):
+            os.makedirs(int_dir, exist_ok=True)
+            with open(file + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(file + '.tmp', file)
+        return file
+
+    def _remove_stale_objects(self, sources, depends, int_dir):
+        """Deletes the objects of sources whose recorded dependencies, or
+        any file in depends, changed since they were compiled, so that
+        both backends compile them again."""
+        db = DependencyDatabase.load(int_dir)
+        changed = {os.path.normcase(s) for s in db.changed_since()}
+        newest = max((os.path.getmtime(d) for d in depends or () if os.path.isfile(d)), default=None)
+        stale = []
+        for s in sources:
+            if not isinstance(s, str):
+                continue
+            obj = db.object_of(s) or object_file(s, {}, {'IntDir': int_dir})
+            try:
+                obj_mtime = os.path.getmtime(obj)
+            except OSError:
+                continue
+            if os.path.normcase(s) in changed or (newest is not None and newest > obj_mtime):
+                os.unlink(obj)
+                db.forget(s)
+                stale.append(s)
+        if stale:
+            log.info('rebuilding {} sources with changed dependencies'.format(len(stale)))
+            db.save()
+
+    def _auto_pch(self, sources, cl_options, int_dir):
+        sources = [s for s in sources if isinstance(s, str)]
+        if len(sources) < self.auto_pch_min_sources:
+            return None
+        exts = {os.path.splitext(s)[1].lower() for s in sources}
+        if '.c' in exts and len(exts) > 1:
+            log.info('not using a precompiled header because C and C++ sources are mixed')
+            return None
+        prefix = common_prefix(sources)
+        if not prefix:
+            log.info('not using a precompiled header because sources do not share leading includes')
+            return None
+
+        header, pch_source = write_pch(int_dir, prefix, '.c' if exts == {'.c'} else '.cpp')
+        log.info('precompiling {} shared directives into {}'.format(len(prefix), header))
+        cl_options.PrecompiledHeader = 'Use'
+        cl_options.PrecompiledHeaderFile = header
+        cl_options.PrecompiledHeaderOutputFile = '$(IntDir){}.pch'.format(PCH_NAME)
+        cl_options._add_opt('ForcedIncludeFiles', header)
+        return {'Include': pch_source, 'PrecompiledHeader': 'Create'}
+
+    def _unity_sources(self, sources, int_dir):
+        batches, isolated = plan_batches([s for s in sources if isinstance(s, str)],
+                                         self.unity_batch_size, self.unity_exclude)
+        unity_files = write_unity_files(int_dir, batches)
+        log.info('compiling {} sources in {} unity files and {} separately'.format(
+            sum(len(b) for _, b in batches), len(unity_files), len(isolated)))
+        return unity_files + isolated + [s for s in sources if not isinstance(s, str)]
+
     _LINK_TARGET_DESC = {
         "static_lib": "StaticLibrary",
         "shared_object": "DynamicLibrary",
@@ -244,6 +612,201 @@ class MSBuildCompiler(object):
              build_temp=None,
              target_lang=None):
 
+        t, result, int_dir, cached, artifact = self._prepare_link(
+            target_desc, objects, output_filename, output_dir, libraries, library_dirs,
+            debug, extra_preargs, extra_postargs, build_temp)
+        if result.from_cache:
+            t.save(objects[0])
+            return result
+
+        flight = self._single_flight(t, int_dir)
+        while flight is not None and not self._acquire_flight(flight):
+            if flight.fetch(os.path.dirname(result.output)):
+                log.info('reused {} from a concurrent build'.format(result.output))
+                t.save(objects[0])
+                result.returncode = 0
+                return result
+        try:
+            if self.pgo_training_command and not self.dry_run:
+                result.pgo = self._build_pgo(t, objects[0], int_dir, result)
+            else:
+                t.save(objects[0])
+                self._build_project(objects[0], int_dir, result)
+            if cached:
+                self._store_cached_objects(cached)
+            if self.optimize_imports and not self.dry_run and target_desc != 'static_lib':
+                self._optimize_imports(objects[0], int_dir, result)
+            if flight is not None:
+                flight.publish(self._output_files(result.output))
+            if artifact:
+                self._store_artifacts(artifact, int_dir, result)
+        finally:
+            if flight is not None:
+                flight.release()
+        return result
+
+    def _toolchain_identity(self):
+        # Strings that change when a different toolchain, or a setting
+        # that changes the outputs after the project is built, is used
+        cl = self._find_exe('cl.exe', raise_if_missing=False)
+        try:
+            cl = compiler_identity(cl) if cl else None
+        except OSError:
+            pass
+        return [self.backend, self.msbuild, cl, self.plat_name,
+                str(self.pgo_training_command), str(self.optimize_imports)]
+
+    def _single_flight_root(self):
+        if self.dry_run:
+            return None
+        return self.single_flight_dir or os.getenv('PYFINDVS_SINGLE_FLIGHT_DIR')
+
+    def _single_flight(self, t, int_dir):
+        root = self._single_flight_root()
+        if not root:
+            return None
+        depends = DependencyDatabase.load(int_dir) if self.track_dependencies else None
+        fingerprint = build_fingerprint(t, self._toolchain_identity(), depends)
+        return SingleFlight(root, fingerprint, timeout=self.single_flight_timeout)
+
+    @staticmethod
+    def _acquire_flight(flight):
+        try:
+            return flight.acquire()
+        except SingleFlightTimeoutError as e:
+            log.warn('{}; building anyway'.format(e))
+            return True
+
+    @staticmethod
+    def _output_files(output):
+        # The output and the files the linker writes beside it
+        stem = os.path.splitext(output)[0]
+        files = [output]
+        for ext in ('.pdb', '.lib', '.exp'):
+            if os.path.normcase(stem + ext) != os.path.normcase(output) and os.path.isfile(stem + ext):
+                files.append(stem + ext)
+        return files
+
+    async def compile_async(self, sources, **kwargs):
+        '''Awaitable variant of compile() that runs it in the event loop's
+        default executor, since the object cache and distributed workers
+        run the preprocessor and compilers while the project is
+        generated.'''
+        return await asyncio.get_running_loop().run_in_executor(
+            None, partial(self.compile, sources, **kwargs))
+
+    async def link_async(self, target_desc, objects, output_filename, output_dir=None,
+                         libraries=None, library_dirs=None, runtime_library_dirs=None,
+                         export_symbols=None, debug=0, extra_preargs=None, extra_postargs=None,
+                         build_temp=None, target_lang=None, *, timeout=None):
+        '''Awaitable variant of link() that runs MSBuild as an asyncio
+        subprocess. Output is logged as link() logs it, and the BuildResult
+        is returned. See stream() for cancellation and timeouts.'''
+        stream = self.stream(target_desc, objects, output_filename, output_dir, libraries,
+                             library_dirs, runtime_library_dirs, export_symbols, debug,
+                             extra_preargs, extra_postargs, build_temp, target_lang,
+                             timeout=timeout)
+        async for item in stream:
+            if isinstance(item, str):
+                log.info(item)
+            elif item.is_error:
+                log.error(str(item))
+            else:
+                log.warn(str(item))
+        return stream.result
+
+    def stream(self, target_desc, objects, output_filename, output_dir=None,
+               libraries=None, library_dirs=None, runtime_library_dirs=None,
+               export_symbols=None, debug=0, extra_preargs=None, extra_postargs=None,
+               build_temp=None, target_lang=None, *, timeout=None):
+        '''stream(target_desc, objects, output_filename, ..., *, timeout=None) -> BuildStream
+
+        Links like link() when iterated, yielding each line of MSBuild
+        output as it is written: a Diagnostic for errors and warnings, or
+        the line as a str. Cancelling the iteration terminates MSBuild and
+        every process it started, as does exceeding *timeout* (or
+        build_timeout) seconds, which raises BuildTimeoutError. At most
+        max_concurrent_builds builds run at once.
+
+        PGO builds, dry runs, builds coordinated through single_flight_dir
+        or relinked by optimize_imports, and the direct backend run link()
+        in a worker thread instead, and yield only the diagnostics once it
+        finishes.
+        '''
+        link_args = dict(output_dir=output_dir, libraries=libraries, library_dirs=library_dirs,
+                         debug=debug, extra_preargs=extra_preargs,
+                         extra_postargs=extra_postargs, build_temp=build_temp)
+        return BuildStream(lambda stream: self._stream_link(
+            stream, target_desc, objects, output_filename, link_args,
+            self.build_timeout if timeout is None else timeout))
+
+    async def _stream_link(self, stream, target_desc, objects, output_filename, link_args, timeout):
+        loop = asyncio.get_running_loop()
+        async with build_semaphore(self.max_concurrent_builds):
+            if self.backend != 'msbuild' or self.pgo_training_command or self.dry_run or \
+               self._single_flight_root() or \
+               (self.optimize_imports and target_desc != 'static_lib'):
+                stream.result = await loop.run_in_executor(
+                    None, partial(self.link, target_desc, objects, output_filename, **link_args))
+                for d in stream.result.diagnostics:
+                    yield d
+                return
+
+            prepare = partial(self._prepare_link, target_desc, objects, output_filename, **link_args)
+            if self.object_cache is not None or self.distributed_workers:
+                # Precompiling runs the preprocessor and compilers
+                t, result, int_dir, cached, artifact = await loop.run_in_executor(None, prepare)
+            else:
+                t, result, int_dir, cached, artifact = prepare()
+            stream.result = result
+            project = objects[0]
+            t.save(project)
+            if result.from_cache:
+                return
+
+            cmd = self._msbuild_command(project, int_dir, self.log_verbosity,
+                                        performance=result.performance is not None)
+            log.info(' '.join('"{}"'.format(c) if ' ' in c else c for c in cmd))
+            os.makedirs(int_dir, exist_ok=True)
+            self._msbuild_log_file(cmd, result)
+            proc = LineProcess(cmd, timeout)
+            start = time.perf_counter()
+            log_bytes = 0
+            try:
+                async for line in proc:
+                    # LineProcess strips the line ending
+                    log_bytes += len(line) + 1
+                    line = line.rstrip()
+                    if result.performance is not None and result.performance.feed(line):
+                        continue
+                    d = result.feed(line)
+                    if line:
+                        yield d or line
+            except BuildTimeoutError:
+                self._record_build_metrics(result, time.perf_counter() - start, log_bytes)
+                raise
+            result.returncode = proc.returncode
+            seconds = time.perf_counter() - start
+
+            if self._msbuild_finished(project, int_dir, result):
+                log.info('Rebuilding with a detailed log')
+                rerun = BuildResult(project)
+                cmd = self._msbuild_command(project, int_dir, 'detailed')
+                self._msbuild_log_file(cmd, rerun)
+                async for line in LineProcess(cmd, timeout):
+                    rerun.feed(line)
+                result.log_file = rerun.log_file
+            self._record_build_metrics(result, seconds, log_bytes)
+            if not result.succeeded:
+                self._raise_build_error(result)
+            if cached:
+                self._store_cached_objects(cached)
+            if artifact:
+                self._store_artifacts(artifact, int_dir, result)
+
+    def _prepare_link(self, target_desc, objects, output_filename, output_dir=None,
+                      libraries=None, library_dirs=None, debug=0, extra_preargs=None,
+                      extra_postargs=None, build_temp=None):
         if not self.initialized:
             raise DistutilsInternalError("compiler was not initialized")
 
@@ -262,10 +825,7 @@ class MSBuildCompiler(object):
         link_options = [copy(self.link_options), copy(self.lib_options)]
         global_options = copy(self.options)
         all_options = link_options + [out_opts, global_options]
-
-        if debug:
-            for opts in all_options:
-                opts._for_debug()
+        self._apply_profile(all_options, debug)
         if libraries:
             for opts in link_options:
                 opts._add_opt('AdditionalDependencies', self._ensure_libs(libraries))
@@ -277,7 +837,7 @@ class MSBuildCompiler(object):
         if extra_postargs:
             global_options._add_opt('AdditionalOptions', extra_postargs, ' ')
         if build_temp:
-            global_options.IntDir = os.path.abspath(build_temp)
+            global_options.IntDir = self._int_dir(build_temp)
             if not global_options.IntDir.endswith('\\'):
                 global_options.IntDir += '\\'
         if out_ext.lower() == '.pyd':
@@ -285,34 +845,600 @@ class MSBuildCompiler(object):
                 opts._set_opt('LinkDLL', 'true', warn_if_invalid=False)
 
         t = Template(objects[0])
-        t.merge_options(*all_options)
-        t.save(objects[0])
+        t.merge_options(*all_options, shared=t.get_shared_definitions())
+        result = BuildResult(objects[0])
+        result.output = out_opts.OutDir + out_filename + out_ext
+        if self._collect_performance:
+            result.performance = PerformanceReport(out_filename + out_ext)
+
+        artifact = None
+        if self.artifact_cache is not None and not self.dry_run:
+            artifact = self._fetch_artifacts(t, result)
+            if result.from_cache:
+                return t, result, global_options.IntDir, None, None
+
+        cached = None
+        # PGO builds recompile everything with /GL, so cannot use
+        # precompiled objects
+        if (self.object_cache is not None or self.distributed_workers) and \
+           not self.dry_run and not self.pgo_training_command:
+            cached = self._precompile(t)
+        return t, result, global_options.IntDir, cached, artifact
+
+    def _records_dependencies(self):
+        # The artifact cache checks the headers each source included
+        return self.track_dependencies or self.artifact_cache is not None
+
+    @staticmethod
+    def _artifact_roots():
+        # Directories that cached builds are keyed relative to, so that
+        # other checkouts and virtual environments share entries
+        return {'SourceRoot': os.getcwd(), 'PythonPrefix': sys.exec_prefix}
+
+    def _fetch_artifacts(self, t, result):
+        # Restores the outputs from the artifact cache, or returns the key
+        # and sources needed to store them after building
+        roots = self._artifact_roots()
+        key = self.artifact_cache.key(t, self._toolchain_identity(), roots)
+        if self.artifact_cache.fetch(key, os.path.dirname(result.output), roots):
+            log.info('restored {} from the artifact cache'.format(result.output))
+            result.from_cache = True
+            result.returncode = 0
+            return None
+        return key, [item['Include'] for item in t.get_items('ClCompile')]
+
+    def _store_artifacts(self, artifact, int_dir, result):
+        key, sources = artifact
+        # Without the headers each source included, a cached build could
+        # not be checked for changes, so is not stored
+        db = DependencyDatabase.load(int_dir)
+        # Files in the intermediate directory are rewritten by every build
+        int_dir = os.path.normcase(int_dir.rstrip('\\/'))
+        depends = []
+        for source in sources:
+            files = db.dependencies_of(source)
+            if not files:
+                log.debug('not caching {}: the headers included by {} are unknown'.format(
+                    result.output, source))
+                return
+            depends.extend(f for f in files
+                           if not os.path.normcase(f).startswith((int_dir + '\\', int_dir + '/')))
+        cache = self.artifact_cache
+        cache.store(key, self._output_files(result.output), depends, self._artifact_roots())
+        log.info('artifact cache: {hits} hits, {misses} misses, {stores} stored, {evictions} evicted'
+            .format(**cache.stats()))
+
+    def _optimize_imports(self, project, int_dir, result):
+        if self.optimize_imports not in ('report', 'apply'):
+            raise DistutilsOptionError("optimize_imports must be 'report' or 'apply'")
+        try:
+            before = parse_imports(result.output)
+        except (OSError, ValueError) as e:
+            log.warn('cannot read the imports of {}: {}'.format(result.output, e))
+            return
+        suggested = suggest_delay_loads(before)
+        result.imports = report = {
+            'delay_loaded': [d.name for d in before.delay_loaded],
+            'suggested': suggested,
+            'import_table_size_before': before.import_table_size,
+            'import_seconds_before': self._measure_import_time(result.output),
+        }
+        if not suggested:
+            return
+        log.info('{} could delay load {}'.format(os.path.basename(result.output), ', '.join(suggested)))
+        if self.optimize_imports != 'apply':
+            return
+
+        with open(project, 'rb') as f:
+            original = f.read()
+        t = Template(project)
+        defs = t.get_item_definitions('Link')
+        delay_load = [d for d in defs.get('DelayLoadDLLs', '').split(';') if d]
+        t.set_item_definition('Link', 'DelayLoadDLLs', ';'.join(delay_load + suggested))
+        deps = defs.get('AdditionalDependencies') or '%(AdditionalDependencies)'
+        if 'delayimp.lib' not in deps.lower():
+            t.set_item_definition('Link', 'AdditionalDependencies', deps + ';delayimp.lib')
+        t.save(project)
+        log.info('relinking with delay loaded {}'.format(', '.join(suggested)))
+        relink = BuildResult(project)
+        relink.output = result.output
+        try:
+            self._build_project(project, int_dir, relink)
+        except CCompilerError:
+            # Imports of data from a DLL cannot be delay loaded (LNK1194),
+            # so the original link settings are restored and relinked
+            codes = sorted({d.code for d in relink.errors if d.code})
+            log.warn('relinking {} with delay loaded DLLs failed{}; relinking with the original settings'
+                .format(os.path.basename(result.output), ' ({})'.format(', '.join(codes)) if codes else ''))
+            report['relink_errors'] = [str(d) for d in relink.errors]
+            with open(project, 'wb') as f:
+                f.write(original)
+            restore = BuildResult(project)
+            restore.output = result.output
+            self._build_project(project, int_dir, restore)
+            return
+        result.diagnostics.extend(relink.diagnostics)
+
+        after = parse_imports(result.output)
+        report['delay_loaded'] = [d.name for d in after.delay_loaded]
+        report['import_table_size_after'] = after.import_table_size
+        report['import_seconds_after'] = self._measure_import_time(result.output)
+        log.info('import table size {} -> {} bytes'.format(
+            before.import_table_size, after.import_table_size))
+
+    def _measure_import_time(self, output, runs=3):
+        # The extension can only be imported by this interpreter when it
+        # was built for it
+        if sys.platform != 'win32' or get_platform() != self.plat_name or \
+           not output.lower().endswith('.pyd'):
+            return None
+        code = ('import sys, time; sys.path.insert(0, sys.argv[1]); t = time.perf_counter(); '
+                'import {}; print(time.perf_counter() - t)').format(os.path.basename(output).partition('.')[0])
+        times = []
+        for _ in range(runs):
+            try:
+                p = subprocess.run([sys.executable, '-c', code, os.path.dirname(output)],
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                   universal_newlines=True, timeout=60)
+                if p.returncode:
+                    return None
+                times.append(float(p.stdout.strip()))
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                return None
+        return min(times)
+
+    # Configurations built by build_matrix() when none are given
+    _MATRIX_CONFIGURATIONS = [
+        ('win32', False), ('win32', True), ('win-amd64', False), ('win-amd64', True),
+    ]
+
+    def build_matrix(self, sources, output_filename, configurations=None, output_dir=None,
+                     build_temp=None, target_desc='shared_object', macros=None, include_dirs=None,
+                     libraries=None, library_dirs=None, extra_compile_args=None,
+                     extra_link_args=None, depends=None):
+        '''build_matrix(sources, output_filename, configurations=None, ...) -> dict
+
+        Compiles and links *sources* into *output_filename* for each
+        (plat_name, debug) pair in *configurations* (by default, Release
+        and Debug for win32 and win-amd64) with one parallel MSBuild run.
+        Each configuration is built in a subdirectory of *build_temp* and
+        *output_dir* named for it, such as 'Release-x64'.
+
+        Returns a dict mapping each pair to its BuildResult. A failed
+        configuration is logged rather than raised, so the results of the
+        others are still returned.
+        '''
+        if not self.initialized:
+            self.initialize()
+        if self.backend != 'msbuild' or self.pgo_training_command or \
+           self.object_cache is not None or self.distributed_workers:
+            raise DistutilsOptionError("build_matrix() requires the msbuild backend without "
+                "PGO, an object cache or distributed workers")
+
+        build_temp = os.path.abspath(build_temp or 'build')
+        output_dir = os.path.abspath(output_dir or os.path.dirname(output_filename) or '.')
+        output_filename = os.path.basename(output_filename)
+
+        results, builds, templates = {}, [], []
+        for plat_name, debug in configurations or self._MATRIX_CONFIGURATIONS:
+            child = self._for_platform(plat_name)
+            # Every configuration is built together, so none can be
+            # restored on its own
+            child.artifact_cache = None
+            global_options = copy(child.options)
+            if debug:
+                global_options._for_debug()
+            name = config_name(global_options.Configuration, global_options.Platform)
+            temp = os.path.join(build_temp, name)
+            objects = child.compile(sources, output_dir=temp, macros=macros,
+                                    include_dirs=include_dirs, debug=debug,
+                                    extra_postargs=extra_compile_args, depends=depends)
+            t, result, int_dir, _, _ = child._prepare_link(
+                target_desc, objects, output_filename, os.path.join(output_dir, name),
+                libraries, library_dirs, debug, extra_postargs=extra_link_args, build_temp=temp)
+            t.save(objects[0])
+            result.project = os.path.join(build_temp, 'template.{}.g.vcxproj'.format(name))
+            results[plat_name, bool(debug)] = result
+            builds.append((name, objects[0], int_dir, result, global_options))
+            templates.append(t)
+
+        shared = os.path.join(build_temp, 'template.g.vcxproj')
+        combine_templates(templates).save(shared)
+        for name, _, _, result, global_options in builds:
+            write_wrapper(result.project, shared, global_options.Configuration, global_options.Platform)
+        traversal = os.path.join(build_temp, 'template.matrix.g.proj')
+        write_traversal(traversal, [result.project for _, _, _, result, _ in builds])
+
+        cmd = self._msbuild_command(traversal, build_temp + '\\', self.log_verbosity)
+        cmd.insert(-1, '/m')
+        log.info(' '.join('"{}"'.format(c) if ' ' in c else c for c in cmd))
+        if self.dry_run:
+            return results
+
+        overall = BuildResult(traversal)
+        self._record_build_metrics(overall, *self._run_msbuild(cmd, overall))
+        by_project = {os.path.normcase(r.project): r for r in results.values()}
+        for d in overall.diagnostics:
+            r = by_project.get(os.path.normcase(d.project or ''))
+            # Diagnostics from MSBuild itself apply to every configuration
+            for r in [r] if r else results.values():
+                r.diagnostics.append(d)
+
+        for name, project, int_dir, result, _ in builds:
+            result.log_file = overall.log_file
+            if result.errors:
+                result.returncode = overall.returncode or 1
+            elif overall.succeeded or os.path.isfile(result.output):
+                result.returncode = 0
+            else:
+                result.returncode = overall.returncode
+            if not result.succeeded:
+                log.error('Build of {} returned exit code {}'.format(name, result.returncode))
+            elif self._records_dependencies():
+                self._record_tlog_dependencies(project, int_dir)
+        return results
+
+    def _for_platform(self, plat_name):
+        # A copy of this compiler with its options updated for plat_name.
+        # Tools are not changed, since MSBuild locates them itself.
+        child = copy(self)
+        for name in ('options', 'out_options', 'cl_options', 'link_options',
+                     'lib_options', 'rc_options', 'midl_options'):
+            opts = copy(getattr(self, name))
+            opts._for_plat(plat_name)
+            setattr(child, name, opts)
+        child.plat_name = plat_name
+        child._tool_key_suffix = _TOOL_KEY_SUFFIX[plat_name]
+        return child
+
+    def _build_project(self, project, int_dir, result):
+        if self.backend == 'direct':
+            return self._build_direct(project, int_dir, result)
+        if self.backend != 'msbuild':
+            raise DistutilsOptionError("unknown backend '{}'".format(self.backend))
+
+        cmd = self._msbuild_command(project, int_dir, self.log_verbosity,
+                                    performance=result.performance is not None)
+
+        log.info(' '.join('"{}"'.format(c) if ' ' in c else c for c in cmd))
+        if self.dry_run:
+            return
+
+        os.makedirs(int_dir, exist_ok=True)
+        seconds, log_bytes = self._run_msbuild(cmd, result)
+        if self._msbuild_finished(project, int_dir, result):
+            log.info('Rebuilding with a detailed log')
+            rerun = BuildResult(project)
+            self._run_msbuild(
+                self._msbuild_command(project, int_dir, 'detailed'),
+                rerun,
+                report=False
+            )
+            result.log_file = rerun.log_file
+        # Reruns for a detailed log are not counted, but their log is
+        self._record_build_metrics(result, seconds, log_bytes)
+        if not result.succeeded:
+            self._raise_build_error(result)
+
+    def _msbuild_finished(self, project, int_dir, result):
+        # Returns True if the failed build should be rerun for a detailed log
+        self._record_performance(result)
+        if result.succeeded:
+            if self._records_dependencies():
+                self._record_tlog_dependencies(project, int_dir)
+            return False
+        log.error('Build returned exit code {}'.format(result.returncode))
+        return not result.log_file and self.detailed_log_on_failure
+
+    @staticmethod
+    def _raise_build_error(result):
+        if result.log_file:
+            raise CCompilerError("error building project. See '{}' for detailed log"
+                .format(result.log_file))
+        raise CCompilerError("error building project")
+
+    def _build_direct(self, project, int_dir, result):
+        tools = {name: self._find_exe(name, raise_if_missing=False)
+                 for name in ('cl.exe', 'rc.exe', 'link.exe', 'lib.exe')}
+        depends = DependencyDatabase.load(int_dir) if self._records_dependencies() else None
+        driver = DirectDriver(tools, self._tool_environment(), depends=depends)
+        log.info('building {} without MSBuild'.format(project))
+        start = time.perf_counter()
+        driver.build(Template(project), result, dry_run=self.dry_run)
+        if self.dry_run:
+            return
+        self._record_build_metrics(result, time.perf_counter() - start)
+        self._record_performance(result)
+        if not result.succeeded:
+            raise CCompilerError("error building project")
+
+    def _record_tlog_dependencies(self, project, int_dir):
+        # MSBuild's tracking logs list every file read by each compile,
+        # including the PDBs and PCHs that it writes
+        t = Template(project)
+        props = t.get_properties()
+        deps = {os.path.normcase(s): files
+                for s, files in read_tlogs(int_dir, [props.get('OutDir')]).items()}
+        if not deps:
+            return
+        defs = t.get_item_definitions('ClCompile')
+        db = DependencyDatabase.load(int_dir)
+        for item in t.get_items('ClCompile'):
+            source = item['Include']
+            files = deps.get(os.path.normcase(source))
+            if files is not None:
+                metadata = dict(defs)
+                metadata.update((k, v) for k, v in item.items() if v)
+                db.record(source, files, object_file(source, metadata, props))
+        db.save()
+
+    def _record_performance(self, result):
+        if result.performance is not None:
+            if result.performance not in self.performance_reports:
+                self.performance_reports.append(result.performance)
+            if self.performance_report_file:
+                write_reports(self.performance_report_file, self.performance_reports,
+                              self.performance_report_format)
+
+    def _pgo_fingerprint(self, t):
+        h = hashlib.sha256(str(t).encode('utf-8'))
+        for item in t.get_items('ClCompile'):
+            try:
+                with open(item['Include'], 'rb') as f:
+                    h.update(f.read())
+            except OSError:
+                pass
+        return h.hexdigest()
+
+    def _build_pgo(self, t, project, int_dir, result):
+        props = t.get_properties()
+        out_dir = props.get('OutDir', '')
+        target_name = props.get('TargetName', '')
+        pgd = os.path.join(out_dir, target_name + '.pgd')
+        fingerprint = self._pgo_fingerprint(t)
+
+        t.set_item_definition('ClCompile', 'WholeProgramOptimization', 'true')
+        t.set_item_definition('Link', 'ProfileGuidedDatabase', pgd)
+
+        def build(phase):
+            log.info('building {} for PGO phase {}'.format(target_name, phase))
+            t.set_item_definition('Link', 'LinkTimeCodeGeneration',
+                                  'PGInstrument' if phase == 'instrument' else 'PGOptimization')
+            t.save(project)
+            self._build_project(project, int_dir, result)
+
+        def train():
+            # The instrumented module needs the PGO runtime, which is
+            # installed next to cl.exe
+            runtime = None
+            cl = self._find_exe('cl.exe', raise_if_missing=False)
+            if cl and not os.path.isfile(os.path.join(out_dir, 'pgort140.dll')):
+                src = os.path.join(os.path.dirname(cl), 'pgort140.dll')
+                if os.path.isfile(src):
+                    runtime = os.path.join(out_dir, 'pgort140.dll')
+                    shutil.copyfile(src, runtime)
+            cmd = self.pgo_training_command
+            log.info('running PGO training: {}'.format(cmd))
+            try:
+                if subprocess.call(cmd, shell=isinstance(cmd, str)) != 0:
+                    raise CCompilerError("PGO training command failed")
+            finally:
+                if runtime:
+                    os.unlink(runtime)
+
+        phases = PGOBuild(os.path.join(int_dir, 'pgo.state.json'), fingerprint,
+                          build, train, lambda: os.path.isfile(pgd)).run()
+        for phase, state in phases.items():
+            log.info('PGO {}: {}{}'.format(phase, state['status'],
+                '' if state['seconds'] is None else ' in {:.1f}s'.format(state['seconds'])))
+        return phases
+
+    def _tool_environment(self):
+        env = dict(os.environ)
+        include, lib = [], []
+        cl = self._find_exe('cl.exe', raise_if_missing=False)
+        if cl:
+            env['PATH'] = os.pathsep.join([os.path.dirname(cl), env.get('PATH', '')])
+            vc_root = os.path.dirname(cl)
+            for _ in range(4):
+                if os.path.isdir(os.path.join(vc_root, 'include')):
+                    break
+                vc_root = os.path.dirname(vc_root)
+            include.append(os.path.join(vc_root, 'include'))
+            for subdir in _VC_LIB_SUBDIRS[self.plat_name]:
+                if os.path.isdir(os.path.join(vc_root, subdir)):
+                    lib.append(os.path.join(vc_root, subdir))
+                    break
+        for key in ('WinSDK.ucrt', 'WinSDK.um', 'WinSDK.shared'):
+            p = self.tools.get(key)
+            if p:
+                include.append(p)
+        for key in ('WinSDK.libucrt', 'WinSDK.lib'):
+            p = self._find_exe(key, raise_if_missing=False)
+            if p:
+                lib.append(p)
+        if include:
+            env['INCLUDE'] = ';'.join(include + [env.get('INCLUDE', '')])
+        if lib:
+            env['LIB'] = ';'.join(lib + [env.get('LIB', '')])
+        return env
 
-        verbose_log = os.path.join(global_options.IntDir, "verbose.log")
-        errors_log = os.path.join(global_options.IntDir, "errors.log")
+    def _precompile(self, t):
+        """Restores cached objects and compiles sources on distributed
+        workers before MSBuild runs. Sources that are handled here are
+        replaced in the project by their object files. Returns the
+        objects to store in the cache after a successful build."""
+        cl = self._find_exe('cl.exe', raise_if_missing=False)
+        if not cl:
+            return None
+        defs = t.get_item_definitions('ClCompile')
+        if defs.get('PrecompiledHeader') in ('Use', 'Create'):
+            log.debug('sources using precompiled headers are compiled by MSBuild')
+            return None
+
+        props = t.get_properties()
+        env = self._tool_environment()
+
+        def preprocess(item):
+            metadata = dict(defs)
+            metadata.update(item)
+            source = metadata.pop('Include')
+            obj = object_file(source, metadata, props)
+            os.makedirs(os.path.dirname(obj) or '.', exist_ok=True)
+            cmd = [cl, '/nologo', '/E'] + cl_preprocess_args(metadata, props) + [source]
+            p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env)
+            if p.returncode:
+                log.debug('unable to preprocess {}; leaving it to MSBuild'.format(source))
+                return None
+            return source, metadata, obj, p.stdout
+
+        with ThreadPoolExecutor(os.cpu_count() or 1) as pool:
+            units = [u for u in pool.map(preprocess, t.get_items('ClCompile')) if u]
+
+        identity = compiler_identity(cl)
+        pending = None
+        if self.object_cache is not None:
+            units, pending = self._restore_cached_objects(t, units, identity)
+        if self.distributed_workers and units:
+            self._compile_distributed(t, units, cl, identity, env)
+        return pending
+
+    def _restore_cached_objects(self, t, units, identity):
+        cache = self.object_cache
+        base_dir = os.getcwd()
+        restored, pending, misses = {}, [], []
+        for unit in units:
+            source, metadata, obj, preprocessed = unit
+            key = cache.key(preprocessed, sorted(metadata.items()), identity, self.plat_name, base_dir)
+            if cache.fetch(key, obj):
+                restored[source] = obj
+            else:
+                pending.append((key, obj))
+                misses.append(unit)
+        if restored:
+            t.remove_items('ClCompile', restored)
+            t.add_items('Link', restored.values())
+        log.info('restored {} of {} objects from {}'.format(len(restored), len(units), cache.root))
+        return misses, pending
+
+    def _compile_distributed(self, t, units, cl, identity, env):
+        props = t.get_properties()
+        work = []
+        accepted = []
+        for unit in units:
+            source, metadata, obj, preprocessed = unit
+            metadata = {k: v for k, v in metadata.items()
+                        if k not in ('ObjectFileName', 'ProgramDataBaseFileName')}
+            # Objects must carry their own debug info, as there is no
+            # shared PDB on the workers
+            if metadata.get('DebugInformationFormat') in ('ProgramDatabase', 'EditAndContinue'):
+                metadata['DebugInformationFormat'] = 'OldStyle'
+            lang = '.c' if os.path.splitext(source)[1].lower() == '.c' else '.cpp'
+            args = cl_compile_args(metadata, props, preprocess=False)
+            try:
+                check_args(args)
+            except WorkerError as ex:
+                log.debug('compiling {} with MSBuild: {}'.format(source, ex))
+                continue
+            work.append(Unit(source, preprocessed, args, lang))
+            accepted.append(unit)
+        units = accepted
+
+        local = LocalWorker(cl, identity, env)
+        workers = [local if w == 'local' else
+                   RemoteWorker(w, self.distributed_timeout, self.distributed_token)
+                   for w in self.distributed_workers]
+        scheduler = ShardScheduler(workers, local, self.distributed_shard_size)
+        try:
+            results = scheduler.run(identity, work)
+        finally:
+            local.close()
+
+        compiled = {}
+        for (source, _, obj, _), r in zip(units, results):
+            if r.returncode == 0 and r.obj is not None:
+                with open(obj, 'wb') as f:
+                    f.write(r.obj)
+                compiled[source] = obj
+            else:
+                # MSBuild will compile it again and report the errors
+                log.debug(r.output)
+        if compiled:
+            t.remove_items('ClCompile', compiled)
+            t.add_items('Link', compiled.values())
+        log.info('compiled {} of {} sources in {} shards ({} retried locally)'.format(
+            len(compiled), len(units), len(scheduler.shards(work)), scheduler.retried))
+
+    def _store_cached_objects(self, pending):
+        cache = self.object_cache
+        for key, obj in pending:
+            if os.path.isfile(obj):
+                cache.store(key, obj)
+        cache.evict()
+        log.info('object cache: {hits} hits, {misses} misses, {stores} stored, {evictions} evicted'
+            .format(**cache.stats()))
+
+    _CONSOLE_VERBOSITY = {'quiet', 'minimal', 'normal'}
+
+    def _msbuild_command(self, project, int_dir, verbosity, performance=False):
         cmd = [
             self.msbuild,
             '/nologo',
-            '/noconlog',
-            '/flp1:LogFile={};Verbosity=detailed;Encoding=UTF-8'.format(verbose_log),
-            '/flp2:LogFile={};ErrorsOnly;WarningsOnly;Encoding=UTF-8'.format(errors_log),
-            objects[0]
+            '/v:{}'.format(verbosity if verbosity in self._CONSOLE_VERBOSITY else 'minimal'),
+            '/clp:NoSummary;ForceNoAlign' + (';PerformanceSummary' if performance else ''),
         ]
+        if verbosity not in self._CONSOLE_VERBOSITY:
+            cmd.append('/flp:LogFile={};Verbosity={};Encoding=UTF-8'.format(
+                os.path.join(int_dir, "verbose.log"), verbosity))
+        cmd.append(project)
+        return cmd
 
-        log.info(' '.join('"{}"'.format(c) if ' ' in c else c for c in cmd))
-        if not self.dry_run:
-            os.makedirs(global_options.IntDir, exist_ok=True)
-            p = subprocess.Popen(cmd)
-            if p.wait() != 0:
-                log.error('Build returned exit code {}. Errors follow'.format(p.returncode))
-                with open(errors_log, 'r', encoding='utf-8-sig') as f:
-                    for line in f:
-                        if ': error' in line:
-                            log.error(line)
-                        else:
-                            log.warn(line)
-                raise CCompilerError("error building project. See '{}' for detailed log"
-                    .format(verbose_log))
+    @staticmethod
+    def _msbuild_log_file(cmd, result):
+        for arg in cmd:
+            if arg.startswith('/flp:LogFile='):
+                result.log_file = arg[13:].partition(';')[0]
+
+    def _record_build_metrics(self, result, seconds, log_bytes=0):
+        if not metrics.is_enabled():
+            return
+        extension = os.path.basename(result.output or result.project)
+        _BUILDS.inc(extension=extension, backend=self.backend,
+                    result='succeeded' if result.succeeded else 'failed')
+        _BUILD_SECONDS.observe(seconds, extension=extension, backend=self.backend)
+        if result.log_file:
+            try:
+                log_bytes += os.path.getsize(result.log_file)
+            except OSError:
+                pass
+        _BUILD_LOG_BYTES.observe(log_bytes, extension=extension)
+
+    def _run_msbuild(self, cmd, result, report=True):
+        # Returns the seconds taken and the bytes of console output, for
+        # the caller to record once any detailed log has been written
+        self._msbuild_log_file(cmd, result)
+
+        start = time.perf_counter()
+        log_bytes = 0
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              universal_newlines=True, errors='replace') as p:
+            for line in p.stdout:
+                log_bytes += len(line)
+                line = line.rstrip()
+                if result.performance is not None and result.performance.feed(line):
+                    log.debug(line)
+                    continue
+                d = result.feed(line)
+                if not report or not line:
+                    continue
+                if d is None:
+                    log.info(line)
+                elif d.is_error:
+                    log.error(str(d))
+                else:
+                    log.warn(str(d))
+        result.returncode = p.returncode
+        return time.perf_counter() - start, log_bytes
 
     def create_static_lib(self, objects, output_libname, output_dir=None, debug=0, target_lang=None):
         self.link("static_lib", objects, output_libname + ".lib", output_dir, debug=debug)
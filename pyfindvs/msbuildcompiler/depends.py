@@ -0,0 +1,209 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import json
+import os
+
+DEPS_FILE = 'pyfindvs.deps.json'
+
+_SHOW_INCLUDES_PREFIX = 'Note: including file:'
+
+# Files that compiles write as well as read, which change on every build
+_OUTPUT_EXTENSIONS = ('.idb', '.ilk', '.ipch', '.obj', '.pch', '.pdb', '.tlog')
+
+def parse_show_includes(output):
+    '''parse_show_includes(output) -> (includes, other_lines)
+
+    Splits cl.exe output produced with /showIncludes into the included
+    files, in order and without duplicates, and the remaining lines.
+    '''
+    includes, other = {}, []
+    for line in output.splitlines():
+        if line.startswith(_SHOW_INCLUDES_PREFIX):
+            path = line[len(_SHOW_INCLUDES_PREFIX):].strip()
+            includes.setdefault(os.path.normcase(path), path)
+        else:
+            other.append(line)
+    return list(includes.values()), other
+
+def parse_tlog(file):
+    '''parse_tlog(file) -> dict
+
+    Reads an MSBuild file tracking log, such as CL.read.1.tlog, and
+    returns the files read for each source. Lines starting with '^' name
+    the sources (joined by '|') that the following lines belong to.
+    '''
+    with open(file, 'rb') as f:
+        data = f.read()
+    text = data.decode('utf-16' if data[:2] in (b'\xff\xfe', b'\xfe\xff') else 'utf-8', 'replace')
+    deps = {}
+    current = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('^'):
+            current = [deps.setdefault(s, []) for s in line[1:].split('|') if s]
+        else:
+            for d in current:
+                d.append(line)
+    return deps
+
+def _dir_prefix(path):
+    return path.replace('/', '\\').rstrip('\\').lower() + '\\'
+
+def _is_build_output(path, prefixes):
+    path = path.replace('/', '\\').lower()
+    return path.endswith(_OUTPUT_EXTENSIONS) or path.startswith(prefixes)
+
+def read_tlogs(int_dir, exclude_dirs=()):
+    '''Returns the files read for each source from all CL.read.*.tlog
+    files under *int_dir*. Files under *int_dir* or any of
+    *exclude_dirs*, and PDB, PCH and object files, are left out, since
+    the build writes them.'''
+    prefixes = tuple(_dir_prefix(os.path.abspath(d)) for d in (int_dir,) + tuple(exclude_dirs) if d)
+    deps = {}
+    try:
+        dirs = [e.path for e in os.scandir(int_dir) if e.is_dir() and e.name.endswith('.tlog')]
+    except OSError:
+        return deps
+    for d in dirs:
+        for e in os.scandir(d):
+            if e.name.upper().startswith('CL.READ.') and e.name.lower().endswith('.tlog'):
+                for source, files in parse_tlog(e.path).items():
+                    deps.setdefault(source, []).extend(
+                        f for f in files if not _is_build_output(f, prefixes))
+    return deps
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+class DependencyDatabase:
+    '''The header dependencies of each translation unit in a build.
+
+    Each unit records its object file, a fingerprint of its command line,
+    and the size and modification time of the source and every file it
+    included when it was last compiled. Paths are stored once in a shared
+    table so that common headers do not repeat. The database is kept in
+    DEPS_FILE in the intermediate directory.
+    '''
+
+    def __init__(self, file):
+        self.file = file
+        self._files = []
+        self._index = {}
+        self._stamps = []
+        self.units = {}
+
+    @classmethod
+    def load(cls, int_dir):
+        db = cls(os.path.join(int_dir, DEPS_FILE))
+        try:
+            with open(db.file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return db
+        db._files = data.get('files', [])
+        db._stamps = data.get('stamps', [None] * len(db._files))
+        db._index = {os.path.normcase(p): i for i, p in enumerate(db._files)}
+        db.units = data.get('units', {})
+        return db
+
+    def save(self):
+        # Drop files that no unit refers to any more
+        used = sorted({i for u in self.units.values() for i in u['deps']})
+        remap = {old: new for new, old in enumerate(used)}
+        self._files = [self._files[i] for i in used]
+        self._stamps = [self._stamps[i] for i in used]
+        self._index = {os.path.normcase(p): i for i, p in enumerate(self._files)}
+        for u in self.units.values():
+            u['deps'] = [remap[i] for i in u['deps']]
+
+        os.makedirs(os.path.dirname(self.file) or '.', exist_ok=True)
+        tmp = self.file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'files': self._files, 'stamps': self._stamps, 'units': self.units},
+                      f, separators=(',', ':'))
+        os.replace(tmp, self.file)
+
+    def _file_id(self, path):
+        key = os.path.normcase(path)
+        i = self._index.get(key)
+        if i is None:
+            i = self._index[key] = len(self._files)
+            self._files.append(path)
+            self._stamps.append(None)
+        self._stamps[i] = _stamp(path)
+        return i
+
+    def _unit(self, source):
+        return self.units.get(os.path.normcase(source))
+
+    def record(self, source, includes, obj=None, command=None):
+        '''Records that *source* was compiled into *obj* with the command
+        line fingerprint *command*, and read each file in *includes*.'''
+        self.units[os.path.normcase(source)] = {
+            'source': source,
+            'obj': obj,
+            'command': command,
+            'deps': sorted({self._file_id(p) for p in [source] + list(includes)}),
+        }
+
+    def forget(self, source):
+        self.units.pop(os.path.normcase(source), None)
+
+    def object_of(self, source):
+        unit = self._unit(source)
+        return unit and unit.get('obj')
+
+    def dependencies_of(self, source):
+        unit = self._unit(source)
+        return [self._files[i] for i in unit['deps']] if unit else []
+
+    def dependents_of(self, path):
+        '''Returns the sources that included *path* when last compiled.'''
+        i = self._index.get(os.path.normcase(path))
+        if i is None:
+            return []
+        return sorted(u['source'] for u in self.units.values() if i in u['deps'])
+
+    def changed_since(self):
+        '''Returns a dict mapping each source whose dependencies changed
+        since it was recorded to the changed files.'''
+        current = {}
+        changed = {}
+        for key, unit in self.units.items():
+            files = []
+            for i in unit['deps']:
+                if i not in current:
+                    current[i] = _stamp(self._files[i]) != self._stamps[i]
+                if current[i]:
+                    files.append(self._files[i])
+            if files:
+                changed[unit['source']] = files
+        return changed
+
+    def is_up_to_date(self, source, command=None):
+        '''Returns True if *source* was recorded with the same command
+        line fingerprint, none of its dependencies have changed and its
+        object file still exists.'''
+        unit = self._unit(source)
+        if not unit or unit.get('command') != command:
+            return False
+        if not unit.get('obj') or not os.path.isfile(unit['obj']):
+            return False
+        return all(_stamp(self._files[i]) == self._stamps[i] for i in unit['deps'])
+
+    def __len__(self):
+        return len(self.units)
+
+    def __repr__(self):
+        return '<{} ({} units, {} files)>'.format(type(self).__name__, len(self.units), len(self._files))
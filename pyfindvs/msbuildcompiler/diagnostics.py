@@ -0,0 +1,115 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import re
+
+# Canonical message format used by MSBuild and the tools it runs, e.g.
+#   C:\src\spam.c(12,5): error C2065: 'x': undeclared identifier [C:\build\template.g.vcxproj]
+#   LINK : fatal error LNK1104: cannot open file 'python37.lib' [C:\build\template.g.vcxproj]
+_MESSAGE_RE = re.compile(
+    r'^\s*(?P<origin>.*?)\s*:\s*(?:(?P<subcategory>[^:]*?)\s+)?'
+    r'(?P<severity>error|warning)\s*(?P<code>[A-Za-z]+\d+)?\s*:\s*'
+    r'(?P<message>.*?)(?:\s+\[(?P<project>[^\[\]]+)\])?\s*$',
+    re.IGNORECASE
+)
+
+_ORIGIN_RE = re.compile(r'^(?P<file>.+?)\((?P<line>\d+)(?:,(?P<column>\d+))?[^)]*\)$')
+
+class Diagnostic:
+    def __init__(self, severity, message, file=None, line=None, column=None, code=None,
+                 project=None, subcategory=None):
+        self.severity = severity
+        self.message = message
+        self.file = file
+        self.line = line
+        self.column = column
+        self.code = code
+        self.project = project
+        self.subcategory = subcategory
+
+    @property
+    def is_error(self):
+        return self.severity == 'error'
+
+    def __str__(self):
+        origin = self.file or ''
+        if self.line is not None:
+            origin += '({})'.format(self.line if self.column is None else
+                                    '{},{}'.format(self.line, self.column))
+        severity = self.severity
+        if self.subcategory:
+            severity = self.subcategory + ' ' + severity
+        if self.code:
+            severity += ' ' + self.code
+        return '{}: {}: {}'.format(origin, severity, self.message) if origin else \
+            '{}: {}'.format(severity, self.message)
+
+    def __repr__(self):
+        return '<{} {}>'.format(type(self).__name__, self)
+
+def parse_diagnostic(line):
+    '''parse_diagnostic(line) -> Diagnostic or None
+
+    Parses a single line of MSBuild or tool output in the canonical
+    error/warning format. Returns None for any other line.
+    '''
+    m = _MESSAGE_RE.match(line)
+    if not m:
+        return None
+    origin = m.group('origin')
+    file, line_no, column = origin or None, None, None
+    om = _ORIGIN_RE.match(origin)
+    if om:
+        file = om.group('file')
+        line_no = int(om.group('line'))
+        if om.group('column'):
+            column = int(om.group('column'))
+    return Diagnostic(
+        m.group('severity').lower(),
+        m.group('message'),
+        file=file,
+        line=line_no,
+        column=column,
+        code=m.group('code'),
+        project=m.group('project'),
+        subcategory=m.group('subcategory') or None,
+    )
+
+class BuildResult:
+    def __init__(self, project):
+        self.project = project
+        self.output = None
+        self.returncode = None
+        self.diagnostics = []
+        self.log_file = None
+        self.performance = None
+        self.pgo = None
+        self.imports = None
+        # True when the outputs were restored from an artifact cache
+        self.from_cache = False
+
+    def feed(self, line):
+        d = parse_diagnostic(line)
+        if d:
+            self.diagnostics.append(d)
+        return d
+
+    @property
+    def succeeded(self):
+        return self.returncode == 0
+
+    @property
+    def errors(self):
+        return [d for d in self.diagnostics if d.is_error]
+
+    @property
+    def warnings(self):
+        return [d for d in self.diagnostics if not d.is_error]
+
+    def __repr__(self):
+        return '<{} for {} ({} errors, {} warnings)>'.format(
+            type(self).__name__, self.project, len(self.errors), len(self.warnings))
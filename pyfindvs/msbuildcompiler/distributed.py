@@ -0,0 +1,311 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+# Sharded compilation of preprocessed translation units.
+#
+# A client first sends a small length-prefixed JSON hello with the
+# protocol version and its token, and the worker replies 'ready' once
+# the token is verified. Each shard is then sent as a length-prefixed
+# JSON message with the compiler identity and, for each unit, the
+# preprocessed source and cl.exe arguments. The worker replies with the
+# object files and compiler output. Messages larger than
+# MAX_MESSAGE_SIZE, or hellos larger than a few kilobytes, are rejected
+# before they are read. LocalWorker does the same work in a local process
+# pool, and is used as a stand-in for remote workers and to retry
+# shards that fail remotely.
+#
+# Every request carries a token shared by the client and the worker, and
+# workers only accept units whose cl.exe arguments are in a whitelist of
+# code generation switches, so a request cannot load plugins (/B1, /Bx)
+# or write files outside the worker's temporary directory (/Fo, /Fe).
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import base64
+import hmac
+import json
+import os
+import socket
+import socketserver
+import struct
+import secrets
+import subprocess
+import tempfile
+import threading
+
+PROTOCOL_VERSION = 3
+
+MAX_MESSAGE_SIZE = 512 * 1024 * 1024
+
+_MAX_HELLO_SIZE = 4096
+
+_HEADER = struct.Struct('>I')
+
+class WorkerError(Exception):
+    pass
+
+# Switches a worker accepts, by prefix. Anything else, in particular
+# switches that name files or load compiler plugins, is rejected.
+_ALLOWED_ARG_PREFIXES = (
+    '/arch:', '/bigobj', '/diagnostics:', '/EH', '/errorReport:', '/FC', '/fp:', '/G',
+    '/guard:', '/hotpatch', '/J', '/MD', '/MT', '/nologo', '/O', '/openmp', '/permissive',
+    '/Qpar', '/Qspectre', '/RTC', '/sdl', '/std:', '/TC', '/TP', '/utf-8', '/volatile:',
+    '/W', '/w', '/Z7', '/Za', '/Zc:', '/Ze', '/Zl', '/Zp',
+)
+
+def check_args(args):
+    '''Raises WorkerError if any of the cl.exe arguments *args* is not
+    allowed on a worker.'''
+    for arg in args:
+        if not isinstance(arg, str):
+            raise WorkerError('invalid argument {!r}'.format(arg))
+        switch = '/' + arg[1:] if arg.startswith('-') else arg
+        if not switch.startswith(_ALLOWED_ARG_PREFIXES):
+            raise WorkerError('argument {!r} is not allowed on a worker'.format(arg))
+
+class Unit:
+    def __init__(self, name, source, args, lang):
+        self.name = name
+        self.source = source
+        self.args = list(args)
+        self.lang = lang
+
+    def to_json(self):
+        return {
+            'name': self.name,
+            'source': base64.b64encode(self.source).decode('ascii'),
+            'args': self.args,
+            'lang': self.lang,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['name'], base64.b64decode(data['source']), data['args'], data['lang'])
+
+    def __repr__(self):
+        return '<{} {}>'.format(type(self).__name__, self.name)
+
+class UnitResult:
+    def __init__(self, name, returncode, output, obj=None):
+        self.name = name
+        self.returncode = returncode
+        self.output = output
+        self.obj = obj
+
+    def to_json(self):
+        return {
+            'name': self.name,
+            'returncode': self.returncode,
+            'output': self.output,
+            'obj': None if self.obj is None else base64.b64encode(self.obj).decode('ascii'),
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        obj = data.get('obj')
+        return cls(data['name'], data['returncode'], data['output'],
+                   None if obj is None else base64.b64decode(obj))
+
+def send_message(sock, data):
+    body = json.dumps(data).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(body)) + body)
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(min(n - len(buf), 1 << 20))
+        if not chunk:
+            raise WorkerError('connection closed')
+        buf += chunk
+    return bytes(buf)
+
+def recv_message(sock, max_size=MAX_MESSAGE_SIZE):
+    n, = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if n > max_size:
+        raise WorkerError('message of {} bytes is larger than the limit of {}'.format(n, max_size))
+    return json.loads(_recv_exact(sock, n).decode('utf-8'))
+
+def compile_unit(compiler, unit, env=None):
+    '''compile_unit(compiler, unit, env=None) -> UnitResult
+
+    Compiles a preprocessed unit with *compiler* in a temporary
+    directory and returns the object file contents.
+    '''
+    with tempfile.TemporaryDirectory() as d:
+        src = os.path.join(d, 'unit.i')
+        obj = os.path.join(d, 'unit.obj')
+        with open(src, 'wb') as f:
+            f.write(unit.source)
+        cmd = [compiler, '/nologo', '/c', ('/Tc' if unit.lang == '.c' else '/Tp') + src,
+               '/Fo' + obj] + unit.args
+        p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env, cwd=d)
+        output = p.stdout.decode('utf-8', 'replace').replace(src, unit.name)
+        data = None
+        if p.returncode == 0:
+            with open(obj, 'rb') as f:
+                data = f.read()
+        return UnitResult(unit.name, p.returncode, output, data)
+
+class LocalWorker:
+    def __init__(self, compiler, toolchain, env=None, processes=None):
+        self.compiler = compiler
+        self.toolchain = toolchain
+        self.env = env
+        self.processes = processes or os.cpu_count() or 1
+        self._pool = None
+        # Server handler threads and scheduler threads compile at once
+        self._lock = threading.Lock()
+
+    def compile(self, toolchain, units):
+        if toolchain != self.toolchain:
+            raise WorkerError('toolchain mismatch: {!r} != {!r}'.format(toolchain, self.toolchain))
+        for u in units:
+            check_args(u.args)
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.processes)
+            futures = [self._pool.submit(compile_unit, self.compiler, u, self.env) for u in units]
+        return [f.result() for f in futures]
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def __repr__(self):
+        return '<{} ({} processes)>'.format(type(self).__name__, self.processes)
+
+class RemoteWorker:
+    def __init__(self, address, timeout=None, token=None):
+        if isinstance(address, str):
+            host, _, port = address.rpartition(':')
+            address = host, int(port)
+        self.address = address
+        self.timeout = timeout
+        self.token = token or os.getenv('PYFINDVS_WORKER_TOKEN')
+
+    def compile(self, toolchain, units):
+        with socket.create_connection(self.address, timeout=self.timeout) as sock:
+            send_message(sock, {'version': PROTOCOL_VERSION, 'token': self.token or ''})
+            reply = recv_message(sock)
+            if reply.get('status') == 'ready':
+                send_message(sock, {
+                    'toolchain': toolchain,
+                    'units': [u.to_json() for u in units],
+                })
+                reply = recv_message(sock)
+        if reply.get('status') != 'ok':
+            raise WorkerError(reply.get('message') or 'worker failed')
+        return [UnitResult.from_json(r) for r in reply['results']]
+
+    def close(self):
+        pass
+
+    def __repr__(self):
+        return '<{} at {}:{}>'.format(type(self).__name__, *self.address)
+
+class _WorkerHandler(socketserver.BaseRequestHandler):
+    def _authenticate(self):
+        hello = recv_message(self.request, _MAX_HELLO_SIZE)
+        if hello.get('version') != PROTOCOL_VERSION:
+            raise WorkerError('unsupported protocol version {}'.format(hello.get('version')))
+        token = hello.get('token')
+        if not isinstance(token, str) or \
+           not hmac.compare_digest(token.encode('utf-8'), self.server.token.encode('utf-8')):
+            raise WorkerError('invalid token')
+
+    def handle(self):
+        # Nothing larger than the hello is read before the token is checked
+        try:
+            self._authenticate()
+        except Exception as ex:
+            send_message(self.request, {'status': 'error', 'message': str(ex)})
+            return
+        send_message(self.request, {'status': 'ready'})
+        try:
+            request = recv_message(self.request)
+            units = [Unit.from_json(u) for u in request['units']]
+            results = self.server.worker.compile(request['toolchain'], units)
+            reply = {'status': 'ok', 'results': [r.to_json() for r in results]}
+        except Exception as ex:
+            reply = {'status': 'error', 'message': str(ex)}
+        send_message(self.request, reply)
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    '''Serves compile requests for a LocalWorker over TCP. Only requests
+    carrying *token* are accepted.'''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, worker, token):
+        if not token:
+            raise ValueError('a token is required')
+        self.worker = worker
+        self.token = token
+        super().__init__(address, _WorkerHandler)
+
+class ShardScheduler:
+    '''Splits units into shards and compiles them on workers.
+
+    Shards are assigned to *workers* round robin. A shard that fails,
+    including a RemoteWorker that does not respond within its timeout,
+    is compiled by *local* instead.
+    '''
+
+    def __init__(self, workers, local, shard_size=8):
+        self.workers = list(workers)
+        self.local = local
+        self.shard_size = max(1, shard_size)
+        self.retried = 0
+
+    def shards(self, units):
+        return [units[i:i + self.shard_size] for i in range(0, len(units), self.shard_size)]
+
+    def _compile(self, worker, toolchain, shard):
+        try:
+            return worker.compile(toolchain, shard)
+        except (OSError, WorkerError):
+            self.retried += 1
+            return self.local.compile(toolchain, shard)
+
+    def run(self, toolchain, units):
+        '''Returns a UnitResult for each unit, in the same order.'''
+        shards = self.shards(list(units))
+        if not shards:
+            return []
+        if not self.workers:
+            return [r for s in shards for r in self.local.compile(toolchain, s)]
+
+        with ThreadPoolExecutor(min(len(shards), 4 * len(self.workers))) as pool:
+            futures = [pool.submit(self._compile, self.workers[i % len(self.workers)], toolchain, s)
+                       for i, s in enumerate(shards)]
+            return [r for f in futures for r in f.result()]
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Serve sharded compile requests')
+    parser.add_argument('--listen', default='127.0.0.1:8743', help='address to listen on')
+    parser.add_argument('--token', default=os.getenv('PYFINDVS_WORKER_TOKEN'),
+                        help='token that clients must send (default: PYFINDVS_WORKER_TOKEN, '
+                             'or a new random token)')
+    parser.add_argument('--compiler', required=True, help='path to cl.exe')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes')
+    args = parser.parse_args(argv)
+
+    from .objcache import compiler_identity
+    host, _, port = args.listen.rpartition(':')
+    token = args.token or secrets.token_hex(16)
+    worker = LocalWorker(args.compiler, compiler_identity(args.compiler), processes=args.processes)
+    with WorkerServer((host, int(port)), worker, token) as server:
+        print('Serving {} on {}'.format(args.compiler, args.listen))
+        if not args.token:
+            print('Clients must set PYFINDVS_WORKER_TOKEN={}'.format(token))
+        server.serve_forever()
+
+if __name__ == '__main__':
+    main()
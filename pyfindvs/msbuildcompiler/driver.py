@@ -0,0 +1,254 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+from distutils import log
+from distutils.errors import CCompilerError, DistutilsPlatformError
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .cmdline import cl_compile_args, expand, is_true, lib_args, link_args, object_file, rc_args
+from .depends import parse_show_includes
+
+import hashlib
+import os
+import shutil
+import subprocess
+
+def _quote(arg):
+    if not arg or any(c in arg for c in ' \t"'):
+        return '"{}"'.format(arg.replace('"', '\\"'))
+    return arg
+
+class Command:
+    '''A single tool invocation. When *response_file* is set, the
+    arguments are written to it and passed as @response_file.'''
+
+    def __init__(self, tool, args, response_file=None, name=None):
+        self.tool = tool
+        self.args = list(args)
+        self.response_file = response_file
+        self.name = name or os.path.basename(tool)
+        # Set for compiler commands whose dependencies are recorded
+        self.source = None
+        self.output = None
+        self.fingerprint = None
+
+    @property
+    def argv(self):
+        if self.response_file:
+            return [self.tool, '@' + self.response_file]
+        return [self.tool] + self.args
+
+    def write_response_file(self):
+        if self.response_file:
+            # The tools accept UTF-16 response files, which keeps
+            # non-ASCII paths intact
+            with open(self.response_file, 'w', encoding='utf-16') as f:
+                f.write('\n'.join(_quote(a) for a in self.args))
+
+    def __str__(self):
+        return ' '.join(_quote(a) for a in [self.tool] + self.args)
+
+    def __repr__(self):
+        return '<{} {}>'.format(type(self).__name__, self.name)
+
+class BuildPlan:
+    def __init__(self):
+        # Commands in each stage may run concurrently, but every command
+        # in a stage must finish before the next stage starts
+        self.stages = []
+        self.output = None
+        self.content = []
+        self.unsupported = set()
+        self.up_to_date = []
+
+    @property
+    def commands(self):
+        return [c for s in self.stages for c in s]
+
+class DirectDriver:
+    '''Builds a generated project by running cl.exe, rc.exe, link.exe and
+    lib.exe directly, without MSBuild.
+
+    *tools* maps tool names such as 'cl.exe' to their paths, and *env* is
+    the environment to run them in. Sources are compiled in up to
+    *processes* concurrent processes, and each tool's output is passed to
+    the BuildResult as soon as it exits. Only options that cmdline can
+    translate are supported; others are reported and ignored, and Midl
+    sources raise CCompilerError.
+
+    When *depends* is a DependencyDatabase, sources are compiled with
+    /showIncludes and their includes recorded, and sources that are up
+    to date according to the database are not compiled again.
+    '''
+
+    def __init__(self, tools, env=None, processes=None, depends=None):
+        self.tools = tools
+        self.env = env
+        self.processes = processes or os.cpu_count() or 1
+        self.depends = depends
+
+    def _tool(self, name):
+        path = self.tools.get(name)
+        if not path:
+            raise DistutilsPlatformError(name + " is not available on this platform")
+        return path
+
+    def plan(self, t):
+        '''plan(t) -> BuildPlan
+
+        Returns the commands that build the project in Template *t*.
+        '''
+        if t.get_items('Midl'):
+            raise CCompilerError("Midl sources are not supported without MSBuild")
+
+        plan = BuildPlan()
+        props = t.get_properties()
+        int_dir = props.get('IntDir', '')
+        toolset = props.get('PlatformToolset', 'v140')
+        props.setdefault('PlatformToolsetVersion', toolset.lstrip('v'))
+        unsupported = []
+
+        pch, compile, inputs = [], [], []
+        defs = t.get_item_definitions('ClCompile')
+        for item in t.get_items('ClCompile'):
+            m = dict(defs)
+            m.update((k, v) for k, v in item.items() if v)
+            source = m.pop('Include')
+            obj = object_file(source, m, props)
+            m['ObjectFileName'] = obj
+            if not m.get('ProgramDataBaseFileName'):
+                m['ProgramDataBaseFileName'] = '$(IntDir)vc$(PlatformToolsetVersion).pdb'
+            args = cl_compile_args(m, props, unsupported)
+            if m.get('DebugInformationFormat', '').lower() in ('programdatabase', 'editandcontinue'):
+                # Concurrent compilers share the PDB
+                args.append('/FS')
+            if self.depends is not None:
+                args.append('/showIncludes')
+            args += ['/c', source]
+            inputs.append(obj)
+            cmd = Command(self._tool('cl.exe'), args, os.path.splitext(obj)[0] + '.cl.rsp',
+                          os.path.basename(source))
+            if self.depends is not None:
+                cmd.source, cmd.output = source, obj
+                cmd.fingerprint = hashlib.sha256('\n'.join(cmd.argv[:1] + args).encode('utf-8')).hexdigest()
+                if self.depends.is_up_to_date(source, cmd.fingerprint):
+                    plan.up_to_date.append(source)
+                    continue
+            (pch if m.get('PrecompiledHeader', '').lower() == 'create' else compile).append(cmd)
+
+        defs = t.get_item_definitions('ResourceCompile')
+        resources = []
+        for item in t.get_items('ResourceCompile'):
+            m = dict(defs)
+            m.update((k, v) for k, v in item.items() if v)
+            source = m.pop('Include')
+            res = expand(m.get('ResourceOutputFileName') or
+                         '$(IntDir){}.res'.format(os.path.splitext(os.path.basename(source))[0]), props)
+            m['ResourceOutputFileName'] = res
+            # rc.exe does not read response files
+            resources.append(Command(self._tool('rc.exe'), rc_args(m, props, unsupported) + [source],
+                                     name=os.path.basename(source)))
+            inputs.append(res)
+
+        inputs.extend(item['Include'] for item in t.get_items('Link'))
+
+        out_dir = props.get('OutDir', '')
+        target = out_dir + props.get('TargetName', '') + props.get('TargetExt', '')
+        kind = props.get('ConfigurationType', 'DynamicLibrary').lower()
+        if kind == 'staticlibrary':
+            m = t.get_item_definitions('Lib')
+            m.setdefault('OutputFile', target)
+            args = lib_args(m, props, unsupported) + inputs
+            final = Command(self._tool('lib.exe'), args, os.path.join(int_dir, 'lib.rsp'))
+        else:
+            m = t.get_item_definitions('Link')
+            m.setdefault('OutputFile', target)
+            if kind == 'dynamiclibrary':
+                m['LinkDLL'] = 'true'
+                m.setdefault('ImportLibrary', '$(OutDir)$(TargetName).lib')
+            if is_true(m.get('GenerateDebugInformation')) or \
+               m.get('GenerateDebugInformation', '').lower().startswith('debug'):
+                m.setdefault('ProgramDatabaseFile', '$(OutDir)$(TargetName).pdb')
+            args = link_args(m, props, unsupported) + inputs
+            final = Command(self._tool('link.exe'), args, os.path.join(int_dir, 'link.rsp'))
+        plan.output = expand(m['OutputFile'], props)
+
+        plan.stages = [s for s in (pch, compile + resources, [final]) if s]
+        plan.content = [item['Include'] for item in t.get_items('Content')]
+        plan.unsupported = set(unsupported)
+        return plan
+
+    def _run(self, cmd, cwd):
+        cmd.write_response_file()
+        p = subprocess.run(cmd.argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                           env=self.env, cwd=cwd)
+        return p.returncode, p.stdout.decode('utf-8', 'replace')
+
+    @staticmethod
+    def _report(result, output):
+        for line in output.splitlines():
+            line = line.rstrip()
+            if not line:
+                continue
+            if result.performance is not None and result.performance.feed(line):
+                log.debug(line)
+                continue
+            d = result.feed(line)
+            if d is None:
+                log.info(line)
+            elif d.is_error:
+                log.error(str(d))
+            else:
+                log.warn(str(d))
+
+    def build(self, t, result, dry_run=False):
+        '''Runs the commands that build the project in Template *t*,
+        setting the return code and diagnostics on *result*.'''
+        plan = self.plan(t)
+        if plan.unsupported:
+            log.warn('ignoring options that are not supported without MSBuild: {}'.format(
+                ', '.join(sorted(plan.unsupported))))
+        if plan.up_to_date:
+            log.info('{} sources are up to date'.format(len(plan.up_to_date)))
+        for cmd in plan.commands:
+            log.debug(str(cmd))
+        if dry_run:
+            return plan
+
+        # Tools run in the project directory, as they do under MSBuild
+        cwd = os.path.dirname(os.path.abspath(t.template))
+        for d in {os.path.dirname(p) for p in [t.get_properties().get('IntDir'), plan.output] if p}:
+            os.makedirs(d, exist_ok=True)
+
+        result.returncode = 0
+        with ThreadPoolExecutor(self.processes) as pool:
+            for stage in plan.stages:
+                futures = {pool.submit(self._run, cmd, cwd): cmd for cmd in stage}
+                for f in as_completed(futures):
+                    cmd = futures[f]
+                    returncode, output = f.result()
+                    if cmd.source:
+                        includes, lines = parse_show_includes(output)
+                        output = '\n'.join(lines)
+                        if returncode:
+                            self.depends.forget(cmd.source)
+                        else:
+                            self.depends.record(cmd.source, includes, cmd.output, cmd.fingerprint)
+                    self._report(result, output)
+                    if returncode and not result.returncode:
+                        log.error('{} exited with code {}'.format(cmd.name, returncode))
+                        result.returncode = returncode
+                if self.depends is not None and stage is not plan.stages[-1]:
+                    self.depends.save()
+                if result.returncode:
+                    return plan
+
+        out_dir = os.path.dirname(plan.output)
+        for f in plan.content:
+            shutil.copy2(f, os.path.join(out_dir, os.path.basename(f)))
+        return plan
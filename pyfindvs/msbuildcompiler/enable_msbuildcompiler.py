@@ -1,10 +1,18 @@
 
 from distutils.core import Command
+from distutils.errors import DistutilsOptionError
 
 import distutils.ccompiler
+import os.path
 import pyfindvs.msbuildcompiler
 import sys
 
+from pyfindvs import metrics
+
+from .artifacts import ArtifactCache
+from .compiler import MSBuildCompiler
+from .performance import REPORT_FORMATS
+
 def enable():
     distutils.ccompiler.compiler_class['msbuild'] = (
         '_msbuildcompiler',
@@ -22,13 +30,68 @@ def enable():
 class enable_msbuildcompiler(Command):
     description = 'enable the MSBuildCompiler class'
 
-    user_options = []
+    user_options = [
+        ('performance-report=', None,
+         'write MSBuild performance reports for each build to this file'),
+        ('performance-format=', None,
+         'format of the performance report ({}) [default: json]'.format(', '.join(REPORT_FORMATS))),
+        ('backend=', None,
+         'build with msbuild or by running the tools directly (direct) [default: msbuild]'),
+        ('toolchain-lock=', None,
+         'load the toolchain from this lock file instead of searching for it'),
+        ('optimize-imports=', None,
+         'report DLLs that extensions could delay load (report), or relink with them delay loaded (apply)'),
+        ('single-flight-dir=', None,
+         'wait for and reuse concurrent builds of the same extension through this shared directory'),
+        ('profile=', None,
+         'build profile to apply: fast for quick developer builds [default: none]'),
+        ('artifact-cache=', None,
+         'restore and store linked extensions in this cache directory, shared between environments'),
+        ('metrics-file=', None,
+         'record build and discovery metrics and write them to this file on exit (.json for JSON)'),
+    ]
 
     def initialize_options(self):
         enable()
+        self.performance_report = None
+        self.performance_format = None
+        self.backend = None
+        self.toolchain_lock = None
+        self.optimize_imports = None
+        self.single_flight_dir = None
+        self.metrics_file = None
+        self.artifact_cache = None
+        self.profile = None
 
     def finalize_options(self):
-        pass
+        if self.performance_format is None:
+            self.performance_format = 'json'
+        if self.performance_format not in REPORT_FORMATS:
+            raise DistutilsOptionError("unknown performance report format '{}'".format(
+                self.performance_format))
+        if self.performance_report:
+            MSBuildCompiler.performance_report_file = os.path.abspath(self.performance_report)
+            MSBuildCompiler.performance_report_format = self.performance_format
+        if self.backend:
+            if self.backend not in ('msbuild', 'direct'):
+                raise DistutilsOptionError("unknown backend '{}'".format(self.backend))
+            MSBuildCompiler.backend = self.backend
+        if self.toolchain_lock:
+            MSBuildCompiler.toolchain_lock = os.path.abspath(self.toolchain_lock)
+        if self.optimize_imports:
+            if self.optimize_imports not in ('report', 'apply'):
+                raise DistutilsOptionError("unknown optimize-imports mode '{}'".format(self.optimize_imports))
+            MSBuildCompiler.optimize_imports = self.optimize_imports
+        if self.single_flight_dir:
+            MSBuildCompiler.single_flight_dir = os.path.abspath(self.single_flight_dir)
+        if self.profile:
+            if self.profile not in MSBuildCompiler.BUILD_PROFILES:
+                raise DistutilsOptionError("unknown build profile '{}'".format(self.profile))
+            MSBuildCompiler.build_profile = self.profile
+        if self.artifact_cache:
+            MSBuildCompiler.artifact_cache = ArtifactCache(self.artifact_cache)
+        if self.metrics_file:
+            metrics.write_at_exit(os.path.abspath(self.metrics_file))
 
     def run(self):
         pass
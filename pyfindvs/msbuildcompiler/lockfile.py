@@ -0,0 +1,135 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+from distutils.errors import DistutilsPlatformError
+
+import hashlib
+import json
+import os
+
+LOCK_VERSION = 1
+
+# Tool key suffixes used in known_paths, longest first
+_SUFFIXES = ('_x86_64', '_x64', '')
+
+# Files whose contents are recorded in the lock file
+_HASHED_TOOLS = {'msbuild.exe', 'cl.exe', 'link.exe', 'lib.exe', 'rc.exe'}
+
+def _split_key(key):
+    for suffix in _SUFFIXES:
+        if suffix and key.endswith(suffix):
+            return key[:-len(suffix)], suffix
+    return key, ''
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _file_record(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': _sha256(path)}
+
+def write_lock(file, plat_name, known_paths, msbuild, toolset, sdk_version):
+    '''write_lock(file, plat_name, known_paths, msbuild, toolset, sdk_version)
+
+    Writes a toolchain lock file recording the resolved tool paths,
+    grouped by platform suffix, and the contents of the main tools.
+    '''
+    tools = {}
+    files = {}
+    for key, path in known_paths.items():
+        if not path:
+            continue
+        tool, suffix = _split_key(key)
+        tools.setdefault(suffix, {})[tool] = path
+        if tool in _HASHED_TOOLS and os.path.isfile(path):
+            files[path] = _file_record(path)
+    if msbuild and os.path.isfile(msbuild):
+        files[msbuild] = _file_record(msbuild)
+
+    data = {
+        'version': LOCK_VERSION,
+        'platform': plat_name,
+        'msbuild': msbuild,
+        'tools': tools,
+        'PlatformToolset': toolset,
+        'DefaultWindowsSDKVersion': sdk_version,
+        'files': files,
+    }
+    tmp = file + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp, file)
+
+def _check_file(path, record):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return '{} is missing'.format(path)
+    if st.st_size == record['size'] and st.st_mtime_ns == record['mtime_ns']:
+        return None
+    # Only hash when the cheap check fails, since a copy or touch may
+    # leave the contents unchanged
+    if st.st_size != record['size'] or _sha256(path) != record['sha256']:
+        return '{} has changed'.format(path)
+    return None
+
+def read_lock(file, plat_name, verify=True):
+    '''read_lock(file, plat_name, verify=True) -> dict
+
+    Reads a toolchain lock file and returns its contents with the tool
+    paths flattened back into 'known_paths'. Raises
+    DistutilsPlatformError if the lock is for another platform or, when
+    *verify* is true, if any recorded tool has changed.
+    '''
+    try:
+        with open(file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as ex:
+        raise DistutilsPlatformError("unable to read toolchain lock file '{}': {}".format(file, ex))
+
+    if data.get('version') != LOCK_VERSION:
+        raise DistutilsPlatformError("toolchain lock file '{}' has unsupported version {}".format(
+            file, data.get('version')))
+    if data.get('platform') != plat_name:
+        raise DistutilsPlatformError("toolchain lock file '{}' is for {}, not {}".format(
+            file, data.get('platform'), plat_name))
+
+    if verify:
+        drift = [m for m in (_check_file(p, r) for p, r in data.get('files', {}).items()) if m]
+        if drift:
+            raise DistutilsPlatformError("toolchain does not match lock file '{}': {}".format(
+                file, '; '.join(drift)))
+
+    data['known_paths'] = {tool + suffix: path
+                           for suffix, tools in data.get('tools', {}).items()
+                           for tool, path in tools.items()}
+    return data
+
+def main(argv=None):
+    import argparse
+    from distutils.util import get_platform
+    from .compiler import MSBuildCompiler
+
+    parser = argparse.ArgumentParser(description='Write a toolchain lock file for MSBuildCompiler')
+    parser.add_argument('--plat-name', default=get_platform(), help='target platform')
+    parser.add_argument('file', help='lock file to write')
+    args = parser.parse_args(argv)
+
+    compiler = MSBuildCompiler()
+    # The toolchain is discovered again, even when PYFINDVS_TOOLCHAIN_LOCK
+    # names the lock being replaced
+    compiler.toolchain_lock = False
+    compiler.initialize(args.plat_name)
+    compiler.export_toolchain_lock(args.file)
+    print('Wrote {}'.format(args.file))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+# Combines the projects generated for several configurations into one
+# project, so that every configuration can be built by a single MSBuild
+# process. The combined project holds each configuration's properties,
+# item definitions and items under a condition on $(Configuration) and
+# $(Platform). A small wrapper project per configuration sets those
+# properties and imports it, which keeps diagnostics attributable, and
+# a traversal project builds the wrappers in parallel.
+
+from .template import Template
+
+import copy
+import os.path
+import xml.etree.ElementTree as ET
+
+_NS = Template._NS
+_NSD = Template._NSD
+
+# The groups of the template that differ between configurations
+_CONDITIONED_GROUPS = [
+    "n:PropertyGroup[@Label='Globals']",
+    "n:ImportGroup[@Label='PropertySheets']",
+    "n:PropertyGroup[@Label='Outputs']",
+    "n:ItemDefinitionGroup",
+    "n:ItemGroup[@Label='Sources']",
+]
+
+def config_name(configuration, platform):
+    return '{}-{}'.format(configuration, platform)
+
+def _project_configuration(t):
+    pc = t.root.find("n:ItemGroup[@Label='ProjectConfigurations']/n:ProjectConfiguration", _NSD)
+    return (pc.find('n:Configuration', _NSD).text or '', pc.find('n:Platform', _NSD).text or '')
+
+def combine_templates(templates):
+    '''combine_templates(templates) -> Template
+
+    Returns a project containing every configuration of *templates*, each
+    of which has had its options merged for one configuration.
+    '''
+    combined = Template()
+    combined.root = ET.ElementTree(copy.deepcopy(templates[0].root.getroot()))
+    project = combined.root.getroot()
+    configurations = [_project_configuration(t) for t in templates]
+
+    pcs = project.find("n:ItemGroup[@Label='ProjectConfigurations']", _NSD)
+    template_pc = pcs.find('n:ProjectConfiguration', _NSD)
+    for e in list(pcs):
+        pcs.remove(e)
+    for configuration, platform in configurations:
+        pc = copy.deepcopy(template_pc)
+        pc.set('Include', '{}|{}'.format(configuration, platform))
+        pc.find('n:Configuration', _NSD).text = configuration
+        pc.find('n:Platform', _NSD).text = platform
+        pcs.append(pc)
+
+    for path in _CONDITIONED_GROUPS:
+        e = project.find(path, _NSD)
+        index = list(project).index(e)
+        project.remove(e)
+        for offset, (t, (configuration, platform)) in enumerate(zip(templates, configurations)):
+            group = copy.deepcopy(t.root.find(path, _NSD))
+            group.set('Condition', "'$(Configuration)|$(Platform)'=='{}|{}'".format(
+                configuration, platform))
+            project.insert(index + offset, group)
+    return combined
+
+def _project_element():
+    ET.register_namespace('', _NS)
+    return ET.Element('{%s}Project' % _NS, DefaultTargets='Build', ToolsVersion='14.0')
+
+def _write(root, file):
+    ET.ElementTree(root).write(file, encoding='utf-8', xml_declaration=True)
+
+def write_wrapper(file, project, configuration, platform):
+    '''Writes a project to *file* that builds *configuration* and
+    *platform* of the combined *project*.'''
+    root = _project_element()
+    pg = ET.SubElement(root, '{%s}PropertyGroup' % _NS)
+    ET.SubElement(pg, '{%s}Configuration' % _NS).text = configuration
+    ET.SubElement(pg, '{%s}Platform' % _NS).text = platform
+    ET.SubElement(root, '{%s}Import' % _NS, Project=os.path.basename(project))
+    _write(root, file)
+
+def write_traversal(file, projects):
+    '''Writes a project to *file* that builds each of *projects* in
+    parallel when MSBuild runs with /m.'''
+    root = _project_element()
+    ig = ET.SubElement(root, '{%s}ItemGroup' % _NS)
+    for p in projects:
+        ET.SubElement(ig, '{%s}ProjectToBuild' % _NS, Include=os.path.basename(p))
+    target = ET.SubElement(root, '{%s}Target' % _NS, Name='Build')
+    ET.SubElement(target, '{%s}MSBuild' % _NS, Projects='@(ProjectToBuild)', BuildInParallel='true')
+    _write(root, file)
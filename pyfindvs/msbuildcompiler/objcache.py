@@ -0,0 +1,155 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+
+_MSVC_VERSION_RE = re.compile(r'\\MSVC\\(\d+(?:\.\d+)+)\\', re.IGNORECASE)
+
+# Bumped whenever the key or entry layout changes
+_CACHE_VERSION = 1
+
+def compiler_identity(path):
+    '''compiler_identity(path) -> str
+
+    Returns a string identifying the compiler at *path*. The toolset
+    version is taken from the install path when it contains one,
+    otherwise from the size and modification time of the executable.
+    '''
+    m = _MSVC_VERSION_RE.search(path)
+    if m:
+        version = m.group(1)
+    else:
+        st = os.stat(path)
+        version = '{}:{}'.format(st.st_size, st.st_mtime_ns)
+    return '{}|{}'.format(os.path.normcase(path), version)
+
+def _copy_atomic(src, dest):
+    tmp = '{}.{}.tmp'.format(dest, uuid.uuid4().hex)
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+class ObjectCache:
+    '''A local, content-addressed cache of compiled object files.
+
+    Entries are keyed on the preprocessed source, the effective compile
+    options, the compiler identity and the target platform. All writes
+    go through a temporary file and an atomic rename, so several builds
+    may share one cache directory.
+    '''
+
+    def __init__(self, root, max_size=5 * 1024 ** 3):
+        self.root = os.path.abspath(root)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def key(self, preprocessed, options, compiler, platform, base_dir=None):
+        '''Returns the cache key for an object.
+
+        *preprocessed* is the preprocessor output for the source, and
+        occurrences of *base_dir* within it and within *options* are
+        ignored so that the key does not depend on the checkout
+        directory.
+        '''
+        options = json.dumps([_CACHE_VERSION, options, compiler, platform], sort_keys=True)
+        if base_dir:
+            for b in (base_dir, base_dir.replace('\\', '\\\\')):
+                preprocessed = preprocessed.replace(os.fsencode(b), b'')
+            options = options.replace(json.dumps(base_dir)[1:-1], '')
+        h = hashlib.sha256()
+        h.update(options.encode('utf-8'))
+        h.update(b'\0')
+        h.update(preprocessed)
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + '.obj')
+
+    def fetch(self, key, dest):
+        '''Copies the cached object for *key* to *dest* and returns True,
+        or returns False if there is no entry.'''
+        path = self._path(key)
+        try:
+            # Touch the entry so eviction is least-recently-used
+            os.utime(path)
+            _copy_atomic(path, dest)
+        except OSError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key, src):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            _copy_atomic(src, path)
+        except PermissionError:
+            # Another build is storing or reading the same entry
+            return
+        self.stores += 1
+
+    def _entries(self):
+        try:
+            subdirs = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return
+        for d in subdirs:
+            if not d.is_dir():
+                continue
+            for e in os.scandir(d.path):
+                if e.name.endswith('.obj'):
+                    try:
+                        yield e.path, e.stat()
+                    except FileNotFoundError:
+                        pass
+
+    def size(self):
+        return sum(st.st_size for _, st in self._entries())
+
+    def evict(self, max_size=None):
+        '''Removes the least recently used entries until the cache is no
+        larger than *max_size* (default: the cache's max_size).'''
+        if max_size is None:
+            max_size = self.max_size
+        entries = sorted(self._entries(), key=lambda e: e[1].st_mtime)
+        total = sum(st.st_size for _, st in entries)
+        for path, st in entries:
+            if total <= max_size:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            total -= st.st_size
+            self.evictions += 1
+        return total
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+        }
+
+    def __repr__(self):
+        return '<{} at {}>'.format(type(self).__name__, self.root)
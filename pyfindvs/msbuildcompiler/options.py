@@ -5,20 +5,97 @@
 # Distributed under the terms of the MIT License
 #-------------------------------------------------------------------------
 
+import ntpath
+
+from copy import copy
+
+class OptionList:
+    """An ordered, de-duplicated list of values for a single option.
+
+    The rendered string is computed once and cached until the list is
+    next modified.
+    """
+
+    def __init__(self, sep=';', unique=True, normalize=None):
+        self.sep = sep
+        self.unique = unique
+        self.normalize = normalize
+        self._items = {}
+        self._rendered = None
+
+    def add(self, values):
+        if isinstance(values, str):
+            values = values.split(self.sep) if self.unique else [values]
+        items = self._items
+        for v in values:
+            v = str(v)
+            if not v:
+                continue
+            if self.normalize:
+                v = self.normalize(v)
+            key = ntpath.normcase(v) if self.normalize else v
+            if not self.unique:
+                key = len(items)
+            items.setdefault(key, v)
+        self._rendered = None
+
+    def __copy__(self):
+        other = type(self)(self.sep, self.unique, self.normalize)
+        other._items = dict(self._items)
+        other._rendered = self._rendered
+        return other
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __str__(self):
+        if self._rendered is None:
+            self._rendered = self.sep.join(self._items.values())
+        return self._rendered
+
+    @property
+    def rendered_length(self):
+        return len(str(self))
+
+    def __repr__(self):
+        return '<{} ({} items, {} chars)>'.format(type(self).__name__, len(self), self.rendered_length)
+
+def _normalize_dir(path):
+    if path.startswith('%(') or path.startswith('$('):
+        return path
+    return ntpath.normpath(path)
+
 class OptionsBase:
+    def __copy__(self):
+        other = object.__new__(type(self))
+        other.__dict__.update((k, copy(v) if isinstance(v, OptionList) else v)
+                              for k, v in self.__dict__.items())
+        return other
+
     def _add_opt(self, opt_name, right_arg, sep=';'):
-        if not isinstance(right_arg, str):
-            try:
-                it = iter(right_arg)
-            except TypeError:
-                pass
-            else:
-                right_arg = sep.join(str(i) for i in it)
         existing = getattr(self, opt_name, None)
-        if not existing:
-            setattr(self, opt_name, right_arg)
+        if not isinstance(existing, OptionList):
+            normalize = _normalize_dir if opt_name.endswith('Directories') else None
+            opts = OptionList(sep, unique=(sep == ';'), normalize=normalize)
+            if existing:
+                opts.add(str(existing))
+            setattr(self, opt_name, opts)
+            existing = opts
+        if isinstance(right_arg, str):
+            existing.add(right_arg)
             return
-        setattr(self, opt_name, '{}{}{}'.format(existing, sep, right_arg))
+        try:
+            it = iter(right_arg)
+        except TypeError:
+            existing.add(str(right_arg))
+        else:
+            existing.add(it)
 
     def _set_opt(self, opt_name, right_arg, warn_if_invalid=True):
         if not hasattr(self, opt_name):
@@ -36,6 +113,10 @@ class OptionsBase:
         raise NotImplementedError('{}._for_debug must be overridden'.format(
             type(self).__name__))
 
+    def _for_fast(self):
+        raise NotImplementedError('{}._for_fast must be overridden'.format(
+            type(self).__name__))
+
 class GlobalOptionsBase(OptionsBase):
     def __init__(self):
         if not hasattr(self, '_PropertyGroup'):
@@ -57,12 +138,17 @@ class GlobalOptions(GlobalOptionsBase):
     Platform = "Win32"
     PlatformToolset = "v140"
     IntDir = ""
+    LinkIncremental = ""
     UseDebugLibraries = False
 
     def _for_debug(self):
         self.Configuration = "Debug"
         self.UseDebugLibraries = True
 
+    def _for_fast(self):
+        self.GenerateManifest = False
+        self.LinkIncremental = True
+
     def _for_plat(self, plat):
         if plat == 'win32':
             self.Platform = 'Win32'
@@ -80,6 +166,7 @@ class OutputOptions(GlobalOptionsBase):
     ConfigurationType = "DynamicLibrary"
 
     def _for_debug(self): pass
+    def _for_fast(self): pass
     def _for_plat(self, plat): pass
 
 class ClCompileOptions(ItemOptionsBase):
@@ -169,6 +256,15 @@ class ClCompileOptions(ItemOptionsBase):
         self.Optimization = "Disabled"
         self.RuntimeLibrary = "MultithreadedDLL"
 
+    def _for_fast(self):
+        # Debug information is embedded in each object (/Z7), so parallel
+        # compiles do not contend for a shared PDB
+        self.DebugInformationFormat = "OldStyle"
+        self.IntrinsicFunctions = False
+        self.MultiProcessorCompilation = True
+        self.Optimization = "Disabled"
+        self.WholeProgramOptimization = False
+
     def _for_plat(self, plat): pass
 
 class LinkOptions(ItemOptionsBase):
@@ -270,6 +366,13 @@ class LinkOptions(ItemOptionsBase):
         self.EnableCOMDATFolding = False
         self.OptimizeReferences = False
 
+    def _for_fast(self):
+        # /OPT:REF and /OPT:ICF disable incremental linking
+        self.EnableCOMDATFolding = False
+        self.GenerateDebugInformation = "DebugFastLink"
+        self.LinkTimeCodeGeneration = ""
+        self.OptimizeReferences = False
+
     def _for_plat(self, plat): pass
 
 class LibOptions(ItemOptionsBase):
@@ -297,6 +400,7 @@ class LibOptions(ItemOptionsBase):
     Verbose                         = ""
 
     def _for_debug(self): pass
+    def _for_fast(self): pass
     def _for_plat(self, plat): pass
 
 class RcOptions(ItemOptionsBase):
@@ -315,6 +419,7 @@ class RcOptions(ItemOptionsBase):
     UndefinePreprocessorDefinitions = "%(UndefinePreprocessorDefinitions)"
 
     def _for_debug(self): pass
+    def _for_fast(self): pass
     def _for_plat(self, plat): pass
 
 class MidlOptions(ItemOptionsBase):
@@ -366,4 +471,5 @@ class MidlOptions(ItemOptionsBase):
     WarningLevel                        = ""
 
     def _for_debug(self): pass
+    def _for_fast(self): pass
     def _for_plat(self, plat): pass
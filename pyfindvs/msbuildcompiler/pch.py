@@ -0,0 +1,114 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import os.path
+import re
+
+PCH_NAME = 'pyfindvs_pch'
+
+_DIRECTIVE_RE = re.compile(r'^#\s*(include|define)\b\s*(.*?)$')
+_QUOTED_INCLUDE_RE = re.compile(r'^"([^"]+)"$')
+
+def _strip_comments(line, in_comment):
+    r = []
+    while line:
+        if in_comment:
+            end = line.find('*/')
+            if end < 0:
+                return ''.join(r).strip(), True
+            line = line[end + 2:]
+            in_comment = False
+            continue
+        start = line.find('/*')
+        line_comment = line.find('//')
+        if 0 <= line_comment and (start < 0 or line_comment < start):
+            r.append(line[:line_comment])
+            break
+        if start < 0:
+            r.append(line)
+            break
+        r.append(line[:start])
+        line = line[start + 2:]
+        in_comment = True
+    return ''.join(r).strip(), in_comment
+
+def leading_directives(source):
+    '''leading_directives(source) -> list[str]
+
+    Returns the #include and #define directives at the start of
+    *source*, up to the first line of any other kind. Quoted includes
+    that exist relative to the source are made absolute.
+    '''
+    directives = []
+    in_comment = False
+    source_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line, in_comment = _strip_comments(line, in_comment)
+            if not line:
+                continue
+            m = _DIRECTIVE_RE.match(line)
+            if not m or m.group(2).endswith('\\'):
+                break
+            kind, arg = m.groups()
+            if kind == 'include':
+                qm = _QUOTED_INCLUDE_RE.match(arg)
+                if qm and os.path.isfile(os.path.join(source_dir, qm.group(1))):
+                    arg = '"{}"'.format(os.path.normpath(os.path.join(source_dir, qm.group(1))))
+            directives.append('#{} {}'.format(kind, ' '.join(arg.split())))
+    return directives
+
+def common_prefix(sources):
+    '''common_prefix(sources) -> list[str]
+
+    Returns the leading directives shared by every source, ending with
+    the last shared #include. Returns an empty list if the sources do
+    not start with the same includes.
+    '''
+    prefix = None
+    for s in sources:
+        directives = leading_directives(s)
+        if prefix is None:
+            prefix = directives
+            continue
+        n = 0
+        for a, b in zip(prefix, directives):
+            if os.path.normcase(a) != os.path.normcase(b):
+                break
+            n += 1
+        prefix = prefix[:n]
+        if not prefix:
+            break
+    prefix = prefix or []
+    while prefix and not prefix[-1].startswith('#include'):
+        prefix.pop()
+    return prefix
+
+def _write_if_changed(path, content):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return
+    except OSError:
+        pass
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+def write_pch(directory, directives, source_ext):
+    '''write_pch(directory, directives, source_ext) -> (header, source)
+
+    Writes a precompiled header containing *directives* and the source
+    file used to create it. Files are only rewritten when their content
+    changes, so incremental builds can reuse an existing PCH.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    header = os.path.join(directory, PCH_NAME + '.h')
+    source = os.path.join(directory, PCH_NAME + source_ext)
+    _write_if_changed(header, '/* Generated by pyfindvs */\n#pragma once\n{}\n'.format('\n'.join(directives)))
+    # The header is force-included into every source, including this one
+    _write_if_changed(source, '/* Generated by pyfindvs */\n')
+    return header, source
@@ -0,0 +1,195 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+# Reads the import tables of PE files (.pyd, .dll and .exe) without any
+# Windows APIs, so built extensions can be analyzed on any platform.
+
+import fnmatch
+import struct
+
+_IMAGE_DIRECTORY_ENTRY_IMPORT = 1
+_IMAGE_DIRECTORY_ENTRY_IAT = 12
+_IMAGE_DIRECTORY_ENTRY_DELAY_IMPORT = 13
+
+_PE32_MAGIC = 0x10b
+_PE32PLUS_MAGIC = 0x20b
+
+# DLLs that every extension needs while it is being imported, so delay
+# loading them only adds overhead. Functions of DLLs that export data,
+# like the Python DLL, cannot be delay loaded at all.
+NEVER_DELAY_LOAD = (
+    'python*.dll',
+    'vcruntime*.dll',
+    'msvcp*.dll',
+    'ucrtbase*.dll',
+    'api-ms-win-*.dll',
+    'kernel32.dll',
+    'ntdll.dll',
+)
+
+class ImportedDLL:
+    def __init__(self, name, functions, delay_loaded=False):
+        self.name = name
+        # Function names, or '#<ordinal>' for imports by ordinal
+        self.functions = functions
+        self.delay_loaded = delay_loaded
+
+    def __repr__(self):
+        return '<{} {} ({} functions{})>'.format(type(self).__name__, self.name,
+            len(self.functions), ', delay loaded' if self.delay_loaded else '')
+
+class PEImports:
+    def __init__(self, machine, is_64bit, dlls, import_table_size):
+        self.machine = machine
+        self.is_64bit = is_64bit
+        self.dlls = dlls
+        # Bytes of import descriptors and import address table that the
+        # loader processes when the module is loaded
+        self.import_table_size = import_table_size
+
+    @property
+    def imported(self):
+        return [d for d in self.dlls if not d.delay_loaded]
+
+    @property
+    def delay_loaded(self):
+        return [d for d in self.dlls if d.delay_loaded]
+
+    def to_dict(self):
+        return {
+            'import_table_size': self.import_table_size,
+            'imported': {d.name: d.functions for d in self.imported},
+            'delay_loaded': {d.name: d.functions for d in self.delay_loaded},
+        }
+
+    def __repr__(self):
+        return '<{} ({} imported, {} delay loaded, {} bytes)>'.format(type(self).__name__,
+            len(self.imported), len(self.delay_loaded), self.import_table_size)
+
+class _Image:
+    def __init__(self, data):
+        self.data = data
+        if data[:2] != b'MZ':
+            raise ValueError('not a PE file')
+        pe = struct.unpack_from('<I', data, 0x3C)[0]
+        if data[pe:pe + 4] != b'PE\0\0':
+            raise ValueError('not a PE file')
+        (self.machine, sections, _, _, _, opt_size, _) = struct.unpack_from('<HHIIIHH', data, pe + 4)
+        opt = pe + 24
+        magic = struct.unpack_from('<H', data, opt)[0]
+        if magic == _PE32_MAGIC:
+            self.is_64bit = False
+            self.image_base = struct.unpack_from('<I', data, opt + 28)[0]
+            count, dirs = struct.unpack_from('<I', data, opt + 92)[0], opt + 96
+        elif magic == _PE32PLUS_MAGIC:
+            self.is_64bit = True
+            self.image_base = struct.unpack_from('<Q', data, opt + 24)[0]
+            count, dirs = struct.unpack_from('<I', data, opt + 108)[0], opt + 112
+        else:
+            raise ValueError('unknown optional header magic 0x{:x}'.format(magic))
+        self.directories = [struct.unpack_from('<II', data, dirs + 8 * i) for i in range(min(count, 16))]
+        self.sections = []
+        for i in range(sections):
+            (vsize, va, raw_size, raw_ptr) = struct.unpack_from('<IIII', data, opt + opt_size + 40 * i + 8)
+            self.sections.append((va, max(vsize, raw_size), raw_ptr))
+
+    def directory(self, index):
+        return self.directories[index] if index < len(self.directories) else (0, 0)
+
+    def offset(self, rva):
+        for va, size, raw_ptr in self.sections:
+            if va <= rva < va + size:
+                return rva - va + raw_ptr
+        raise ValueError('RVA 0x{:x} is not in any section'.format(rva))
+
+    def string(self, rva):
+        start = self.offset(rva)
+        return self.data[start:self.data.index(b'\0', start)].decode('ascii', 'replace')
+
+    def thunks(self, rva):
+        fmt, size, ordinal_flag = ('<Q', 8, 1 << 63) if self.is_64bit else ('<I', 4, 1 << 31)
+        offset = self.offset(rva)
+        functions = []
+        while True:
+            value = struct.unpack_from(fmt, self.data, offset)[0]
+            if not value:
+                return functions
+            if value & ordinal_flag:
+                functions.append('#{}'.format(value & 0xFFFF))
+            else:
+                # Skip the two byte hint
+                functions.append(self.string((value & 0x7FFFFFFF) + 2))
+            offset += size
+
+def parse(data):
+    '''parse(data) -> PEImports
+
+    Returns the imported and delay loaded DLLs of a PE file, given its
+    path or its contents as bytes. Raises ValueError if it is not a valid
+    PE file.
+    '''
+    if not isinstance(data, (bytes, bytearray)):
+        with open(data, 'rb') as f:
+            data = f.read()
+    try:
+        image = _Image(data)
+        dlls = []
+
+        rva, size = image.directory(_IMAGE_DIRECTORY_ENTRY_IMPORT)
+        offset = image.offset(rva) if rva else None
+        while offset is not None:
+            (names, _, _, name, iat) = struct.unpack_from('<IIIII', data, offset)
+            if not name:
+                break
+            dlls.append(ImportedDLL(image.string(name), image.thunks(names or iat)))
+            offset += 20
+
+        rva, _ = image.directory(_IMAGE_DIRECTORY_ENTRY_DELAY_IMPORT)
+        offset = image.offset(rva) if rva else None
+        while offset is not None:
+            (attributes, name, _, _, names) = struct.unpack_from('<IIIII', data, offset)
+            if not name:
+                break
+            # Descriptors without the RVA attribute contain addresses
+            base = 0 if attributes & 1 else image.image_base
+            dlls.append(ImportedDLL(image.string(name - base), image.thunks(names - base), True))
+            offset += 32
+    except (struct.error, IndexError) as e:
+        raise ValueError('invalid PE file: {}'.format(e)) from None
+
+    import_table_size = size + image.directory(_IMAGE_DIRECTORY_ENTRY_IAT)[1]
+    return PEImports(image.machine, image.is_64bit, dlls, import_table_size)
+
+def suggest_delay_loads(imports, exclude=NEVER_DELAY_LOAD):
+    '''suggest_delay_loads(imports, exclude=NEVER_DELAY_LOAD) -> list
+
+    Returns the names of DLLs in *imports* that could be delay loaded:
+    those that are loaded with the module but not matched by a pattern in
+    *exclude*. Which calls are on rare paths cannot be known from the
+    import table, so the DLLs that are needed while the module is
+    imported are listed in *exclude*.
+    '''
+    return [d.name for d in imports.imported
+            if not any(fnmatch.fnmatch(d.name.lower(), p) for p in exclude)]
+
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='List the imports of PE files')
+    parser.add_argument('file', nargs='+', help='.pyd, .dll or .exe files to read')
+    args = parser.parse_args(argv)
+
+    r = {}
+    for file in args.file:
+        imports = parse(file)
+        r[file] = imports.to_dict()
+        r[file]['delay_load_candidates'] = suggest_delay_loads(imports)
+    print(json.dumps(r, indent=1))
+
+if __name__ == '__main__':
+    main()
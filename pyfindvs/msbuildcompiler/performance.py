@@ -0,0 +1,126 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+from collections import namedtuple
+
+import json
+import ntpath
+import os
+import re
+
+Timing = namedtuple('Timing', 'milliseconds calls')
+
+# Sections printed by MSBuild's /clp:PerformanceSummary
+_SECTIONS = {
+    'Project Evaluation': 'evaluation',
+    'Project': 'projects',
+    'Target': 'targets',
+    'Task': 'tasks',
+}
+
+_SECTION_RE = re.compile(r'^\s*(?P<section>{}) Performance Summary:\s*$'.format(
+    '|'.join(_SECTIONS)))
+_ENTRY_RE = re.compile(r'^\s*(?P<ms>\d+) ms\s+(?P<name>.+?)\s+(?P<calls>\d+) calls\s*$')
+
+# Output of the compiler's /Bt+ option, e.g.
+#   time(C:\...\c1.dll)=0.05317s < 2041466932 - 2041573294 > BB [C:\src\spam.c]
+# The tool path may itself contain parentheses, as in Program Files (x86)
+_COMPILE_TIME_RE = re.compile(r'^\s*time\((?P<tool>.+?)\)=(?P<seconds>[\d.]+)s\b.*\[(?P<file>[^\]]+)\]\s*$')
+
+class PerformanceReport:
+    def __init__(self, name):
+        self.name = name
+        self.evaluation = {}
+        self.projects = {}
+        self.targets = {}
+        self.tasks = {}
+        self.sources = {}
+        self._section = None
+
+    def feed(self, line):
+        '''Records *line* if it is part of the performance output and
+        returns True. Other lines return False.'''
+        m = _SECTION_RE.match(line)
+        if m:
+            self._section = getattr(self, _SECTIONS[m.group('section')])
+            return True
+
+        if self._section is not None:
+            m = _ENTRY_RE.match(line)
+            if m:
+                timing = Timing(int(m.group('ms')), int(m.group('calls')))
+                self._section[m.group('name')] = timing
+                return True
+            self._section = None
+
+        m = _COMPILE_TIME_RE.match(line)
+        if m:
+            tool = ntpath.basename(m.group('tool'))
+            self.sources.setdefault(m.group('file'), {})[tool] = float(m.group('seconds'))
+            return True
+        return False
+
+    def to_dict(self):
+        def timings(d):
+            return {k: dict(v._asdict()) for k, v in d.items()}
+        return {
+            'name': self.name,
+            'evaluation': timings(self.evaluation),
+            'projects': timings(self.projects),
+            'targets': timings(self.targets),
+            'tasks': timings(self.tasks),
+            'sources': {k: dict(v) for k, v in self.sources.items()},
+        }
+
+    def to_trace_events(self, pid=1):
+        '''Returns Chrome trace events for this report.
+
+        MSBuild only reports total durations, so the events for each
+        category are laid out back to back on their own thread rather
+        than at their real start times.
+        '''
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                   'args': {'name': self.name}}]
+        threads = [
+            ('Targets', ((k, v.milliseconds * 1000, {'calls': v.calls}) for k, v in self.targets.items())),
+            ('Tasks', ((k, v.milliseconds * 1000, {'calls': v.calls}) for k, v in self.tasks.items())),
+            ('Sources', ((k, int(sum(v.values()) * 1000000), v) for k, v in self.sources.items())),
+        ]
+        for tid, (thread_name, entries) in enumerate(threads, 1):
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                           'args': {'name': thread_name}})
+            ts = 0
+            for name, dur, args in entries:
+                events.append({'name': name, 'cat': thread_name, 'ph': 'X', 'pid': pid,
+                               'tid': tid, 'ts': ts, 'dur': dur, 'args': args})
+                ts += dur
+        return events
+
+    def __repr__(self):
+        return '<{} for {} ({} targets, {} tasks, {} sources)>'.format(
+            type(self).__name__, self.name, len(self.targets), len(self.tasks), len(self.sources))
+
+REPORT_FORMATS = ('json', 'trace')
+
+def write_reports(file, reports, format='json'):
+    '''write_reports(file, reports, format='json')
+
+    Writes *reports* to *file* as JSON or as a Chrome trace event file
+    (format='trace') that can be loaded into chrome://tracing.
+    '''
+    if format == 'json':
+        data = {'reports': [r.to_dict() for r in reports]}
+    elif format == 'trace':
+        data = {'traceEvents': [e for pid, r in enumerate(reports, 1) for e in r.to_trace_events(pid)],
+                'displayTimeUnit': 'ms'}
+    else:
+        raise ValueError("unsupported report format '{}'".format(format))
+
+    tmp = file + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, file)
@@ -0,0 +1,79 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import json
+import os
+import time
+
+PHASES = ('instrument', 'train', 'optimize')
+
+class PGOBuild:
+    '''Runs the phases of a profile-guided optimization build.
+
+    *build* is called with 'instrument' or 'optimize' to build the
+    extension, *train* runs the training workload, and *has_profile*
+    returns whether previously collected profile data still exists.
+    The state of each phase is kept in *state_file*. When *fingerprint*
+    matches the previous run and the profile is still available, the
+    instrument and train phases are skipped and the existing profile is
+    reused.
+    '''
+
+    def __init__(self, state_file, fingerprint, build, train, has_profile):
+        self.state_file = state_file
+        self.fingerprint = fingerprint
+        self.build = build
+        self.train = train
+        self.has_profile = has_profile
+        self.phases = {p: {'status': 'pending', 'seconds': None} for p in PHASES}
+
+    def _load(self):
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp = self.state_file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': self.fingerprint, 'phases': self.phases}, f, indent=1)
+        os.replace(tmp, self.state_file)
+
+    def _run_phase(self, phase, func, *args):
+        self.phases[phase]['status'] = 'running'
+        self._save()
+        start = time.perf_counter()
+        try:
+            func(*args)
+        except BaseException:
+            self.phases[phase]['status'] = 'failed'
+            raise
+        else:
+            self.phases[phase]['status'] = 'done'
+        finally:
+            self.phases[phase]['seconds'] = time.perf_counter() - start
+            self._save()
+
+    def can_reuse_profile(self):
+        previous = self._load()
+        if previous.get('fingerprint') != self.fingerprint:
+            return False
+        phases = previous.get('phases', {})
+        if any(phases.get(p, {}).get('status') not in ('done', 'reused') for p in ('instrument', 'train')):
+            return False
+        return self.has_profile()
+
+    def run(self):
+        if self.can_reuse_profile():
+            for p in ('instrument', 'train'):
+                self.phases[p]['status'] = 'reused'
+        else:
+            self._run_phase('instrument', self.build, 'instrument')
+            self._run_phase('train', self.train)
+        self._run_phase('optimize', self.build, 'optimize')
+        return self.phases
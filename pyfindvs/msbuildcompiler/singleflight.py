@@ -0,0 +1,329 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+# Coordinates processes that build the same extension at the same time.
+# Each build is identified by a fingerprint of its project, sources and
+# toolchain. The first process to create <fingerprint>.lock in the shared
+# directory builds and publishes its outputs to <fingerprint>/, and the
+# others wait for the lock to go away and copy those outputs instead of
+# building. The lock holder touches the lock file while it builds, so a
+# lock that has not been touched recently, or whose process has exited,
+# is treated as abandoned and removed.
+
+from distutils import log
+
+from .objcache import _copy_atomic
+
+import hashlib
+import json
+import os
+import shutil
+import socket
+import sys
+import threading
+import time
+import uuid
+
+_MANIFEST = 'manifest.json'
+
+class SingleFlightTimeoutError(Exception):
+    '''Raised by SingleFlight.acquire() when another process still holds
+    the lock after the timeout.'''
+
+# Item types whose files are inputs to the build
+_SOURCE_ITEM_TYPES = ('ClCompile', 'ResourceCompile', 'Midl')
+
+def _strip_sep(path):
+    return path.rstrip('\\/') or path
+
+def relative_path(path, roots):
+    '''Returns *path* with its leading directory replaced by $(Name) when
+    it is under one of the directories in the *roots* dict of names to
+    paths, or unchanged otherwise.'''
+    norm = os.path.normcase(path)
+    for name, root in sorted((roots or {}).items(), key=lambda r: -len(r[1] or '')):
+        root = _strip_sep(root or '')
+        if root and norm.startswith(os.path.normcase(root)) and \
+           path[len(root):len(root) + 1] in ('', '\\', '/'):
+            return '$({})'.format(name) + path[len(root):]
+    return path
+
+def _hash_file(h, path, roots=None):
+    h.update(os.fsencode(os.path.normcase(relative_path(path, roots))))
+    h.update(b'\0')
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    except OSError:
+        h.update(b'<missing>')
+    h.update(b'\0')
+
+def build_fingerprint(t, toolchain, depends=None, roots=None):
+    '''build_fingerprint(t, toolchain, depends=None, roots=None) -> str
+
+    Returns a fingerprint of the build described by Template *t*: the
+    project, with its output and intermediate directories left out, the
+    contents of its sources and of the headers they included according
+    to DependencyDatabase *depends*, and the strings in *toolchain*.
+    Paths under the directories in the *roots* dict of names to paths
+    are fingerprinted relative to them, so that the same sources built
+    from another checkout or environment have the same fingerprint.
+    '''
+    props = t.get_properties()
+    roots = dict(roots or {})
+    for name in ('IntDir', 'OutDir'):
+        if props.get(name):
+            roots[name] = props[name]
+    text = str(t)
+    for name, root in sorted(roots.items(), key=lambda r: -len(r[1] or '')):
+        if root:
+            text = text.replace(_strip_sep(root), '$({})'.format(name))
+    h = hashlib.sha256()
+    h.update(json.dumps([text, list(toolchain)]).encode('utf-8'))
+    for item_type in _SOURCE_ITEM_TYPES:
+        for item in t.get_items(item_type):
+            source = item['Include']
+            _hash_file(h, source, roots)
+            if depends is not None:
+                for header in sorted(depends.dependencies_of(source)):
+                    _hash_file(h, header, roots)
+    return h.hexdigest()
+
+def _pid_alive(pid):
+    if sys.platform == 'win32':
+        import ctypes
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        handle = kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            # Access is denied to processes that exist
+            return ctypes.get_last_error() == 5
+        try:
+            code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+                return True
+            # STILL_ACTIVE
+            return code.value == 259
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+class SingleFlight:
+    '''Ensures only one process at a time builds *fingerprint*.
+
+    acquire() returns True when the caller should build, after which it
+    should publish() the outputs and release() the lock, or False when
+    another process published outputs while the caller waited, which
+    fetch() then copies. Waiting gives up after *timeout* seconds by
+    raising SingleFlightTimeoutError. A lock that has not been touched for
+    *stale_after* seconds is abandoned; the holder touches it every
+    *heartbeat* seconds.
+    '''
+
+    def __init__(self, root, fingerprint, timeout=600, stale_after=60, heartbeat=10):
+        self.root = os.path.abspath(root)
+        self.fingerprint = fingerprint
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.heartbeat = heartbeat
+        self.lock_file = os.path.join(self.root, fingerprint + '.lock')
+        self.entry = os.path.join(self.root, fingerprint)
+        self.held = False
+        self._token = uuid.uuid4().hex
+        self._since = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _try_lock(self):
+        try:
+            fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'token': self._token, 'pid': os.getpid(), 'host': socket.gethostname(),
+                       'started': time.time()}, f)
+        self.held = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._touch, name='pyfindvs-singleflight', daemon=True)
+        self._thread.start()
+        return True
+
+    def _touch(self):
+        while not self._stop.wait(self.heartbeat):
+            try:
+                os.utime(self.lock_file)
+            except OSError:
+                return
+
+    def _read_lock(self, path):
+        try:
+            st = os.stat(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                owner = json.load(f)
+        except FileNotFoundError:
+            return None, None
+        except (OSError, ValueError):
+            # Being written, or unreadable; only its age can be trusted
+            owner = {}
+        return st, owner
+
+    def _is_stale(self, st, owner):
+        if time.time() - st.st_mtime > self.stale_after:
+            return True
+        pid = owner.get('pid')
+        return owner.get('host') == socket.gethostname() and isinstance(pid, int) and \
+               not _pid_alive(pid)
+
+    def _break_stale_lock(self):
+        st, owner = self._read_lock(self.lock_file)
+        if st is None or not self._is_stale(st, owner):
+            return False
+        # Renaming is atomic, so only one waiter removes the lock
+        broken = '{}.{}.stale'.format(self.lock_file, uuid.uuid4().hex)
+        try:
+            os.rename(self.lock_file, broken)
+        except OSError:
+            return False
+        st, taken = self._read_lock(broken)
+        if owner.get('token') and taken and taken.get('token') != owner.get('token'):
+            # Another waiter broke the stale lock first and this is a new
+            # one, so put it back
+            try:
+                os.rename(broken, self.lock_file)
+                return False
+            except OSError:
+                pass
+        log.warn('removed abandoned build lock {} (held by process {})'.format(
+            self.lock_file, owner.get('pid', 'unknown')))
+        try:
+            os.unlink(broken)
+        except OSError:
+            pass
+        return True
+
+    def _published_since(self, since):
+        manifest = self._manifest()
+        return manifest is not None and manifest.get('published', 0) >= since
+
+    def _manifest(self):
+        try:
+            with open(os.path.join(self.entry, _MANIFEST), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def acquire(self):
+        '''acquire() -> bool
+
+        Returns True once this process holds the lock, and False if
+        another process published outputs for the fingerprint while this
+        one waited. Raises SingleFlightTimeoutError after waiting for
+        longer than timeout.
+        '''
+        os.makedirs(self.root, exist_ok=True)
+        if self._since is None:
+            self._since = time.time()
+        waiting = False
+        delay = 0.05
+        while True:
+            # Outputs published before this process started waiting may
+            # not match its inputs, so are never reused
+            if self._published_since(self._since):
+                return False
+            if self._try_lock():
+                return True
+            if self._break_stale_lock():
+                continue
+            if not waiting:
+                log.info('waiting for a concurrent build of the same extension')
+                waiting = True
+            if self.timeout is not None and time.time() - self._since > self.timeout:
+                raise SingleFlightTimeoutError('timed out after {}s waiting for {}'.format(
+                    self.timeout, self.lock_file))
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def publish(self, files):
+        '''Atomically replaces the published outputs with *files*.'''
+        tmp = '{}.{}.tmp'.format(self.entry, uuid.uuid4().hex)
+        os.makedirs(tmp)
+        try:
+            names = []
+            for f in files:
+                names.append(os.path.basename(f))
+                shutil.copyfile(f, os.path.join(tmp, names[-1]))
+            with open(os.path.join(tmp, _MANIFEST), 'w', encoding='utf-8') as f:
+                json.dump({'fingerprint': self.fingerprint, 'files': names,
+                           'published': time.time()}, f, indent=1)
+            if os.path.isdir(self.entry):
+                # Directories cannot be replaced in one rename on Windows
+                old = '{}.{}.old'.format(self.entry, uuid.uuid4().hex)
+                try:
+                    os.rename(self.entry, old)
+                except OSError:
+                    pass
+                else:
+                    shutil.rmtree(old, ignore_errors=True)
+            os.rename(tmp, self.entry)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    def fetch(self, dest_dir):
+        '''fetch(dest_dir) -> list or None
+
+        Copies the published outputs into *dest_dir* and returns their
+        paths, or returns None if they could not be copied, in which case
+        the next acquire() does not wait for them again.
+        '''
+        manifest = self._manifest()
+        try:
+            if manifest is None:
+                raise OSError('no outputs were published')
+            os.makedirs(dest_dir, exist_ok=True)
+            copied = []
+            for name in manifest['files']:
+                copied.append(os.path.join(dest_dir, name))
+                _copy_atomic(os.path.join(self.entry, name), copied[-1])
+        except (OSError, KeyError) as e:
+            log.warn('cannot reuse outputs of {}: {}'.format(self.entry, e))
+            self._since = time.time()
+            return None
+        return copied
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if not self.held:
+            return
+        self.held = False
+        _, owner = self._read_lock(self.lock_file)
+        # Leave the lock alone if it was broken and taken by another
+        # process while this one was building
+        if owner is not None and owner.get('token') in (None, self._token):
+            try:
+                os.unlink(self.lock_file)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def __repr__(self):
+        return '<{} {}>'.format(type(self).__name__, self.lock_file)
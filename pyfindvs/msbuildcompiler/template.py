@@ -5,13 +5,53 @@
 # Distributed under the terms of the MIT License
 #-------------------------------------------------------------------------
 
+from distutils import log
 from io import BytesIO
-from .options import GlobalOptionsBase, ItemOptionsBase
+from .options import GlobalOptionsBase, ItemOptionsBase, OptionList
 
 import pkgutil
 import os.path
 import xml.etree.ElementTree as ET
 
+# Rendered list options longer than this are reported, since they end up
+# on (or in a response file for) the tool's command line.
+_LONG_OPTION_LENGTH = 4096
+
+def _render(opts, prop_name):
+    value = getattr(opts, prop_name)
+    if value is None:
+        return ''
+    if isinstance(value, OptionList):
+        value = str(value)
+        if len(value) > _LONG_OPTION_LENGTH:
+            log.info('{}.{} is {} characters long'.format(type(opts).__name__, prop_name, len(value)))
+        return value
+    return str(value)
+
+def _extend_shared(option, prop_name, value, shared_value):
+    # Entries of an OptionList that start with the shared entries are
+    # written as additions to the inherited value, which already contains
+    # them, so they are not passed to the tool twice
+    if not isinstance(option, OptionList) or not option.unique:
+        return value
+    entries = list(option)
+    shared_entries = [e for e in shared_value.split(option.sep) if e]
+    if entries[:len(shared_entries)] != shared_entries:
+        return value
+    return option.sep.join(['%({})'.format(prop_name)] + entries[len(shared_entries):])
+
+def _localname(tag):
+    return tag.rpartition('}')[2]
+
+# Item types with definitions in a shared property sheet
+SHARED_ITEM_TYPES = ('ClCompile', 'Link', 'Lib', 'ResourceCompile', 'Midl')
+
+_SHARED_PROPS_LABEL = 'SharedProps'
+
+# Shared property sheets are named for a hash of their content, so each
+# only needs to be read once
+_shared_props_cache = {}
+
 class Template:
     _NS = 'http://schemas.microsoft.com/developer/msbuild/2003'
     _NSD = {'n': _NS}
@@ -25,7 +65,12 @@ class Template:
         else:
             self.root.parse(BytesIO(pkgutil.get_data('pyfindvs.msbuildcompiler', template)))
 
-    def merge_options(self, *options):
+    def merge_options(self, *options, shared=None):
+        '''Writes *options* into the project. *shared* maps item types to
+        the item definitions provided by an imported property sheet, which
+        are only written when they differ. A list that extends the shared
+        one is written as %(Name) followed by the added entries. Global
+        properties are never shared.'''
         for opts in options:
             if isinstance(opts, GlobalOptionsBase):
                 configuration, platform = getattr(opts, 'Configuration', None), getattr(opts, 'Platform', None)
@@ -39,8 +84,7 @@ class Template:
                 for prop_name in dir(opts):
                     if prop_name[0] not in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
                         continue
-                    value = getattr(opts, prop_name)
-                    value = '' if value is None else str(value)
+                    value = _render(opts, prop_name)
                     if value == '$({0})'.format(prop_name):
                         value == None
                     e = go.find("n:" + prop_name, self._NSD)
@@ -55,13 +99,20 @@ class Template:
             elif isinstance(opts, ItemOptionsBase):
                 idg_tag = opts._ItemDefinitionGroup
                 idg = self.root.find('n:ItemDefinitionGroup/n:{}'.format(idg_tag), self._NSD)
+                base = (shared or {}).get(idg_tag, {})
                 for prop_name in dir(opts):
                     if prop_name[0] not in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
                         continue
-                    value = getattr(opts, prop_name)
-                    if value is None or value == '' or value == '%({0})'.format(prop_name):
+                    value = _render(opts, prop_name)
+                    if value == '%({0})'.format(prop_name):
                         continue
-                    ET.SubElement(idg, prop_name).text = str(value)
+                    if prop_name in base:
+                        # An empty value clears the shared one
+                        if value != base[prop_name]:
+                            ET.SubElement(idg, prop_name).text = _extend_shared(
+                                getattr(opts, prop_name), prop_name, value, base[prop_name])
+                    elif value:
+                        ET.SubElement(idg, prop_name).text = value
             else:
                 raise TypeError("unsupported options '{}'".format(type(opts)))
 
@@ -80,6 +131,80 @@ class Template:
             else:
                 raise TypeError('unsupported type for item: {!r}'.format(type(item)))
 
+    def get_properties(self):
+        props = {}
+        for pg in self.root.iterfind('n:PropertyGroup', self._NSD):
+            for e in pg:
+                props[_localname(e.tag)] = e.text or ''
+        return props
+
+    def add_shared_props(self, file):
+        '''Imports the property sheet *file*, whose item definitions apply
+        before the project's own.'''
+        ig = self.root.find("n:ImportGroup[@Label='PropertySheets']", self._NSD)
+        ET.SubElement(ig, '{%s}Import' % self._NS, Project=file, Label=_SHARED_PROPS_LABEL)
+
+    def get_shared_props(self):
+        e = self.root.find("n:ImportGroup[@Label='PropertySheets']/n:Import[@Label='{}']".format(
+            _SHARED_PROPS_LABEL), self._NSD)
+        return e.get('Project') if e is not None else None
+
+    def get_shared_definitions(self):
+        '''Returns the item definitions provided by the imported shared
+        property sheet for each item type.'''
+        file = self.get_shared_props()
+        if not file:
+            return {}
+        defs = _shared_props_cache.get(file)
+        if defs is None:
+            if not os.path.isfile(file):
+                return {}
+            props = Template(file)
+            defs = _shared_props_cache[file] = {
+                item_type: props.get_item_definitions(item_type) for item_type in SHARED_ITEM_TYPES
+            }
+        return defs
+
+    def get_item_definitions(self, item_type):
+        '''Returns the item definitions of *item_type*, with those of the
+        shared property sheet that the project inherits through %(Name)
+        expanded in place.'''
+        shared = self.get_shared_definitions().get(item_type, {})
+        defs = dict(shared)
+        idg = self.root.find('n:ItemDefinitionGroup/n:{}'.format(item_type), self._NSD)
+        if idg is not None:
+            for e in idg:
+                name = _localname(e.tag)
+                value = e.text or ''
+                if name in shared:
+                    value = value.replace('%({})'.format(name), shared[name])
+                defs[name] = value
+        return defs
+
+    def set_item_definition(self, item_type, name, value):
+        idg = self.root.find('n:ItemDefinitionGroup/n:{}'.format(item_type), self._NSD)
+        for e in list(idg):
+            if _localname(e.tag) == name:
+                idg.remove(e)
+        ET.SubElement(idg, name).text = value
+
+    def get_items(self, item_type):
+        ig = self.root.find("n:ItemGroup[@Label='Sources']", self._NSD)
+        items = []
+        for e in ig:
+            if _localname(e.tag) == item_type:
+                item = {_localname(c.tag): c.text or '' for c in e}
+                item['Include'] = e.get('Include')
+                items.append(item)
+        return items
+
+    def remove_items(self, item_type, includes):
+        includes = set(includes)
+        ig = self.root.find("n:ItemGroup[@Label='Sources']", self._NSD)
+        for e in list(ig):
+            if _localname(e.tag) == item_type and e.get('Include') in includes:
+                ig.remove(e)
+
     def save(self, file):
         self.root.write(file, encoding='utf-8', xml_declaration=True)
 
@@ -0,0 +1,94 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+from fnmatch import fnmatch
+
+from .pch import _write_if_changed
+
+import os.path
+import re
+
+_COMMENT_RE = re.compile(r'/\*.*?\*/|//[^\n]*', re.DOTALL)
+# File-scope static definitions, including the common style where the
+# return type and name are on separate lines
+_STATIC_RE = re.compile(r'^static\s[^;{}=()]*?\b([A-Za-z_]\w*)\s*(?:\[[^\]]*\]\s*)?[(=;\[]', re.MULTILINE)
+_DEFINE_RE = re.compile(r'^[ \t]*#[ \t]*define[ \t]+([A-Za-z_]\w*)(.*)$', re.MULTILINE)
+
+_LANGUAGE = {
+    '.c': '.c',
+    '.cpp': '.cpp',
+    '.cxx': '.cpp',
+}
+
+def file_scope_symbols(source):
+    '''file_scope_symbols(source) -> dict
+
+    Returns the names of static definitions and macros at file scope in
+    *source*. Macros map to their definition; statics map to a value
+    unique to the source, since two statics with the same name always
+    conflict in one translation unit.
+    '''
+    with open(source, 'r', encoding='utf-8', errors='replace') as f:
+        text = _COMMENT_RE.sub(' ', f.read())
+    symbols = {}
+    for m in _DEFINE_RE.finditer(text):
+        symbols[m.group(1)] = '#define ' + ' '.join(m.group(2).split())
+    for m in _STATIC_RE.finditer(text):
+        symbols[m.group(1)] = ('static', source)
+    return symbols
+
+def plan_batches(sources, batch_size, exclude=()):
+    '''plan_batches(sources, batch_size, exclude=()) -> (batches, isolated)
+
+    Groups *sources* into batches of at most *batch_size* sources of the
+    same language. Sources are visited in sorted order, so the same
+    inputs always produce the same batches. Sources matching an
+    *exclude* pattern, and sources whose file-scope symbols conflict
+    with an earlier source in their batch, are returned in *isolated*.
+    '''
+    batches = {}
+    isolated = []
+    for s in sorted(sources, key=os.path.normcase):
+        lang = _LANGUAGE.get(os.path.splitext(s)[1].lower())
+        if not lang or any(fnmatch(os.path.basename(s), p) or fnmatch(s, p) for p in exclude):
+            isolated.append(s)
+            continue
+        lang_batches = batches.setdefault(lang, [])
+        if not lang_batches or len(lang_batches[-1][0]) >= batch_size:
+            lang_batches.append(([], {}))
+        batch, symbols = lang_batches[-1]
+        s_symbols = file_scope_symbols(s)
+        if any(k in symbols and symbols[k] != v for k, v in s_symbols.items()):
+            isolated.append(s)
+            continue
+        batch.append(s)
+        symbols.update(s_symbols)
+
+    r = []
+    for lang in sorted(batches):
+        for batch, _ in batches[lang]:
+            if len(batch) == 1:
+                isolated.append(batch[0])
+            elif batch:
+                r.append((lang, batch))
+    return r, isolated
+
+def write_unity_files(directory, batches):
+    '''write_unity_files(directory, batches) -> list[str]
+
+    Writes one unity source per batch and returns their paths. Files are
+    only rewritten when their content changes.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i, (lang, batch) in enumerate(batches):
+        path = os.path.join(directory, 'unity_{}{}'.format(i, lang))
+        content = '/* Generated by pyfindvs */\n' + ''.join(
+            '#include "{}"\n'.format(s) for s in batch)
+        _write_if_changed(path, content)
+        paths.append(path)
+    return paths
@@ -0,0 +1,197 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+from distutils import log
+from distutils.core import Command
+from distutils.errors import CCompilerError, DistutilsError, DistutilsOptionError
+
+from .depends import DependencyDatabase
+
+import os.path
+import threading
+import time
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+class FileWatcher:
+    '''Waits for changes to a set of files.
+
+    Files are polled every *interval* seconds. When watchdog is installed
+    and *native* is true, file system notifications also wake the watcher
+    as soon as something changes. Once a change is seen, the watcher keeps
+    waiting until nothing has changed for *debounce* seconds, so that a
+    burst of edits is reported together.
+    '''
+
+    def __init__(self, interval=0.5, debounce=0.2, native=True):
+        self.interval = interval
+        self.debounce = debounce
+        self._stamps = {}
+        self._wake = threading.Event()
+        self._observer = None
+        self._watched_dirs = set()
+        if native:
+            try:
+                from watchdog.observers import Observer
+            except ImportError:
+                pass
+            else:
+                self._observer = Observer()
+                self._observer.start()
+
+    @property
+    def native(self):
+        return self._observer is not None
+
+    def watch(self, paths):
+        '''Sets the files to watch. Files that were already watched keep
+        their last seen state, so changes made while building are not
+        lost.'''
+        self._stamps = {p: self._stamps[p] if p in self._stamps else _stamp(p) for p in paths}
+        if self._observer is not None:
+            for d in {os.path.dirname(p) for p in paths} - self._watched_dirs:
+                if os.path.isdir(d):
+                    self._observer.schedule(self, d, recursive=False)
+                    self._watched_dirs.add(d)
+
+    def dispatch(self, event):
+        # Called by watchdog for every event in a watched directory
+        self._wake.set()
+
+    def _changes(self):
+        changed = set()
+        for p, stamp in self._stamps.items():
+            current = _stamp(p)
+            if current != stamp:
+                self._stamps[p] = current
+                changed.add(p)
+        return changed
+
+    def wait(self):
+        '''wait() -> (changed paths, time of the first change)
+
+        Blocks until watched files change and returns them, with the
+        time.monotonic() at which the first change was seen.
+        '''
+        changed = set()
+        while not changed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            changed = self._changes()
+        first = time.monotonic()
+        while True:
+            self._wake.wait(self.debounce)
+            self._wake.clear()
+            more = self._changes()
+            if not more:
+                return changed, first
+            changed |= more
+
+    def close(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+class watch(Command):
+    description = 'rebuild extension modules when their sources change'
+
+    user_options = [
+        ('inplace', 'i',
+         'put compiled extensions into the source directory alongside your pure Python modules'),
+        ('interval=', None,
+         'seconds between checks for changed files [default: 0.5]'),
+        ('debounce=', None,
+         'seconds without further changes before rebuilding [default: 0.2]'),
+        ('poll', None,
+         'only poll for changes, even if watchdog is installed'),
+    ]
+
+    boolean_options = ['inplace', 'poll']
+
+    def initialize_options(self):
+        self.inplace = None
+        self.interval = None
+        self.debounce = None
+        self.poll = None
+
+    def finalize_options(self):
+        try:
+            self.interval = float(self.interval or 0.5)
+            self.debounce = float(self.debounce or 0.2)
+        except ValueError:
+            raise DistutilsOptionError("'interval' and 'debounce' must be numbers")
+
+    def _inputs(self, build_ext):
+        # The files each extension is built from: its sources and depends,
+        # and the headers its sources included when they were last built.
+        # These are recorded in the compiler's intermediate directory,
+        # which is below build_temp when a build profile is set.
+        int_dir = getattr(build_ext.compiler, '_int_dir', os.path.abspath)(build_ext.build_temp)
+        db = DependencyDatabase.load(int_dir)
+        inputs = {}
+        for ext in build_ext.extensions:
+            paths = set()
+            for s in ext.sources:
+                s = os.path.abspath(s)
+                paths.add(s)
+                paths.update(db.dependencies_of(s))
+            paths.update(os.path.abspath(d) for d in ext.depends or ())
+            inputs[ext.name] = paths
+        return inputs
+
+    def _build(self, build_ext, extensions):
+        for ext in extensions:
+            try:
+                build_ext.build_extension(ext)
+            except (CCompilerError, DistutilsError) as e:
+                log.error('building {} failed: {}'.format(ext.name, e))
+
+    def run(self):
+        # The build_ext command, and the compiler it creates, are kept for
+        # every rebuild, so discovery only runs once
+        build_ext = self.distribution.get_command_obj('build_ext')
+        if self.inplace:
+            build_ext.inplace = 1
+        build_ext.ensure_finalized()
+        try:
+            build_ext.run()
+        except (CCompilerError, DistutilsError) as e:
+            log.error('initial build failed: {}'.format(e))
+            if build_ext.compiler is None or isinstance(build_ext.compiler, str):
+                raise
+        # Sources are known to have changed when rebuilding
+        build_ext.force = 1
+
+        watcher = FileWatcher(self.interval, self.debounce, native=not self.poll)
+        log.info('watching for changes{}; press Ctrl+C to stop'.format(
+            '' if watcher.native else ' by polling'))
+        try:
+            while True:
+                inputs = self._inputs(build_ext)
+                watcher.watch(set().union(*inputs.values()))
+                changed, first = watcher.wait()
+                affected = [ext for ext in build_ext.extensions if inputs[ext.name] & changed]
+                if not affected:
+                    continue
+                log.info('{} changed; rebuilding {}'.format(
+                    ', '.join(sorted(os.path.basename(p) for p in changed)),
+                    ', '.join(ext.name for ext in affected)))
+                start = time.monotonic()
+                self._build(build_ext, affected)
+                end = time.monotonic()
+                log.info('rebuilt in {:.2f}s ({:.2f}s after the first change)'.format(
+                    end - start, end - first))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
@@ -0,0 +1,183 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import platform
+import re
+
+__all__ = ['ToolIndex', 'native_arch']
+
+# known_paths key suffix -> (host arch, target arch)
+_SUFFIX_ARCH = {
+    '': ('x86', 'x86'),
+    '_x64': ('x64', 'x64'),
+    '_x86_64': ('x86', 'x64'),
+}
+
+# Tools that build for any target, whichever host variant is found
+_HOST_NEUTRAL_TOOLS = {'msbuild.exe'}
+
+_PLATFORM_ARCH = {
+    'win32': 'x86',
+    'win-amd64': 'x64',
+}
+
+_MACHINE_ARCH = {
+    'amd64': 'x64',
+    'x86_64': 'x64',
+    'x86': 'x86',
+    'i386': 'x86',
+    'i686': 'x86',
+    'arm64': 'arm64',
+    'aarch64': 'arm64',
+}
+
+_TOOLSET_VERSION_RE = re.compile(r'[\\/]MSVC[\\/](\d+(?:\.\d+)*)[\\/]', re.IGNORECASE)
+
+_BUILD_TOOLS_PACKAGE = 'Microsoft.VisualStudio.Product.BuildTools'
+
+def native_arch():
+    return _MACHINE_ARCH.get(platform.machine().lower(), 'x86')
+
+def _split_key(key):
+    for suffix in sorted(_SUFFIX_ARCH, key=len, reverse=True):
+        if suffix and key.endswith(suffix):
+            return key[:-len(suffix)], suffix
+    return key, ''
+
+def _is_build_tools(instance):
+    if instance is None:
+        return False
+    if _BUILD_TOOLS_PACKAGE in getattr(instance, 'packages', ()):
+        return True
+    return 'buildtools' in (getattr(instance, 'path', '') or '').lower()
+
+class ToolEntry:
+    def __init__(self, tool, host, target, version_info, path, instance=None):
+        self.tool = tool
+        self.host = host
+        self.target = target
+        self.version_info = version_info
+        self.path = path
+        self.instance = instance
+
+    def __repr__(self):
+        return '<{} {} {}->{} {} at {}>'.format(type(self).__name__, self.tool, self.host,
+            self.target, '.'.join(str(v) for v in self.version_info), self.path)
+
+class ToolIndex:
+    '''Resolves (tool, host arch, target arch, minimum version) to a path.
+
+    The index is built once from the known_paths of a set of instances.
+    When several entries match, the entry from *prefer_instance* (an
+    instance_id or path) wins, then the newest toolset, then one from a
+    Build Tools install if *prefer_build_tools* is True (or from an IDE
+    install if it is False), then one that runs natively on this machine.
+    Tools that have no architecture-specific variants, such as SDK
+    include directories, and tools that build for any target, such as
+    MSBuild, match any target.
+    '''
+
+    _cache = {}
+
+    def __init__(self, prefer_instance=None, prefer_build_tools=None):
+        self.prefer_instance = prefer_instance
+        self.prefer_build_tools = prefer_build_tools
+        self._entries = {}
+        self._arch_specific = set()
+
+    @classmethod
+    def for_instances(cls, instances, prefer_instance=None, prefer_build_tools=None):
+        '''Returns the index for *instances*. Indexes are cached for each
+        discovery snapshot, so repeated calls with the same instances do
+        not rebuild it.'''
+        key = tuple(id(i) for i in instances), prefer_instance, prefer_build_tools
+        cached = cls._cache.get(key)
+        if cached is None:
+            index = cls(prefer_instance, prefer_build_tools)
+            for inst in instances:
+                index.add(inst.known_paths, inst.version_info, inst)
+            # The instances are kept alive so that their ids stay valid
+            cls._cache = {key: (index, list(instances))}
+            return index
+        return cached[0]
+
+    @classmethod
+    def from_known_paths(cls, known_paths, version_info=()):
+        index = cls()
+        index.add(known_paths, version_info)
+        return index
+
+    def add(self, known_paths, version_info=(), instance=None):
+        for key, path in known_paths.items():
+            if not path:
+                continue
+            tool, suffix = _split_key(key)
+            host, target = _SUFFIX_ARCH[suffix]
+            if suffix and tool not in _HOST_NEUTRAL_TOOLS:
+                self._arch_specific.add(tool)
+            m = _TOOLSET_VERSION_RE.search(path)
+            version = tuple(int(v) for v in m.group(1).split('.')) if m else tuple(version_info)
+            self._entries.setdefault(tool, []).append(
+                ToolEntry(tool, host, target, version, path, instance))
+
+    @property
+    def tools(self):
+        return sorted(self._entries)
+
+    def _rank(self, entry, native):
+        inst = entry.instance
+        preferred = self.prefer_instance is not None and inst is not None and \
+            self.prefer_instance in (inst.instance_id, inst.path)
+        kind_mismatch = self.prefer_build_tools is not None and \
+            _is_build_tools(inst) != self.prefer_build_tools
+        return (not preferred, tuple(-v for v in entry.version_info), kind_mismatch,
+                entry.host != native)
+
+    def entries(self, tool, host=None, target='x86', min_version=None):
+        '''Returns the matching entries for *tool*, best first.'''
+        native = native_arch()
+        candidates = []
+        for e in self._entries.get(tool, ()):
+            if tool in self._arch_specific and e.target != target:
+                continue
+            if host is not None and e.host != host:
+                continue
+            if min_version is not None and e.version_info < tuple(min_version):
+                continue
+            candidates.append(e)
+        candidates.sort(key=lambda e: self._rank(e, host or native))
+        return candidates
+
+    def find(self, tool, host=None, target='x86', min_version=None):
+        '''find(tool, host=None, target='x86', min_version=None) -> str or None
+
+        Returns the best path for *tool* running on *host* (any host,
+        preferring this machine's, if None) and producing code for
+        *target*.
+        '''
+        e = self.entries(tool, host, target, min_version)
+        return e[0].path if e else None
+
+    def resolve_platform(self, plat_name, host=None):
+        '''resolve_platform(plat_name, host=None) -> dict
+
+        Returns the best path for every indexed tool when building for
+        *plat_name* ('win32' or 'win-amd64').
+        '''
+        try:
+            target = _PLATFORM_ARCH[plat_name]
+        except KeyError:
+            raise ValueError("'{}' is not a supported platform".format(plat_name))
+        r = {}
+        for tool in self._entries:
+            path = self.find(tool, host, target)
+            if path:
+                r[tool] = path
+        return r
+
+    def __repr__(self):
+        return '<{} ({} tools)>'.format(type(self).__name__, len(self._entries))
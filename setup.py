@@ -53,7 +53,8 @@ SETUP_CONFIG_DLL_PATH = SETUP_CONFIG_PATH / 'tools' / PLATFORM
 
 ENTRY_POINTS = {
     "distutils.commands": [
-        "enable_msbuildcompiler=pyfindvs.msbuildcompiler.enable_msbuildcompiler:enable_msbuildcompiler"
+        "enable_msbuildcompiler=pyfindvs.msbuildcompiler.enable_msbuildcompiler:enable_msbuildcompiler",
+        "watch=pyfindvs.msbuildcompiler.watch:watch",
     ],
 }
 
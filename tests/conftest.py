@@ -0,0 +1,89 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import _support
+
+# Lets pyfindvs be imported where the _helper extension is not built
+_support.install_fake_helper()
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+@pytest.fixture
+def fixture_path():
+    return lambda *names: os.path.join(FIXTURES, *names)
+
+# Arguments are read from the command line, or from a UTF-16 response
+# file as the direct backend passes them
+_STUB_ARGS = '''
+import sys
+args = sys.argv[1:]
+if len(args) == 1 and args[0].startswith('@'):
+    with open(args[0][1:], encoding='utf-16') as f:
+        args = f.read().splitlines()
+'''
+
+_STUB_CL = _STUB_ARGS + '''
+# Stand-in for cl.exe: copies the source named by /Tc or /Tp, or the
+# last argument, to the object file named by /Fo, and fails on sources
+# containing "#error".
+src = obj = None
+for arg in args:
+    if arg[:3] in ('/Tc', '/Tp'):
+        src = arg[3:]
+    elif arg.startswith('/Fo'):
+        obj = arg[3:]
+src = src or args[-1]
+with open(src, 'rb') as f:
+    data = f.read()
+if b'#error' in data:
+    print('{}(1): error C1189: #error'.format(src))
+    sys.exit(2)
+with open(obj, 'wb') as f:
+    f.write(b'OBJ ' + ' '.join(args).encode() + b'\\n' + data)
+'''
+
+_STUB_LINK = _STUB_ARGS + '''
+# Stand-in for link.exe: concatenates the objects into the file named
+# by /OUT: and reports a warning.
+out = next(a[5:] for a in args if a.startswith('/OUT:'))
+with open(out, 'wb') as f:
+    for arg in args:
+        if arg.endswith('.obj'):
+            with open(arg, 'rb') as obj:
+                f.write(obj.read())
+print("LINK : warning LNK4197: export 'PyInit_spam' specified multiple times")
+'''
+
+def write_stub_tool(directory, name, source):
+    '''Writes an executable Python script called *name* to *directory*
+    and returns its path.'''
+    path = os.path.join(str(directory), name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('#!{}\n'.format(sys.executable))
+        f.write(source)
+    os.chmod(path, 0o755)
+    return path
+
+@pytest.fixture
+def stub_cl(tmp_path):
+    if sys.platform == 'win32':
+        pytest.skip('stub tools are shell scripts')
+    return write_stub_tool(tmp_path, 'cl', _STUB_CL)
+
+@pytest.fixture
+def stub_link(tmp_path):
+    if sys.platform == 'win32':
+        pytest.skip('stub tools are shell scripts')
+    return write_stub_tool(tmp_path, 'link', _STUB_LINK)
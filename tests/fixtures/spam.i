@@ -0,0 +1,20 @@
+#line 1 "C:\\src\\spam\\spam.c"
+#line 1 "C:\\src\\spam\\include\\spam.h"
+#pragma once
+
+typedef struct _spam {
+    int eggs;
+} spam_t;
+#line 2 "C:\\src\\spam\\spam.c"
+#line 1 "C:\\Python37\\include\\Python.h"
+#pragma pack(push, 8)
+typedef __int64 Py_ssize_t;
+#pragma pack(pop)
+#line 3 "C:\\src\\spam\\spam.c"
+
+static int add(spam_t *s, int n)
+{
+    return s->eggs + n;
+}
+
+const char *spam_file = "C:\\src\\spam\\spam.c";
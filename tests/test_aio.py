@@ -0,0 +1,56 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import asyncio
+import sys
+import threading
+
+import pytest
+
+from pyfindvs.msbuildcompiler import MSBuildCompiler
+from pyfindvs.msbuildcompiler.aio import BuildTimeoutError, LineProcess, build_semaphore
+
+def _lines(proc):
+    async def read():
+        return [line async for line in proc]
+    return asyncio.run(read())
+
+def test_line_process():
+    proc = LineProcess([sys.executable, '-c', 'print("spam"); print("eggs\\r"); raise SystemExit(3)'])
+    assert _lines(proc) == ['spam', 'eggs']
+    assert proc.returncode == 3
+
+def test_line_process_reads_long_lines():
+    # Longer than asyncio's default 64 KiB stream limit
+    proc = LineProcess([sys.executable, '-c', 'print("x" * 200000); print("done")'])
+    lines = _lines(proc)
+    assert [len(line) for line in lines] == [200000, 4]
+    assert proc.returncode == 0
+
+def test_line_process_timeout():
+    proc = LineProcess([sys.executable, '-c', 'import time; print("started", flush=True); time.sleep(60)'],
+                       timeout=1)
+    with pytest.raises(BuildTimeoutError):
+        _lines(proc)
+    assert proc.returncode is not None
+
+def test_build_semaphore_per_loop():
+    assert asyncio.run(_semaphore(2)) is not asyncio.run(_semaphore(2))
+
+async def _semaphore(limit):
+    sem = build_semaphore(limit)
+    assert build_semaphore(limit) is sem
+    assert build_semaphore(limit + 1) is not sem
+    return sem
+
+def test_compile_async_runs_in_executor(monkeypatch):
+    cc = MSBuildCompiler()
+    threads = []
+    monkeypatch.setattr(cc, 'compile', lambda sources, **kwargs:
+                        threads.append(threading.current_thread()) or [sources, kwargs])
+    assert asyncio.run(cc.compile_async(['spam.c'], output_dir='build')) == [['spam.c'], {'output_dir': 'build'}]
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,89 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import os
+import sys
+
+import pytest
+
+import _support
+from conftest import write_stub_tool
+
+from pyfindvs.msbuildcompiler import MSBuildCompiler
+from pyfindvs.msbuildcompiler.artifacts import ArtifactCache
+
+_MSBUILD = '''
+import os, re, sys
+# Stand-in for msbuild.exe: writes a CL.read tlog listing each source,
+# its header and the intermediate PDB, and an output built from them.
+with open(sys.argv[-1], encoding='utf-8') as f:
+    text = f.read()
+prop = lambda n: re.search(r'<{0}>([^<]*)</{0}>'.format(n), text).group(1)
+sources = re.findall(r'ClCompile Include="([^"]+)"', text)
+int_dir = prop('IntDir')
+os.makedirs(os.path.join(int_dir, 'spam.tlog'), exist_ok=True)
+with open(os.path.join(int_dir, 'spam.tlog', 'CL.read.1.tlog'), 'w') as f:
+    for s in sources:
+        header = os.path.join(os.path.dirname(s), 'spam.h')
+        f.write('^{0}\\n{0}\\n{1}\\n{2}vc140.pdb\\n'.format(s, header, int_dir))
+        with open(header) as h:
+            built = h.read()
+output = prop('OutDir') + prop('TargetName') + prop('TargetExt')
+with open(output, 'w') as f:
+    f.write(built)
+with open(os.path.join(os.path.dirname(sys.argv[0]), 'builds.log'), 'a') as f:
+    f.write(output + '\\n')
+'''
+
+@pytest.fixture
+def msbuild(tmp_path):
+    if sys.platform == 'win32':
+        pytest.skip('stub tools are shell scripts')
+    tools = tmp_path / 'tools'
+    tools.mkdir()
+    path = write_stub_tool(tools, 'msbuild', _MSBUILD)
+    _support.patch_discovery(_support.fake_instances(path))
+    return path
+
+def _checkout(root, header='int spam;\n'):
+    src = root / 'src'
+    src.mkdir(parents=True)
+    (src / 'spam.c').write_text('#include "spam.h"\n')
+    (src / 'spam.h').write_text(header)
+    return root
+
+def _build(root, cache, monkeypatch):
+    monkeypatch.chdir(root)
+    cc = MSBuildCompiler()
+    cc.artifact_cache = cache
+    cc.initialize('win-amd64')
+    # The build directory differs between checkouts, as between venvs
+    build = str(root / 'build-{}'.format(root.name))
+    objs = cc.compile([str(root / 'src' / 'spam.c')], output_dir=build + '/t')
+    return cc.link('shared_object', objs, 'spam.pyd', output_dir=build + '/o', build_temp=build + '/t')
+
+def _builds(msbuild):
+    with open(os.path.join(os.path.dirname(msbuild), 'builds.log')) as f:
+        return len(f.readlines())
+
+def test_hit_across_build_directories(tmp_path, msbuild, monkeypatch):
+    cache = ArtifactCache(str(tmp_path / 'cache'))
+    first = _build(_checkout(tmp_path / 'a'), cache, monkeypatch)
+    assert not first.from_cache
+    second = _build(_checkout(tmp_path / 'b'), cache, monkeypatch)
+    assert second.from_cache
+    assert cache.stats()['hits'] == 1
+    assert _builds(msbuild) == 1
+    with open(second.output) as f:
+        assert f.read() == 'int spam;\n'
+
+def test_miss_when_header_differs(tmp_path, msbuild, monkeypatch):
+    cache = ArtifactCache(str(tmp_path / 'cache'))
+    _build(_checkout(tmp_path / 'a'), cache, monkeypatch)
+    second = _build(_checkout(tmp_path / 'b', header='int eggs;\n'), cache, monkeypatch)
+    assert not second.from_cache
+    assert _builds(msbuild) == 2
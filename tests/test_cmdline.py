@@ -0,0 +1,116 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+from pyfindvs.msbuildcompiler.cmdline import (
+    DEFAULT_LINK_LIBRARIES, cl_compile_args, cl_preprocess_args, expand, lib_args, link_args,
+    object_file, rc_args, split_list)
+
+PROPS = {'IntDir': 'T\\', 'OutDir': 'O\\', 'CharacterSet': 'Unicode',
+         'ConfigurationType': 'DynamicLibrary', 'Platform': 'x64'}
+
+def test_expand():
+    assert expand('$(IntDir)x.obj', PROPS) == 'T\\x.obj'
+    assert expand('$(Missing)x', PROPS) == 'x'
+    assert expand(None, PROPS) == ''
+
+def test_split_list_drops_inherited_metadata():
+    assert split_list('A; B;;%(PreprocessorDefinitions)') == ['A', 'B']
+
+def test_object_file():
+    assert object_file('spam.c', {}, PROPS) == 'T\\spam.obj'
+    assert object_file('spam.c', {'ObjectFileName': '$(IntDir)sub\\'}, PROPS) == 'T\\sub\\spam.obj'
+    assert object_file('spam.c', {'ObjectFileName': 'x.obj'}, PROPS) == 'x.obj'
+
+def test_cl_compile_args():
+    unsupported = []
+    args = cl_compile_args({
+        'Optimization': 'MaxSpeed',
+        'DebugInformationFormat': 'OldStyle',
+        'RuntimeLibrary': 'MultiThreadedDLL',
+        'ObjectFileName': '$(IntDir)',
+        'AdditionalIncludeDirectories': '$(IntDir)inc;C:\\include;%(AdditionalIncludeDirectories)',
+        'PreprocessorDefinitions': 'A=1;B',
+        'AdditionalOptions': '/bigobj /DX %(AdditionalOptions)',
+        'PrecompiledHeader': 'Use',
+        'PrecompiledHeaderFile': 'pch.h',
+        'NotAnOption': 'true',
+    }, PROPS, unsupported)
+    assert args == [
+        '/GS', '/Gd', '/Z7', '/EHsc', '/fp:precise', '/Zc:forScope', '/FoT\\', '/O2', '/MD',
+        '/nologo', '/Zc:wchar_t', '/Yupch.h',
+        '/D_UNICODE', '/DUNICODE', '/D_WINDLL', '/IT\\inc', '/IC:\\include', '/DA=1', '/DB',
+        '/bigobj', '/DX',
+    ]
+    assert unsupported == ['NotAnOption']
+
+def test_cl_compile_args_without_preprocessing():
+    args = cl_compile_args({'Optimization': 'Disabled', 'PreprocessorDefinitions': 'A',
+                            'AdditionalOptions': '/bigobj /DX /Iinc'}, PROPS, preprocess=False)
+    assert '/Od' in args and '/bigobj' in args
+    assert not [a for a in args if a.startswith(('/D', '/I'))]
+
+def test_cl_compile_args_switches():
+    args = cl_compile_args({'FunctionLevelLinking': 'true', 'BufferSecurityCheck': 'false',
+                            'RuntimeTypeInfo': 'false', 'WarningLevel': 'Level4'})
+    assert '/Gy' in args and '/GS-' in args and '/GR-' in args and '/W4' in args
+    assert '/GS' not in args
+
+def test_cl_preprocess_args():
+    assert cl_preprocess_args({'CompileAs': 'CompileAsCpp', 'ForcedIncludeFiles': 'a.h',
+                               'UndefinePreprocessorDefinitions': 'NDEBUG'}) == \
+        ['/TP', '/UNDEBUG', '/FIa.h']
+
+def test_link_args():
+    unsupported = []
+    args = link_args({
+        'GenerateDebugInformation': 'true',
+        'AdditionalDependencies': 'python3.lib;%(AdditionalDependencies)',
+        'AdditionalLibraryDirectories': 'C:\\libs',
+        'DelayLoadDLLs': 'a.dll;b.dll',
+        'OutputFile': '$(OutDir)spam.pyd',
+        'LinkDLL': 'true',
+        'AdditionalOptions': '/LTCG',
+        'Unknown': 'x',
+    }, PROPS, unsupported)
+    # Options are translated in order of their names
+    assert args[:10] == ['python3.lib', '/LIBPATH:C:\\libs', '/NXCOMPAT', '/DELAYLOAD:a.dll',
+                         '/DELAYLOAD:b.dll', '/DEBUG', '/DLL', '/OUT:O\\spam.pyd', '/DYNAMICBASE',
+                         '/NOLOGO']
+    assert args[10:10 + len(DEFAULT_LINK_LIBRARIES)] == list(DEFAULT_LINK_LIBRARIES)
+    assert args[-6:] == ['/MACHINE:X64', '/INCREMENTAL:NO', '/MANIFEST', '/MANIFEST:EMBED',
+                         '/MANIFESTUAC:NO', '/LTCG']
+    assert unsupported == ['Unknown']
+
+def test_link_args_properties():
+    args = link_args({'TargetMachine': 'MachineX86'},
+                     {'Platform': 'x64', 'LinkIncremental': 'true', 'GenerateManifest': 'false',
+                      'ConfigurationType': 'Application'})
+    assert '/MACHINE:X86' in args and '/MACHINE:X64' not in args
+    assert '/INCREMENTAL' in args and '/MANIFEST:NO' in args
+
+def test_link_args_executable_manifest():
+    args = link_args({}, {'ConfigurationType': 'Application'})
+    assert "/MANIFESTUAC:level='asInvoker' uiAccess='false'" in args
+
+def test_lib_args():
+    assert lib_args({'OutputFile': '$(OutDir)spam.lib', 'ExportNamedFunctions': 'f;g'}, PROPS) == \
+        ['/EXPORT:f', '/EXPORT:g', '/OUT:O\\spam.lib', '/NOLOGO', '/MACHINE:X64']
+    assert lib_args({'TargetMachine': 'MachineARM64'}, PROPS) == ['/NOLOGO', '/MACHINE:ARM64']
+
+def test_rc_args():
+    args = rc_args({'PreprocessorDefinitions': 'V=1', 'Culture': '0x0409',
+                    'ResourceOutputFileName': '$(IntDir)spam.res', 'AdditionalOptions': '/c65001'},
+                   PROPS)
+    # _WINDLL is only defined for the compiler
+    assert args == ['/D_UNICODE', '/DUNICODE', '/l0x0409', '/DV=1', '/foT\\spam.res', '/nologo',
+                    '/c65001']
+
+def test_cl_preprocess_args_omit_reporting_switches():
+    opts = {'PreprocessorDefinitions': 'A', 'AdditionalOptions': '/Bt+ /DX /d2cgsummary -Bt /utf-8'}
+    assert cl_preprocess_args(opts) == ['/DA', '/DX', '/utf-8']
+    # They are still passed when compiling
+    assert cl_compile_args(opts)[-6:] == ['/DA', '/Bt+', '/DX', '/d2cgsummary', '-Bt', '/utf-8']
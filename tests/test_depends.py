@@ -0,0 +1,63 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import os
+
+from pyfindvs.msbuildcompiler.depends import DependencyDatabase, parse_show_includes, read_tlogs
+
+def _write_tlog(int_dir, lines):
+    tlog_dir = int_dir / 'spam.tlog'
+    tlog_dir.mkdir(parents=True)
+    # MSBuild writes tracking logs in UTF-16
+    (tlog_dir / 'CL.read.1.tlog').write_bytes('\r\n'.join(lines).encode('utf-16'))
+
+def test_read_tlogs_skips_build_outputs(tmp_path):
+    int_dir = tmp_path / 'build' / 'temp'
+    out_dir = tmp_path / 'build' / 'lib'
+    source = str(tmp_path / 'spam.c').upper()
+    header = str(tmp_path / 'spam.h').upper()
+    _write_tlog(int_dir, [
+        '^' + source,
+        source,
+        header,
+        str(int_dir / 'vc140.pdb').upper(),
+        str(int_dir / 'generated.h').upper(),
+        str(out_dir / 'spam.lib').upper(),
+        str(tmp_path / 'elsewhere' / 'spam.pch').upper(),
+    ])
+    assert read_tlogs(str(int_dir), [str(out_dir)]) == {source: [source, header]}
+
+def test_read_tlogs_shared_sources(tmp_path):
+    _write_tlog(tmp_path, ['^A.C|B.C', 'COMMON.H', '^B.C', 'B.H'])
+    assert read_tlogs(str(tmp_path)) == {'A.C': ['COMMON.H'], 'B.C': ['COMMON.H', 'B.H']}
+
+def test_parse_show_includes():
+    includes, other = parse_show_includes(
+        'spam.c\nNote: including file: C:\\a.h\nNote: including file:  C:\\b.h\n'
+        'Note: including file: C:\\a.h\nspam.c(1): warning C4100: x\n')
+    assert includes == ['C:\\a.h', 'C:\\b.h']
+    assert other == ['spam.c', 'spam.c(1): warning C4100: x']
+
+def test_database_detects_changed_header(tmp_path):
+    source, header = tmp_path / 'spam.c', tmp_path / 'spam.h'
+    source.write_text('#include "spam.h"\n')
+    header.write_text('int x;\n')
+    obj = tmp_path / 'spam.obj'
+    obj.write_bytes(b'')
+
+    db = DependencyDatabase.load(str(tmp_path))
+    db.record(str(source), [str(header)], str(obj), 'cmd')
+    db.save()
+
+    db = DependencyDatabase.load(str(tmp_path))
+    assert db.is_up_to_date(str(source), 'cmd')
+    assert not db.is_up_to_date(str(source), 'other')
+    assert db.changed_since() == {}
+
+    header.write_text('int x, y;\n')
+    assert db.changed_since() == {str(source): [str(header)]}
+    assert db.dependents_of(str(header)) == [str(source)]
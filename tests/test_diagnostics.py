@@ -0,0 +1,100 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import json
+
+import pytest
+
+from pyfindvs.msbuildcompiler.diagnostics import BuildResult, parse_diagnostic
+from pyfindvs.msbuildcompiler.performance import PerformanceReport, write_reports
+
+PROJECT = 'C:\\src\\spam\\build\\temp.win-amd64-3.7\\Release\\template.g.vcxproj'
+
+def _feed_log(path, performance=True):
+    result = BuildResult(PROJECT)
+    if performance:
+        result.performance = PerformanceReport('spam.pyd')
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip()
+            if result.performance is not None and result.performance.feed(line):
+                continue
+            result.feed(line)
+    return result
+
+@pytest.fixture
+def result(fixture_path):
+    return _feed_log(fixture_path('msbuild_minimal.log'))
+
+def test_diagnostics_from_log(result):
+    assert [(d.severity, d.code) for d in result.diagnostics] == [
+        ('warning', 'C4244'), ('error', 'C2065'), ('warning', 'C4530'), ('error', 'LNK1104'),
+        ('warning', 'MSB8012'), ('error', 'LNK2019'), ('error', 'MSB1009'), ('warning', 'D9002'),
+    ]
+    assert len(result.errors) == 4 and len(result.warnings) == 4
+
+def test_source_location(result):
+    d = result.diagnostics[0]
+    assert (d.file, d.line, d.column) == ('C:\\src\\spam\\spam.c', 12, 5)
+    assert d.project == PROJECT
+    assert d.message == "'=': conversion from 'Py_ssize_t' to 'int', possible loss of data"
+    assert str(d) == "C:\\src\\spam\\spam.c(12,5): warning C4244: " + d.message
+
+def test_path_with_parentheses(result):
+    d = result.diagnostics[2]
+    assert d.file.endswith('\\include\\xlocale') and d.file.startswith('c:\\program files (x86)\\')
+    assert d.line == 319 and d.column is None
+
+def test_tool_origin_and_subcategory(result):
+    link, cl = result.diagnostics[3], result.diagnostics[7]
+    assert (link.file, link.subcategory, link.line) == ('LINK', 'fatal', None)
+    assert str(link) == "LINK: fatal error LNK1104: cannot open file 'python37.lib'"
+    assert (cl.file, cl.subcategory) == ('cl', 'Command line')
+    msbuild = result.diagnostics[6]
+    assert msbuild.project is None and msbuild.message == 'Project file does not exist.'
+
+@pytest.mark.parametrize('line', [
+    '  spam.c',
+    'Build FAILED.',
+    '  spam.vcxproj -> C:\\src\\spam\\build\\lib\\spam.pyd',
+    '    0 Warning(s)',
+    '',
+])
+def test_other_lines(line):
+    assert parse_diagnostic(line) is None
+
+def test_performance_summary(result):
+    report = result.performance
+    assert report.targets['ClCompile'] == (1510, 1)
+    assert report.tasks['MakeDir'] == (2, 2)
+    assert report.projects == {PROJECT: (2245, 1)}
+    assert list(report.evaluation) == [PROJECT]
+    # The summary is not mistaken for diagnostics
+    assert all(d.file != 'ClCompile' for d in result.diagnostics)
+
+def test_compile_times(result):
+    # Tool paths under Program Files (x86) contain parentheses
+    assert result.performance.sources == {
+        'C:\\src\\spam\\spam.c': {'c1.dll': 0.05317, 'c2.dll': 0.0121},
+        'C:\\src\\spam\\eggs.cpp': {'c1xx.dll': 0.48102},
+    }
+
+@pytest.mark.parametrize('format', ['json', 'trace'])
+def test_write_reports(result, tmp_path, format):
+    file = str(tmp_path / 'report.json')
+    write_reports(file, [result.performance], format)
+    with open(file, encoding='utf-8') as f:
+        data = json.load(f)
+    if format == 'json':
+        assert data['reports'][0]['targets']['Link'] == {'milliseconds': 640, 'calls': 1}
+    else:
+        names = {e['name'] for e in data['traceEvents'] if e['ph'] == 'X'}
+        assert {'ClCompile', 'CL', 'C:\\src\\spam\\eggs.cpp'} <= names
+
+def test_write_reports_rejects_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        write_reports(str(tmp_path / 'r'), [], 'xml')
@@ -0,0 +1,129 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import threading
+
+import pytest
+
+import pyfindvs
+from pyfindvs import VisualStudioInstance
+
+def _instance(instance_id, *packages):
+    return VisualStudioInstance(instance_id, instance_id, '15.9.0.0', 'C:\\' + instance_id,
+                                list(packages), {})
+
+@pytest.fixture
+def providers(monkeypatch):
+    # Two providers that record each instance they produce, and hold the
+    # second provider until released
+    produced = []
+    release = threading.Event()
+    def first():
+        for i in (_instance('a', 'Microsoft.Build'), _instance('b', 'Microsoft.Build', 'VC')):
+            produced.append(i.instance_id)
+            yield i
+    def second():
+        release.wait(5)
+        for i in (_instance('c', 'WinSDK'),):
+            produced.append(i.instance_id)
+            yield i
+    monkeypatch.setattr(pyfindvs, '_providers', lambda: [first, second])
+    monkeypatch.setattr(pyfindvs, '_findall_cache', None)
+    monkeypatch.setattr(pyfindvs, '_background', None)
+    yield produced, release
+    release.set()
+    if pyfindvs._background is not None:
+        pyfindvs._background.join()
+
+def test_findfirst_stops_at_match(providers):
+    produced, release = providers
+    vs = pyfindvs.findfirst('VC', cache_in_background=False)
+    assert vs.instance_id == 'b'
+    assert produced == ['a', 'b']
+    assert pyfindvs._findall_cache is None
+
+def test_background_completes_the_same_scan(providers):
+    produced, release = providers
+    assert pyfindvs.findfirst('VC').instance_id == 'b'
+    release.set()
+    assert [i.instance_id for i in pyfindvs.findall()] == ['a', 'b', 'c']
+    # The instances found before the match are not scanned again
+    assert produced == ['a', 'b', 'c']
+    assert not pyfindvs._background.is_alive()
+
+def test_iterinstances_waits_for_background(providers):
+    produced, release = providers
+    pyfindvs.findfirst('VC')
+    it = pyfindvs.iterinstances()
+    result = []
+    reader = threading.Thread(target=lambda: result.extend(it))
+    reader.start()
+    reader.join(0.2)
+    assert reader.is_alive() and result == []
+    release.set()
+    reader.join(5)
+    assert [i.instance_id for i in result] == ['a', 'b', 'c']
+    assert produced == ['a', 'b', 'c']
+
+def test_findfirst_uses_cache(providers):
+    produced, release = providers
+    release.set()
+    pyfindvs.findall()
+    assert pyfindvs.findfirst('WinSDK').instance_id == 'c'
+    assert pyfindvs.findfirst('Microsoft.Build', predicate=lambda i: i.instance_id != 'a').instance_id == 'b'
+    assert pyfindvs.findfirst('Missing') is None
+    assert produced == ['a', 'b', 'c']
+
+def test_findfirst_without_match_caches(providers):
+    produced, release = providers
+    release.set()
+    assert pyfindvs.findfirst('Missing') is None
+    assert [i.instance_id for i in pyfindvs.findall()] == ['a', 'b', 'c']
+    assert produced == ['a', 'b', 'c']
+
+@pytest.fixture
+def recorded_metrics():
+    enabled = pyfindvs.metrics.is_enabled()
+    pyfindvs.metrics.enable()
+    pyfindvs.metrics.REGISTRY.reset()
+    yield pyfindvs.metrics.REGISTRY
+    pyfindvs.metrics.enable(enabled)
+
+def test_findfirst_metrics(providers, recorded_metrics):
+    produced, release = providers
+    pyfindvs.findfirst('VC')
+    release.set()
+    pyfindvs.findall()
+    samples = recorded_metrics.to_dict()['pyfindvs_discovery_seconds']['samples']
+    assert [(s['labels'], s['count']) for s in samples] == [({'scan': 'all'}, 1), ({'scan': 'first'}, 1)]
+    lookups = recorded_metrics.to_dict()['pyfindvs_findall_cache']['samples']
+    assert [(s['labels'], s['value']) for s in lookups] == [({'result': 'hit'}, 1), ({'result': 'miss'}, 1)]
+
+def test_unfinished_iterator_does_not_block_discovery(providers):
+    produced, release = providers
+    release.set()
+    it = pyfindvs.iterinstances()
+    assert next(it).instance_id == 'a'
+    # Another thread can use the cache while this iterator is suspended
+    result = []
+    reader = threading.Thread(target=lambda: result.append(pyfindvs.findfirst('WinSDK')))
+    reader.start()
+    reader.join(5)
+    assert not reader.is_alive()
+    assert result[0].instance_id == 'c'
+    assert [i.instance_id for i in it] == ['b', 'c']
+
+def test_reset_cache_waits_for_background(providers):
+    produced, release = providers
+    pyfindvs.findfirst('VC')
+    threading.Timer(0.2, release.set).start()
+    found = pyfindvs.findall(reset_cache=True)
+    assert [i.instance_id for i in found] == ['a', 'b', 'c']
+    assert not pyfindvs._background.is_alive()
+    assert produced == ['a', 'b', 'c', 'a', 'b', 'c']
+    # The completed background scan did not replace the new one
+    assert all(a is b for a, b in zip(pyfindvs.findall(), found))
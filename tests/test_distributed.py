@@ -0,0 +1,170 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import json
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+from pyfindvs.msbuildcompiler import distributed
+from pyfindvs.msbuildcompiler.distributed import (
+    MAX_MESSAGE_SIZE, PROTOCOL_VERSION, LocalWorker, RemoteWorker, ShardScheduler, Unit, UnitResult, WorkerError,
+    WorkerServer, check_args, recv_message, send_message)
+
+@pytest.fixture
+def server(stub_cl):
+    worker = LocalWorker(stub_cl, 'stub', processes=1)
+    with WorkerServer(('127.0.0.1', 0), worker, 'secret') as server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+    worker.close()
+
+def _remote(server, token='secret'):
+    return RemoteWorker(server.server_address, timeout=30, token=token)
+
+def test_check_args_accepts_code_generation_switches():
+    check_args(['/O2', '/Ob2', '/GS', '/Gy', '/EHsc', '/fp:precise', '/MD', '/W3', '/wd4100',
+                '/Zc:wchar_t', '/Z7', '/std:c++17', '-O1', '/arch:AVX2', '/permissive-'])
+
+@pytest.mark.parametrize('arg', ['/B1evil.dll', '/B2evil.dll', '/Bxevil.exe', '/Fo..\\x.obj',
+                                 '/FeC:\\x.exe', '/Fa', '/Fdx.pdb', '/Ycx.h', '/Ic:\\', '/FIx.h',
+                                 '/d1reportAllClassLayout', '-B1evil.dll', 'x.c', '@resp.rsp'])
+def test_check_args_rejects(arg):
+    with pytest.raises(WorkerError):
+        check_args(['/O2', arg])
+
+def test_server_requires_token(stub_cl):
+    with pytest.raises(ValueError):
+        WorkerServer(('127.0.0.1', 0), LocalWorker(stub_cl, 'stub'), None)
+
+def test_remote_compile(server):
+    results = _remote(server).compile('stub', [Unit('a.c', b'int a;', ['/O2'], '.c')])
+    assert [r.returncode for r in results] == [0]
+    assert results[0].obj.endswith(b'int a;')
+
+@pytest.mark.parametrize('token', [None, '', 'wrong'])
+def test_remote_rejects_bad_token(server, token, monkeypatch):
+    monkeypatch.delenv('PYFINDVS_WORKER_TOKEN', raising=False)
+    with pytest.raises(WorkerError, match='invalid token'):
+        _remote(server, token).compile('stub', [Unit('a.c', b'int a;', ['/O2'], '.c')])
+
+def test_remote_rejects_plugin_switch(server):
+    with pytest.raises(WorkerError, match='not allowed'):
+        _remote(server).compile('stub', [Unit('a.c', b'int a;', ['/B1evil.dll'], '.c')])
+
+def test_message_framing():
+    a, b = socket.socketpair()
+    with a, b:
+        send_message(a, {'version': PROTOCOL_VERSION, 'data': 'x' * 100000})
+        assert recv_message(b) == {'version': PROTOCOL_VERSION, 'data': 'x' * 100000}
+        a.sendall(struct.pack('>I', 10) + b'{"a"')
+        a.close()
+        with pytest.raises(WorkerError, match='connection closed'):
+            recv_message(b)
+
+def test_oversized_message_is_not_read():
+    a, b = socket.socketpair()
+    with a, b:
+        a.sendall(struct.pack('>I', MAX_MESSAGE_SIZE + 1))
+        with pytest.raises(WorkerError, match='larger than the limit'):
+            recv_message(b)
+        send_message(a, {'data': 'x' * 100})
+        with pytest.raises(WorkerError, match='larger than the limit'):
+            recv_message(b, max_size=100)
+
+def test_unauthenticated_peer_cannot_send_large_message(server):
+    # The hello is limited to a few kilobytes, so a claimed 4 GiB body
+    # is rejected without waiting for it
+    with socket.create_connection(server.server_address, timeout=30) as sock:
+        sock.sendall(struct.pack('>I', 0xFFFFFFFF))
+        reply = recv_message(sock)
+    assert reply['status'] == 'error' and 'larger than the limit' in reply['message']
+
+def test_unit_round_trip():
+    unit = Unit('spam.c', b'\x00\xffint x;', ['/O2'], '.c')
+    copy = Unit.from_json(json.loads(json.dumps(unit.to_json())))
+    assert (copy.name, copy.source, copy.args, copy.lang) == (unit.name, unit.source, unit.args, unit.lang)
+    result = UnitResult('spam.c', 0, 'spam.c', b'\x00OBJ')
+    copy = UnitResult.from_json(json.loads(json.dumps(result.to_json())))
+    assert (copy.name, copy.returncode, copy.output, copy.obj) == ('spam.c', 0, 'spam.c', b'\x00OBJ')
+    assert UnitResult.from_json(UnitResult('x', 2, 'error').to_json()).obj is None
+
+def test_recorded_request(server, fixture_path):
+    with open(fixture_path('worker_request.json'), encoding='utf-8') as f:
+        recorded = json.load(f)
+    assert recorded['hello']['version'] == PROTOCOL_VERSION
+    with socket.create_connection(server.server_address, timeout=30) as sock:
+        send_message(sock, recorded['hello'])
+        assert recv_message(sock) == {'status': 'ready'}
+        send_message(sock, recorded['request'])
+        reply = recv_message(sock)
+    assert reply['status'] == 'ok'
+    spam, eggs = [UnitResult.from_json(r) for r in reply['results']]
+    assert spam.returncode == 0 and spam.obj.endswith(b'int spam(void) { return 1; }\n')
+    # Compiler output refers to the unit by name, not the worker's file
+    assert eggs.returncode == 2 and eggs.obj is None
+    assert eggs.output.startswith('C:\\src\\spam\\eggs.cpp(1): error C1189')
+
+def test_version_mismatch(server):
+    with socket.create_connection(server.server_address, timeout=30) as sock:
+        send_message(sock, {'version': PROTOCOL_VERSION - 1, 'token': 'secret'})
+        reply = recv_message(sock)
+    assert reply == {'status': 'error',
+                     'message': 'unsupported protocol version {}'.format(PROTOCOL_VERSION - 1)}
+
+def test_toolchain_mismatch(server):
+    with pytest.raises(WorkerError, match='toolchain mismatch'):
+        _remote(server).compile('other', [Unit('a.c', b'int a;', ['/O2'], '.c')])
+
+class _FailingWorker:
+    def compile(self, toolchain, units):
+        raise OSError('unreachable')
+
+def test_scheduler_retries_failed_shards_locally(stub_cl):
+    local = LocalWorker(stub_cl, 'stub', processes=1)
+    try:
+        scheduler = ShardScheduler([_FailingWorker(), local], local, shard_size=2)
+        units = [Unit('u{}.c'.format(i), 'int u{};'.format(i).encode(), ['/O2'], '.c') for i in range(5)]
+        results = scheduler.run('stub', units)
+    finally:
+        local.close()
+    assert [r.name for r in results] == [u.name for u in units]
+    assert all(r.returncode == 0 for r in results)
+    # Shards 0 and 2 went to the failing worker
+    assert scheduler.retried == 2
+    assert len(scheduler.shards(units)) == 3
+
+def test_local_worker_creates_one_pool(stub_cl, monkeypatch):
+    created = []
+    class Pool(distributed.ThreadPoolExecutor):
+        def __init__(self, processes):
+            # Widens the window in which another thread could also
+            # create a pool
+            time.sleep(0.05)
+            created.append(self)
+            super().__init__(processes)
+    monkeypatch.setattr(distributed, 'ProcessPoolExecutor', Pool)
+    worker = LocalWorker(stub_cl, 'stub', processes=2)
+    start = threading.Barrier(8)
+    def compile(i):
+        start.wait()
+        return worker.compile('stub', [Unit('u{}.c'.format(i), b'int u;', ['/O2'], '.c')])
+    try:
+        threads = [threading.Thread(target=compile, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(30)
+    finally:
+        worker.close()
+    assert len(created) == 1
+    assert worker._pool is None
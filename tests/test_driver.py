@@ -0,0 +1,249 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import os
+import sys
+
+import pytest
+
+import _support
+from conftest import write_stub_tool
+
+from pyfindvs.msbuildcompiler import MSBuildCompiler
+from pyfindvs.msbuildcompiler.depends import DependencyDatabase
+from pyfindvs.msbuildcompiler.diagnostics import BuildResult
+from pyfindvs.msbuildcompiler.driver import DirectDriver
+from pyfindvs.msbuildcompiler.template import Template
+
+# Stand-ins for the MSVC tools. Each reads its arguments from the
+# command line or a UTF-16 response file, logs them and writes the
+# output file named by them. link.exe fails delay loaded links while
+# an lnk1194 file is next to it.
+_TOOL = '''
+import ntpath, os, sys
+args = sys.argv[1:]
+if len(args) == 1 and args[0].startswith('@'):
+    with open(args[0][1:], encoding='utf-16') as f:
+        args = f.read().splitlines()
+name = os.path.basename(sys.argv[0])
+with open(os.path.join(os.path.dirname(sys.argv[0]), 'calls.log'), 'a') as f:
+    f.write(name + ' ' + ' '.join(args) + '\\n')
+def value(prefix):
+    return next(a[len(prefix):] for a in args if a.startswith(prefix))
+if name == 'cl.exe':
+    source = args[-1]
+    with open(source) as f:
+        text = f.read()
+    if '#error' in text:
+        print('{}(1): error C1189: #error: broken'.format(source))
+        sys.exit(2)
+    if '/showIncludes' in args:
+        print(os.path.basename(source))
+        print('Note: including file: ' + os.path.join(os.path.dirname(source), 'spam.h'))
+    out, data = value('/Fo'), text
+elif name == 'rc.exe':
+    out, data = value('/fo'), 'res'
+elif any(a.startswith('/DELAYLOAD:') for a in args) and \
+     os.path.exists(os.path.join(os.path.dirname(sys.argv[0]), 'lnk1194')):
+    print("LINK : fatal error LNK1194: cannot delay-load 'zlib1.dll' due to import of data symbol '__imp_z_errmsg'")
+    sys.exit(1194)
+else:
+    inputs = [a for a in args if a.endswith(('.obj', '.res'))]
+    out, data = value('/OUT:'), ' '.join(ntpath.basename(i) for i in inputs)
+with open(out, 'w') as f:
+    f.write(data)
+'''
+
+@pytest.fixture
+def tools(tmp_path):
+    if sys.platform == 'win32':
+        pytest.skip('stub tools are shell scripts')
+    d = tmp_path / 'tools'
+    d.mkdir()
+    return {name: write_stub_tool(d, name, _TOOL) for name in ('cl.exe', 'rc.exe', 'link.exe', 'lib.exe')}
+
+def _calls(tools):
+    try:
+        with open(os.path.join(os.path.dirname(tools['cl.exe']), 'calls.log')) as f:
+            return [line.split() for line in f]
+    except FileNotFoundError:
+        return []
+
+def _build(tmp_path, tools, **options):
+    src = tmp_path / 'src'
+    src.mkdir()
+    (src / 'spam.c').write_text('#include "spam.h"\nint spam;\n')
+    (src / 'eggs.c').write_text('int eggs;\n')
+    (src / 'spam.h').write_text('\n')
+    (src / 'spam.rc').write_text('\n')
+    _support.patch_discovery(_support.fake_instances(str(tmp_path / 'msbuild')))
+    cc = MSBuildCompiler()
+    cc.backend = 'direct'
+    for name, value in options.items():
+        setattr(cc, name, value)
+    cc.initialize('win-amd64')
+    cc.tools.update(tools)
+    build = str(tmp_path / 'build')
+    objs = cc.compile([str(src / n) for n in ('spam.c', 'eggs.c', 'spam.rc')], output_dir=build)
+    result = cc.link('shared_object', objs, 'spam.pyd', output_dir=build + '/out', build_temp=build)
+    return objs[0], result
+
+@pytest.fixture
+def project(tmp_path, tools):
+    '''Builds spam.pyd from spam.c, eggs.c and spam.rc with the direct
+    backend and returns the generated project.'''
+    project, result = _build(tmp_path, tools)
+    assert result.succeeded
+    return Template(project)
+
+def test_plan(project, tools):
+    plan = DirectDriver(tools).plan(project)
+    props = project.get_properties()
+    assert [[c.name for c in s] for s in plan.stages] == [['spam.c', 'eggs.c', 'spam.rc'], ['link.exe']]
+    assert plan.output == props['OutDir'] + 'spam.pyd'
+    spam = plan.stages[0][0]
+    assert spam.argv == [tools['cl.exe'], '@' + props['IntDir'] + 'spam.cl.rsp']
+    assert spam.args[-2:] == ['/c', project.get_items('ClCompile')[0]['Include']]
+    assert '/Fo' + props['IntDir'] + 'spam.obj' in spam.args
+    assert '/showIncludes' not in spam.args
+    rc = plan.stages[0][2]
+    assert rc.response_file is None
+    assert '/fo' + props['IntDir'] + 'spam.res' in rc.args
+    link = plan.stages[-1][0]
+    assert '/DLL' in link.args and '/OUT:' + plan.output in link.args
+    assert link.args[-3:] == [props['IntDir'] + n for n in ('spam.obj', 'eggs.obj', 'spam.res')]
+
+def test_build(project, tools):
+    # The fixture already built with the direct backend
+    calls = _calls(tools)
+    assert sorted(c[0] for c in calls) == ['cl.exe', 'cl.exe', 'link.exe', 'rc.exe']
+    assert calls[-1][0] == 'link.exe'
+    output = DirectDriver(tools).plan(project).output
+    with open(output) as f:
+        assert f.read() == 'spam.obj eggs.obj spam.res'
+
+def test_build_with_stub_tools(tmp_path, stub_cl, stub_link):
+    # The project is generated without building, then built by the
+    # driver alone
+    (tmp_path / 'spam.c').write_text('int spam;\n')
+    (tmp_path / 'eggs.c').write_text('int eggs;\n')
+    _support.patch_discovery(_support.fake_instances(str(tmp_path / 'msbuild')))
+    cc = MSBuildCompiler(dry_run=1)
+    cc.backend = 'direct'
+    cc.initialize('win-amd64')
+    build = str(tmp_path / 'build')
+    objs = cc.compile([str(tmp_path / 'spam.c'), str(tmp_path / 'eggs.c')], output_dir=build)
+    cc.link('shared_object', objs, 'spam.pyd', output_dir=build + '/out', build_temp=build)
+    project = Template(objs[0])
+
+    result = BuildResult(project.template)
+    plan = DirectDriver({'cl.exe': stub_cl, 'link.exe': stub_link}).build(project, result)
+    assert result.succeeded
+    assert [[c.argv[0] for c in s] for s in plan.stages] == [[stub_cl, stub_cl], [stub_link]]
+    # link.exe ran after both objects were written, and its warning is
+    # collected with the result
+    with open(plan.output) as f:
+        objects = f.read().split('OBJ ')[1:]
+    assert [o.splitlines()[-1] for o in objects] == ['int spam;', 'int eggs;']
+    assert [(d.code, d.message) for d in result.warnings] == [
+        ('LNK4197', "export 'PyInit_spam' specified multiple times")]
+
+def test_build_records_dependencies(project, tools, tmp_path):
+    int_dir = project.get_properties()['IntDir']
+    depends = DependencyDatabase.load(int_dir)
+    driver = DirectDriver(tools, depends=depends)
+    result = BuildResult(project.template)
+    driver.build(project, result)
+    assert result.succeeded
+    spam = project.get_items('ClCompile')[0]['Include']
+    assert depends.dependencies_of(spam) == [spam, str(tmp_path / 'src' / 'spam.h')]
+
+    # Nothing is compiled again while the sources are unchanged
+    plan = DirectDriver(tools, depends=depends).plan(project)
+    assert len(plan.up_to_date) == 2
+    assert [[c.name for c in s] for s in plan.stages] == [['spam.rc'], ['link.exe']]
+
+def test_build_failure(project, tools, tmp_path):
+    (tmp_path / 'src' / 'eggs.c').write_text('#error broken\n')
+    result = BuildResult(project.template)
+    before = len(_calls(tools))
+    DirectDriver(tools).build(project, result)
+    assert result.returncode == 2
+    assert [d.code for d in result.errors] == ['C1189']
+    # The link stage does not run after a failed compile
+    assert 'link.exe' not in [c[0] for c in _calls(tools)[before:]]
+
+def test_dry_run(project, tools):
+    before = len(_calls(tools))
+    plan = DirectDriver(tools).build(project, BuildResult(project.template), dry_run=True)
+    assert len(plan.commands) == 4
+    assert len(_calls(tools)) == before
+
+@pytest.mark.parametrize('link_fails', [False, True])
+def test_optimize_imports(tmp_path, tools, monkeypatch, link_fails):
+    import pyfindvs.msbuildcompiler.compiler as compiler
+    from pyfindvs.msbuildcompiler.peimports import ImportedDLL, PEImports
+    dlls = [ImportedDLL('python37.dll', ['PyModule_Create2']), ImportedDLL('zlib1.dll', ['deflate'])]
+    def parse_imports(path):
+        delay_load = not link_fails and any(c[0] == 'link.exe' and '/DELAYLOAD:zlib1.dll' in c
+                                            for c in _calls(tools))
+        return PEImports(0x8664, True, [ImportedDLL(d.name, d.functions, delay_load and d.name == 'zlib1.dll')
+                                        for d in dlls], 60)
+    monkeypatch.setattr(compiler, 'parse_imports', parse_imports)
+    if link_fails:
+        # Links that delay load fail as they would for a DLL exporting data
+        open(os.path.join(os.path.dirname(tools['link.exe']), 'lnk1194'), 'w').close()
+
+    project, result = _build(tmp_path, tools, optimize_imports='apply')
+    assert result.succeeded
+    links = [c for c in _calls(tools) if c[0] == 'link.exe']
+    assert [any(a.startswith('/DELAYLOAD:') for a in c) for c in links] == \
+        ([False, True, False] if link_fails else [False, True])
+    assert result.imports['suggested'] == ['zlib1.dll']
+    if link_fails:
+        assert 'LNK1194' in result.imports['relink_errors'][0]
+        assert result.imports['delay_loaded'] == []
+        assert 'import_table_size_after' not in result.imports
+        # The project has its original settings again
+        assert 'DelayLoadDLLs' not in Template(project).get_item_definitions('Link')
+        with open(result.output) as f:
+            assert f.read() == 'spam.obj eggs.obj spam.res'
+    else:
+        assert result.imports['delay_loaded'] == ['zlib1.dll']
+        assert 'relink_errors' not in result.imports
+
+# Stand-in for msbuild.exe that writes the output named by the project
+_MSBUILD = '''
+import re, sys
+with open(sys.argv[-1], encoding='utf-8') as f:
+    text = f.read()
+prop = lambda n: re.search('<%s>([^<]*)</%s>' % (n, n), text).group(1)
+with open(prop('OutDir') + prop('TargetName') + prop('TargetExt'), 'w') as f:
+    f.write('built')
+'''
+
+def test_optimize_imports_when_streaming(tmp_path, monkeypatch):
+    import asyncio
+    import pyfindvs.msbuildcompiler.compiler as compiler
+    from pyfindvs.msbuildcompiler.peimports import ImportedDLL, PEImports
+    if sys.platform == 'win32':
+        pytest.skip('stub tools are shell scripts')
+    monkeypatch.setattr(compiler, 'parse_imports', lambda path: PEImports(
+        0x8664, True, [ImportedDLL('python37.dll', ['PyModule_Create2'])], 40))
+    src = tmp_path / 'spam.c'
+    src.write_text('int spam;\n')
+    _support.patch_discovery(_support.fake_instances(write_stub_tool(tmp_path, 'msbuild', _MSBUILD)))
+    cc = MSBuildCompiler()
+    cc.optimize_imports = 'report'
+    cc.initialize('win-amd64')
+    build = str(tmp_path / 'build')
+    objs = cc.compile([str(src)], output_dir=build)
+    result = asyncio.run(cc.link_async('shared_object', objs, 'spam.pyd', output_dir=build,
+                                       build_temp=build))
+    assert result.succeeded
+    assert result.imports['suggested'] == []
+    assert result.imports['import_table_size_before'] == 40
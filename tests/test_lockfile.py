@@ -0,0 +1,58 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import json
+
+import pytest
+
+import _support
+
+from distutils.errors import DistutilsPlatformError
+
+from pyfindvs.msbuildcompiler import MSBuildCompiler
+from pyfindvs.msbuildcompiler import lockfile
+
+@pytest.fixture
+def msbuild(tmp_path):
+    path = tmp_path / 'MSBuild.exe'
+    path.write_text('msbuild')
+    _support.patch_discovery(_support.fake_instances(str(path)))
+    return path
+
+def test_read_lock_detects_changed_tools(tmp_path, msbuild):
+    lock = str(tmp_path / 'toolchain.lock')
+    lockfile.write_lock(lock, 'win-amd64', {'msbuild.exe': str(msbuild)}, str(msbuild), 'v141', '10.0.17763.0')
+    assert lockfile.read_lock(lock, 'win-amd64')['known_paths'] == {'msbuild.exe': str(msbuild)}
+    with pytest.raises(DistutilsPlatformError, match='is for win-amd64'):
+        lockfile.read_lock(lock, 'win32')
+
+    msbuild.write_text('a newer msbuild')
+    with pytest.raises(DistutilsPlatformError, match='has changed'):
+        lockfile.read_lock(lock, 'win-amd64')
+    assert lockfile.read_lock(lock, 'win-amd64', verify=False)['msbuild'] == str(msbuild)
+
+def test_environment_lock_is_used(tmp_path, msbuild, monkeypatch):
+    lock = str(tmp_path / 'toolchain.lock')
+    lockfile.write_lock(lock, 'win-amd64', {'msbuild.exe': str(msbuild), 'cl.exe_x64': 'C:\\Locked\\cl.exe'},
+                        str(msbuild), 'v141', '10.0.17763.0')
+    monkeypatch.setenv('PYFINDVS_TOOLCHAIN_LOCK', lock)
+    cc = MSBuildCompiler()
+    cc.initialize('win-amd64')
+    assert cc.tools['cl.exe'] == 'C:\\Locked\\cl.exe'
+
+def test_main_ignores_environment_lock(tmp_path, msbuild, monkeypatch):
+    # Regenerating the lock after the toolchain changed must not fail on
+    # the lock being replaced
+    lock = str(tmp_path / 'toolchain.lock')
+    lockfile.write_lock(lock, 'win-amd64', {'msbuild.exe': str(msbuild)}, str(msbuild), 'v141', '10.0.17763.0')
+    msbuild.write_text('a newer msbuild')
+    monkeypatch.setenv('PYFINDVS_TOOLCHAIN_LOCK', lock)
+    lockfile.main(['--plat-name', 'win-amd64', lock])
+    with open(lock) as f:
+        data = json.load(f)
+    assert data['tools']['']['cl.exe'].endswith('HostX64\\x64\\cl.exe')
+    assert lockfile.read_lock(lock, 'win-amd64')['msbuild'] == str(msbuild)
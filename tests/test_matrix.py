@@ -0,0 +1,105 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import os
+import sys
+
+import pytest
+
+import _support
+from conftest import write_stub_tool
+
+from pyfindvs.msbuildcompiler import MSBuildCompiler
+from pyfindvs.msbuildcompiler.template import Template
+
+_CONFIGURATIONS = [('win-amd64', False), ('win32', True)]
+
+# Stand-in for msbuild.exe that builds each wrapper in the traversal
+# project, failing the Debug configuration with a compiler error
+_MSBUILD = '''
+import os, sys
+import xml.etree.ElementTree as ET
+NSD = {'n': 'http://schemas.microsoft.com/developer/msbuild/2003'}
+traversal = sys.argv[-1]
+root = os.path.dirname(traversal)
+combined = ET.parse(os.path.join(root, 'template.g.vcxproj'))
+failed = False
+for p in ET.parse(traversal).iterfind('n:ItemGroup/n:ProjectToBuild', NSD):
+    wrapper = os.path.join(root, p.get('Include'))
+    pg = ET.parse(wrapper).find('n:PropertyGroup', NSD)
+    condition = "'$(Configuration)|$(Platform)'=='{}|{}'".format(
+        pg.find('n:Configuration', NSD).text, pg.find('n:Platform', NSD).text)
+    if 'Debug' in condition:
+        print('spam.c(1): error C2065: eggs: undeclared identifier [{}]'.format(wrapper))
+        failed = True
+        continue
+    outputs = [g for g in combined.iterfind("n:PropertyGroup[@Label='Outputs']", NSD)
+               if g.get('Condition') == condition][0]
+    prop = lambda n: outputs.find('n:' + n, NSD).text
+    os.makedirs(os.path.dirname(prop('OutDir') + prop('TargetName')), exist_ok=True)
+    with open(prop('OutDir') + prop('TargetName') + prop('TargetExt'), 'w') as f:
+        f.write('built')
+print('MSBUILD : warning MSB8012: shared by every configuration')
+sys.exit(1 if failed else 0)
+'''
+
+@pytest.fixture
+def build(tmp_path):
+    _support.patch_discovery(_support.fake_instances(write_stub_tool(tmp_path, 'msbuild', _MSBUILD)))
+    (tmp_path / 'spam.c').write_text('int spam;\n')
+    def build(**kwargs):
+        cc = MSBuildCompiler(**kwargs)
+        cc.initialize('win-amd64')
+        return cc.build_matrix([str(tmp_path / 'spam.c')], 'spam.pyd', _CONFIGURATIONS,
+                               output_dir=str(tmp_path / 'out'), build_temp=str(tmp_path / 'build'))
+    return build
+
+def test_generated_projects(tmp_path, build):
+    results = build(dry_run=1)
+    assert list(results) == _CONFIGURATIONS
+    build_temp = str(tmp_path / 'build')
+    combined = Template(os.path.join(build_temp, 'template.g.vcxproj'))
+    pcs = combined.root.iterfind("n:ItemGroup[@Label='ProjectConfigurations']/n:ProjectConfiguration",
+                                 combined._NSD)
+    assert [pc.get('Include') for pc in pcs] == ['Release|x64', 'Debug|Win32']
+
+    # Each configuration has its own intermediate directory and project
+    int_dirs = {}
+    for g in combined.root.iterfind("n:PropertyGroup[@Label='Globals']", combined._NSD):
+        int_dirs[g.get('Condition')] = g.find('n:IntDir', combined._NSD).text
+    assert int_dirs == {
+        "'$(Configuration)|$(Platform)'=='Release|x64'": os.path.join(build_temp, 'Release-x64') + '\\',
+        "'$(Configuration)|$(Platform)'=='Debug|Win32'": os.path.join(build_temp, 'Debug-Win32') + '\\',
+    }
+    for name in ('Release-x64', 'Debug-Win32'):
+        assert os.path.isfile(os.path.join(int_dirs[
+            "'$(Configuration)|$(Platform)'=='{}'".format(name.replace('-', '|'))], 'template.g.vcxproj'))
+
+    assert [r.project for r in results.values()] == [
+        os.path.join(build_temp, 'template.Release-x64.g.vcxproj'),
+        os.path.join(build_temp, 'template.Debug-Win32.g.vcxproj'),
+    ]
+    wrapper = Template(results['win32', True].project)
+    assert wrapper.get_properties() == {'Configuration': 'Debug', 'Platform': 'Win32'}
+    assert wrapper.root.find('n:Import', wrapper._NSD).get('Project') == 'template.g.vcxproj'
+    traversal = Template(os.path.join(build_temp, 'template.matrix.g.proj'))
+    assert [p.get('Include') for p in traversal.root.iterfind('n:ItemGroup/n:ProjectToBuild', traversal._NSD)] == [
+        'template.Release-x64.g.vcxproj', 'template.Debug-Win32.g.vcxproj']
+
+def test_results_per_configuration(build):
+    if sys.platform == 'win32':
+        pytest.skip('stub tools are shell scripts')
+    results = build()
+    release, debug = results['win-amd64', False], results['win32', True]
+    assert release.succeeded
+    with open(release.output) as f:
+        assert f.read() == 'built'
+    assert not debug.succeeded
+    # Errors belong to the configuration that reported them, and
+    # diagnostics from MSBuild itself to every configuration
+    assert [d.code for d in release.diagnostics] == ['MSB8012']
+    assert [d.code for d in debug.diagnostics] == ['C2065', 'MSB8012']
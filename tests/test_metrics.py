@@ -0,0 +1,61 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import sys
+
+import pytest
+
+import _support
+from conftest import write_stub_tool
+
+from pyfindvs import metrics
+from pyfindvs.msbuildcompiler import MSBuildCompiler
+
+# Stand-in for msbuild.exe that fails, and writes a detailed log of
+# 1000 bytes when one is requested
+_FAILING_MSBUILD = '''
+import sys
+for arg in sys.argv[1:]:
+    if arg.startswith('/flp:LogFile='):
+        with open(arg[13:].partition(';')[0], 'w') as f:
+            f.write('x' * 1000)
+print('spam.c(1): error C2065: undeclared identifier')
+sys.exit(1)
+'''
+
+@pytest.fixture
+def recorded_metrics():
+    enabled = metrics.is_enabled()
+    metrics.enable()
+    metrics.REGISTRY.reset()
+    yield metrics.REGISTRY
+    metrics.enable(enabled)
+
+@pytest.mark.parametrize('use_stream', [False, True])
+def test_failed_build_counts_detailed_log(tmp_path, recorded_metrics, use_stream):
+    if sys.platform == 'win32':
+        pytest.skip('stub tools are shell scripts')
+    import asyncio
+    msbuild = write_stub_tool(tmp_path, 'msbuild', _FAILING_MSBUILD)
+    _support.patch_discovery(_support.fake_instances(msbuild))
+    (tmp_path / 'spam.c').write_text('int spam;\n')
+    cc = MSBuildCompiler()
+    cc.initialize('win-amd64')
+    build = str(tmp_path / 'build')
+    objs = cc.compile([str(tmp_path / 'spam.c')], output_dir=build)
+    with pytest.raises(Exception, match='detailed log'):
+        if use_stream:
+            asyncio.run(cc.link_async('shared_object', objs, 'spam.pyd', output_dir=build, build_temp=build))
+        else:
+            cc.link('shared_object', objs, 'spam.pyd', output_dir=build, build_temp=build)
+
+    recorded = recorded_metrics.to_dict()
+    builds = recorded['pyfindvs_builds']['samples']
+    assert [(s['labels']['result'], s['value']) for s in builds] == [('failed', 1)]
+    # The console output of the failed build and the rerun's log
+    console = len('spam.c(1): error C2065: undeclared identifier\n')
+    assert [s['sum'] for s in recorded['pyfindvs_build_log_bytes']['samples']] == [console + 1000]
@@ -0,0 +1,83 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import os
+
+import pytest
+
+from pyfindvs.msbuildcompiler.objcache import ObjectCache, compiler_identity
+
+CL = 'C:\\VS\\VC\\Tools\\MSVC\\14.16.27023\\bin\\HostX64\\x64\\cl.exe'
+OPTIONS = [('Optimization', 'MaxSpeed'), ('RuntimeLibrary', 'MultiThreadedDLL')]
+
+@pytest.fixture
+def preprocessed(fixture_path):
+    # Recorded output of 'cl /E spam.c' in C:\src\spam
+    with open(fixture_path('spam.i'), 'rb') as f:
+        return f.read()
+
+@pytest.fixture
+def cache(tmp_path):
+    return ObjectCache(str(tmp_path / 'cache'))
+
+def _relocated(preprocessed):
+    return preprocessed.replace(b'C:\\src\\spam', b'D:\\work\\spam').replace(
+        b'C:\\\\src\\\\spam', b'D:\\\\work\\\\spam')
+
+def test_compiler_identity_from_toolset_path():
+    assert compiler_identity(CL) == os.path.normcase(CL) + '|14.16.27023'
+
+def test_compiler_identity_from_file(tmp_path):
+    cl = tmp_path / 'cl.exe'
+    cl.write_bytes(b'MZ')
+    st = os.stat(str(cl))
+    assert compiler_identity(str(cl)).endswith('|2:{}'.format(st.st_mtime_ns))
+
+def test_key_is_stable(cache, preprocessed):
+    key = cache.key(preprocessed, OPTIONS, CL, 'win-amd64', 'C:\\src\\spam')
+    assert key == cache.key(preprocessed, list(OPTIONS), CL, 'win-amd64', 'C:\\src\\spam')
+    assert len(key) == 64
+
+def test_key_ignores_base_dir(cache, preprocessed):
+    moved = _relocated(preprocessed)
+    assert moved != preprocessed
+    options = OPTIONS + [('AdditionalIncludeDirectories', 'C:\\src\\spam\\include')]
+    moved_options = OPTIONS + [('AdditionalIncludeDirectories', 'D:\\work\\spam\\include')]
+    assert cache.key(preprocessed, options, CL, 'win-amd64', 'C:\\src\\spam') == \
+        cache.key(moved, moved_options, CL, 'win-amd64', 'D:\\work\\spam')
+    # Without a base directory, the checkout location is part of the key
+    assert cache.key(preprocessed, options, CL, 'win-amd64') != \
+        cache.key(moved, moved_options, CL, 'win-amd64')
+
+@pytest.mark.parametrize('change', ['source', 'options', 'compiler', 'platform'])
+def test_key_changes(cache, preprocessed, change):
+    args = [preprocessed, OPTIONS, CL, 'win-amd64']
+    base = cache.key(*args)
+    if change == 'source':
+        args[0] = preprocessed.replace(b's->eggs + n', b's->eggs - n')
+    elif change == 'options':
+        args[1] = [('Optimization', 'Disabled'), OPTIONS[1]]
+    elif change == 'compiler':
+        args[2] = CL.replace('14.16.27023', '14.20.27508')
+    else:
+        args[3] = 'win32'
+    assert cache.key(*args) != base
+
+def test_store_fetch_evict(cache, tmp_path):
+    obj = tmp_path / 'spam.obj'
+    obj.write_bytes(b'x' * 100)
+    key = cache.key(b'int x;', OPTIONS, CL, 'win-amd64')
+    dest = str(tmp_path / 'restored.obj')
+    assert not cache.fetch(key, dest)
+    cache.store(key, str(obj))
+    assert cache.fetch(key, dest)
+    with open(dest, 'rb') as f:
+        assert f.read() == b'x' * 100
+    assert cache.size() == 100
+    assert cache.evict(50) == 0
+    assert not cache.fetch(key, dest)
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'stores': 1, 'evictions': 1}
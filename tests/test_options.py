@@ -0,0 +1,113 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+from copy import copy
+from distutils.errors import DistutilsOptionError
+
+import pytest
+
+import _support
+
+from pyfindvs.msbuildcompiler import MSBuildCompiler
+from pyfindvs.msbuildcompiler.options import ClCompileOptions, GlobalOptions, LibOptions, LinkOptions, \
+                                             OptionList, OutputOptions, RcOptions, MidlOptions
+from pyfindvs.msbuildcompiler.template import Template
+
+def test_option_list_deduplicates_in_order():
+    opts = OptionList()
+    opts.add('B;A;;B')
+    opts.add(['C', 'A', 1])
+    assert list(opts) == ['B', 'A', 'C', '1']
+    assert str(opts) == 'B;A;C;1'
+    assert opts.rendered_length == 7
+
+def test_option_list_keeps_duplicates_when_not_unique():
+    opts = OptionList(' ', unique=False)
+    opts.add('/W4 /W4')
+    opts.add(['/W4', '/Zi'])
+    assert str(opts) == '/W4 /W4 /W4 /Zi'
+
+def test_add_opt_normalizes_directories():
+    opts = ClCompileOptions()
+    opts._add_opt('AdditionalIncludeDirectories', ['C:\\src\\.\\include', 'c:/SRC/include\\', 'C:\\src\\x\\..\\lib'])
+    # The inherited value is kept as it is, and paths differing only in
+    # case or separators are the same directory
+    assert str(opts.AdditionalIncludeDirectories) == \
+        '%(AdditionalIncludeDirectories);C:\\src\\include;C:\\src\\lib'
+    opts._add_opt('PreprocessorDefinitions', ['a/b', 'A/B'])
+    assert list(opts.PreprocessorDefinitions) == ['%(PreprocessorDefinitions)', 'a/b', 'A/B']
+
+def test_add_opt_repeated():
+    opts = GlobalOptions()
+    opts._add_opt('AdditionalOptions', '/O2', ' ')
+    opts._add_opt('AdditionalOptions', ['/GL', '/O2'], ' ')
+    assert str(opts.AdditionalOptions) == '/O2 /GL /O2'
+
+    cl = ClCompileOptions()
+    cl._add_opt('PreprocessorDefinitions', 'A=1;B')
+    cl._add_opt('PreprocessorDefinitions', ['B', 'C'])
+    cl._add_opt('PreprocessorDefinitions', 3)
+    assert str(cl.PreprocessorDefinitions) == '%(PreprocessorDefinitions);A=1;B;C;3'
+
+def test_copied_options_are_independent():
+    cl = ClCompileOptions()
+    cl._add_opt('PreprocessorDefinitions', 'A')
+    other = copy(cl)
+    other._add_opt('PreprocessorDefinitions', 'B')
+    assert str(cl.PreprocessorDefinitions) == '%(PreprocessorDefinitions);A'
+    assert str(other.PreprocessorDefinitions) == '%(PreprocessorDefinitions);A;B'
+
+def _changed_by_fast(cls):
+    before, after = cls(), cls()
+    after._for_fast()
+    return {n: getattr(after, n) for n in dir(after)
+            if not n.startswith('_') and getattr(after, n) != getattr(before, n)}
+
+def test_fast_profile_options():
+    assert _changed_by_fast(GlobalOptions) == {'GenerateManifest': False, 'LinkIncremental': True}
+    assert _changed_by_fast(ClCompileOptions) == {
+        'DebugInformationFormat': 'OldStyle',
+        'IntrinsicFunctions': False,
+        'MultiProcessorCompilation': True,
+        'Optimization': 'Disabled',
+        'WholeProgramOptimization': False,
+    }
+    assert _changed_by_fast(LinkOptions) == {
+        'EnableCOMDATFolding': False,
+        'GenerateDebugInformation': 'DebugFastLink',
+        'OptimizeReferences': False,
+    }
+    for cls in (OutputOptions, LibOptions, RcOptions, MidlOptions):
+        assert _changed_by_fast(cls) == {}
+
+def test_fast_profile_overrides_link_time_code_generation():
+    link = LinkOptions()
+    link.LinkTimeCodeGeneration = 'UseLinkTimeCodeGeneration'
+    link._for_fast()
+    assert link.LinkTimeCodeGeneration == ''
+
+def _project(tmp_path, build_profile):
+    _support.patch_discovery(_support.fake_instances(str(tmp_path / 'msbuild')))
+    cc = MSBuildCompiler()
+    cc.build_profile = build_profile
+    cc.initialize('win-amd64')
+    project, = cc.compile([str(tmp_path / 'spam.c')], output_dir=str(tmp_path / 'build'))
+    return project, Template(project)
+
+def test_fast_profile_has_own_int_dir(tmp_path):
+    normal, normal_t = _project(tmp_path, None)
+    fast, fast_t = _project(tmp_path, 'fast')
+    # Objects built without the profile are never reused by a fast build
+    assert normal != fast
+    assert normal_t.get_properties()['IntDir'] == str(tmp_path / 'build') + '\\'
+    assert fast_t.get_properties()['IntDir'] == str(tmp_path / 'build' / 'fast') + '\\'
+    assert fast_t.get_item_definitions('ClCompile')['Optimization'] == 'Disabled'
+    assert normal_t.get_item_definitions('ClCompile')['Optimization'] != 'Disabled'
+
+def test_unknown_build_profile(tmp_path):
+    with pytest.raises(DistutilsOptionError):
+        _project(tmp_path, 'tiny')
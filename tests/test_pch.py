@@ -0,0 +1,98 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import os
+
+import _support
+
+from pyfindvs.msbuildcompiler import MSBuildCompiler
+from pyfindvs.msbuildcompiler.pch import common_prefix, leading_directives, write_pch
+from pyfindvs.msbuildcompiler.template import Template
+
+_HEADER = '#include <Python.h>\n#define SPAM  1\n#include "spam.h"\n'
+
+def _sources(tmp_path, **texts):
+    (tmp_path / 'spam.h').write_text('')
+    for name, text in texts.items():
+        (tmp_path / name).write_text(text)
+    return [str(tmp_path / name) for name in texts]
+
+def test_leading_directives(tmp_path):
+    source, = _sources(tmp_path, **{'a.c': '/* License\n   text */\n' + _HEADER +
+                                    '// comment\n#include "missing.h"\nint a;\n#include <late.h>\n'})
+    assert leading_directives(source) == [
+        '#include <Python.h>',
+        '#define SPAM 1',
+        '#include "{}"'.format(os.path.normpath(str(tmp_path / 'spam.h'))),
+        '#include "missing.h"',
+    ]
+
+def test_leading_directives_stop_at_continuation(tmp_path):
+    source, = _sources(tmp_path, **{'a.c': '#include <Python.h>\n#define SPAM \\\n  1\n#include <b.h>\n'})
+    assert leading_directives(source) == ['#include <Python.h>']
+
+def test_common_prefix(tmp_path):
+    sources = _sources(tmp_path, **{
+        'a.c': _HEADER + '#include <a.h>\n',
+        'b.c': _HEADER + '#define B\nint b;\n',
+    })
+    assert common_prefix(sources) == leading_directives(sources[1])[:3]
+
+def test_common_prefix_ends_with_include(tmp_path):
+    sources = _sources(tmp_path, **{
+        'a.c': '#include <Python.h>\n#define SPAM 1\nint a;\n',
+        'b.c': '#include <Python.h>\n#define SPAM 1\n#include <b.h>\n',
+    })
+    assert common_prefix(sources) == ['#include <Python.h>']
+
+def test_common_prefix_empty(tmp_path):
+    sources = _sources(tmp_path, **{
+        'a.c': '#include <Python.h>\n',
+        'b.c': '#include <windows.h>\n#include <Python.h>\n',
+        'c.c': '#define SPAM 1\nint c;\n',
+    })
+    assert common_prefix(sources) == []
+    assert common_prefix(sources[2:]) == []
+
+def test_write_pch(tmp_path):
+    header, source = write_pch(str(tmp_path), ['#include <Python.h>'], '.c')
+    with open(header, encoding='utf-8') as f:
+        assert f.read() == '/* Generated by pyfindvs */\n#pragma once\n#include <Python.h>\n'
+    assert os.path.splitext(source)[1] == '.c'
+    # Unchanged files are not rewritten, so the PCH is reused
+    os.utime(header, ns=(0, 0))
+    write_pch(str(tmp_path), ['#include <Python.h>'], '.c')
+    assert os.stat(header).st_mtime_ns == 0
+
+def _compile(tmp_path, sources):
+    _support.patch_discovery(_support.fake_instances(str(tmp_path / 'msbuild')))
+    cc = MSBuildCompiler()
+    cc.auto_pch = True
+    cc.auto_pch_min_sources = 2
+    cc.initialize('win-amd64')
+    project, = cc.compile(sources, output_dir=str(tmp_path / 'build'))
+    t = Template(project)
+    creates = [s for s in t.root.iterfind('n:ItemGroup/n:ClCompile', t._NSD)
+               if s.find('n:PrecompiledHeader', t._NSD) is not None]
+    return t.get_item_definitions('ClCompile'), creates
+
+def test_auto_pch(tmp_path):
+    defs, creates = _compile(tmp_path, _sources(tmp_path, **{'a.c': _HEADER, 'b.c': _HEADER + 'int b;\n'}))
+    assert defs['PrecompiledHeader'] == 'Use'
+    assert defs['ForcedIncludeFiles'].endswith('pyfindvs_pch.h')
+    assert len(creates) == 1
+
+def test_no_auto_pch_when_sources_disagree(tmp_path):
+    defs, creates = _compile(tmp_path, _sources(tmp_path, **{'a.c': '#include <a.h>\n',
+                                                             'b.c': '#include <b.h>\n'}))
+    assert defs.get('PrecompiledHeader') != 'Use'
+    assert creates == []
+
+def test_no_auto_pch_for_mixed_languages(tmp_path):
+    defs, creates = _compile(tmp_path, _sources(tmp_path, **{'a.c': _HEADER, 'b.cpp': _HEADER}))
+    assert defs.get('PrecompiledHeader') != 'Use'
+    assert creates == []
@@ -0,0 +1,116 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import struct
+
+import pytest
+
+from pyfindvs.msbuildcompiler import peimports
+
+_SECTION_RVA = 0x1000
+_SECTION_OFFSET = 0x400
+
+def _pe(imports, delay_imports=(), is_64bit=True):
+    '''Returns the bytes of a minimal PE file with one section holding
+    the import and delay import tables for the (dll, functions) pairs in
+    *imports* and *delay_imports*. Functions are names, or ordinals.'''
+    thunk_fmt, ordinal_flag = ('<Q', 1 << 63) if is_64bit else ('<I', 1 << 31)
+    image_base = 0x180000000 if is_64bit else 0x10000000
+    thunk_size = struct.calcsize(thunk_fmt)
+    section = bytearray()
+
+    def alloc(data):
+        rva = _SECTION_RVA + len(section)
+        section.extend(data)
+        section.extend(b'\0' * (-len(section) % 8))
+        return rva
+
+    def thunks(functions):
+        values = [ordinal_flag | f if isinstance(f, int) else
+                  alloc(b'\0\0' + f.encode('ascii') + b'\0') for f in functions]
+        return alloc(b''.join(struct.pack(thunk_fmt, v) for v in values + [0]))
+
+    import_descriptors = b''
+    iat_size = 0
+    for dll, functions in imports:
+        names = thunks(functions)
+        iat_size += thunk_size * (len(functions) + 1)
+        import_descriptors += struct.pack('<IIIII', names, 0, 0, alloc(dll.encode('ascii') + b'\0'), names)
+    import_descriptors += b'\0' * 20
+
+    delay_descriptors = b''
+    for dll, functions in delay_imports:
+        names = thunks(functions)
+        delay_descriptors += struct.pack('<IIIIIIII', 1, alloc(dll.encode('ascii') + b'\0'), 0, names, names, 0, 0, 0)
+    delay_descriptors += b'\0' * 32
+
+    directories = [(0, 0)] * 16
+    directories[1] = (alloc(import_descriptors), len(import_descriptors))
+    directories[12] = (_SECTION_RVA, iat_size)
+    if delay_imports:
+        directories[13] = (alloc(delay_descriptors), len(delay_descriptors))
+
+    if is_64bit:
+        optional = struct.pack('<H', 0x20b) + b'\0' * 22 + struct.pack('<Q', image_base) + b'\0' * 76
+    else:
+        optional = struct.pack('<H', 0x10b) + b'\0' * 26 + struct.pack('<I', image_base) + b'\0' * 60
+    optional += struct.pack('<I', 16) + b''.join(struct.pack('<II', *d) for d in directories)
+
+    header = bytearray(b'MZ' + b'\0' * 0x3A + struct.pack('<I', 0x40))
+    header += b'PE\0\0' + struct.pack('<HHIIIHH', 0x8664 if is_64bit else 0x14c, 1, 0, 0, 0, len(optional), 0)
+    header += optional
+    header += b'.idata\0\0' + struct.pack('<IIIIIIHHI', len(section), _SECTION_RVA, len(section),
+                                          _SECTION_OFFSET, 0, 0, 0, 0, 0)
+    assert len(header) <= _SECTION_OFFSET
+    return bytes(header) + b'\0' * (_SECTION_OFFSET - len(header)) + bytes(section)
+
+_IMPORTS = [
+    ('python37.dll', ['PyModule_Create2', 'PyLong_FromLong']),
+    ('KERNEL32.dll', ['GetTickCount']),
+    ('zlib1.dll', ['deflate', 7]),
+    ('ws2_32.dll', [115]),
+]
+
+@pytest.mark.parametrize('is_64bit', [True, False])
+def test_parse(is_64bit):
+    imports = peimports.parse(_pe(_IMPORTS, [('user32.dll', ['MessageBoxW'])], is_64bit=is_64bit))
+    assert imports.is_64bit == is_64bit
+    assert imports.machine == (0x8664 if is_64bit else 0x14c)
+    assert [(d.name, d.functions) for d in imports.imported] == [
+        ('python37.dll', ['PyModule_Create2', 'PyLong_FromLong']),
+        ('KERNEL32.dll', ['GetTickCount']),
+        ('zlib1.dll', ['deflate', '#7']),
+        ('ws2_32.dll', ['#115']),
+    ]
+    assert [(d.name, d.functions) for d in imports.delay_loaded] == [('user32.dll', ['MessageBoxW'])]
+    thunk_size = 8 if is_64bit else 4
+    assert imports.import_table_size == 20 * 5 + thunk_size * 10
+
+def test_parse_file(tmp_path):
+    path = tmp_path / 'spam.pyd'
+    path.write_bytes(_pe(_IMPORTS))
+    imports = peimports.parse(str(path))
+    assert [d.name for d in imports.dlls] == [d for d, _ in _IMPORTS]
+    assert imports.to_dict()['imported']['zlib1.dll'] == ['deflate', '#7']
+    assert imports.to_dict()['delay_loaded'] == {}
+
+@pytest.mark.parametrize('data', [b'', b'MZ' + b'\0' * 0x3E, b'\x7fELF' + b'\0' * 60])
+def test_parse_invalid(data):
+    with pytest.raises(ValueError):
+        peimports.parse(data)
+
+def test_parse_truncated():
+    with pytest.raises(ValueError):
+        peimports.parse(_pe(_IMPORTS)[:_SECTION_OFFSET + 16])
+
+def test_suggest_delay_loads():
+    imports = peimports.parse(_pe(_IMPORTS, [('user32.dll', ['MessageBoxW'])]))
+    # The Python DLL, system DLLs and DLLs that are already delay loaded
+    # are never suggested
+    assert peimports.suggest_delay_loads(imports) == ['zlib1.dll', 'ws2_32.dll']
+    assert peimports.suggest_delay_loads(imports, exclude=('ws2_*.dll',)) == [
+        'python37.dll', 'KERNEL32.dll', 'zlib1.dll']
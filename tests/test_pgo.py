@@ -0,0 +1,76 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import json
+import shutil
+
+import pytest
+
+from pyfindvs.msbuildcompiler.pgo import PGOBuild
+
+# The fingerprint in fixtures/pgo.state.json
+FINGERPRINT = '3f1c9a0e5b7d4f2a8c6e1b9d7a5f3c1e'
+
+@pytest.fixture
+def state_file(tmp_path, fixture_path):
+    # State recorded after a complete PGO build
+    path = str(tmp_path / 'pgo.state.json')
+    shutil.copyfile(fixture_path('pgo.state.json'), path)
+    return path
+
+def _pgo(state_file, fingerprint=FINGERPRINT, has_profile=True, fail=None):
+    calls = []
+    def build(phase):
+        calls.append(phase)
+        if phase == fail:
+            raise RuntimeError(phase)
+    def train():
+        calls.append('train')
+        if fail == 'train':
+            raise RuntimeError('train')
+    return PGOBuild(state_file, fingerprint, build, train, lambda: has_profile), calls
+
+def _saved(state_file):
+    with open(state_file, encoding='utf-8') as f:
+        return json.load(f)
+
+def test_reuses_recorded_profile(state_file):
+    pgo, calls = _pgo(state_file)
+    phases = pgo.run()
+    assert calls == ['optimize']
+    assert [phases[p]['status'] for p in ('instrument', 'train', 'optimize')] == ['reused', 'reused', 'done']
+    assert _saved(state_file)['phases']['train']['status'] == 'reused'
+
+def test_reused_state_is_reused_again(state_file):
+    _pgo(state_file)[0].run()
+    pgo, calls = _pgo(state_file)
+    pgo.run()
+    assert calls == ['optimize']
+
+@pytest.mark.parametrize('kwargs', [{'fingerprint': 'changed'}, {'has_profile': False}])
+def test_runs_all_phases(state_file, kwargs):
+    pgo, calls = _pgo(state_file, **kwargs)
+    phases = pgo.run()
+    assert calls == ['instrument', 'train', 'optimize']
+    assert all(p['status'] == 'done' and p['seconds'] is not None for p in phases.values())
+
+def test_runs_all_phases_without_state(tmp_path):
+    pgo, calls = _pgo(str(tmp_path / 'pgo.state.json'))
+    pgo.run()
+    assert calls == ['instrument', 'train', 'optimize']
+
+def test_failed_phase_is_recorded(state_file):
+    pgo, calls = _pgo(state_file, fingerprint='changed', fail='train')
+    with pytest.raises(RuntimeError):
+        pgo.run()
+    phases = _saved(state_file)['phases']
+    assert [phases[p]['status'] for p in ('instrument', 'train', 'optimize')] == ['done', 'failed', 'pending']
+
+    # A failed training run is never reused
+    pgo, calls = _pgo(state_file, fingerprint='changed')
+    pgo.run()
+    assert calls == ['instrument', 'train', 'optimize']
@@ -0,0 +1,155 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import asyncio
+import json
+import ntpath
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import _support
+from conftest import write_stub_tool
+
+from pyfindvs.msbuildcompiler import MSBuildCompiler
+from pyfindvs.msbuildcompiler.singleflight import SingleFlight, SingleFlightTimeoutError
+
+FINGERPRINT = '0123456789abcdef'
+
+def _write_lock(root, pid, host=None, token='other', age=0):
+    path = os.path.join(str(root), FINGERPRINT + '.lock')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'token': token, 'pid': pid, 'host': host or socket.gethostname(),
+                   'started': time.time()}, f)
+    if age:
+        os.utime(path, (time.time() - age, time.time() - age))
+    return path
+
+def _owner(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def _dead_pid():
+    p = subprocess.Popen([sys.executable, '-c', 'pass'])
+    p.wait()
+    return p.pid
+
+def test_lock_of_dead_process_is_broken(tmp_path):
+    lock = _write_lock(tmp_path, _dead_pid())
+    flight = SingleFlight(str(tmp_path), FINGERPRINT, timeout=5)
+    with flight:
+        assert flight.acquire()
+        assert flight.held
+        assert _owner(lock)['pid'] == os.getpid()
+    assert not os.path.exists(lock)
+
+def test_lock_with_expired_heartbeat_is_broken(tmp_path):
+    # Held by a process on another machine, so only its age is checked
+    lock = _write_lock(tmp_path, os.getpid(), host='elsewhere', age=120)
+    flight = SingleFlight(str(tmp_path), FINGERPRINT, stale_after=60)
+    assert flight._break_stale_lock()
+    assert not os.path.exists(lock)
+    assert [n for n in os.listdir(str(tmp_path)) if n.endswith('.stale')] == []
+
+def test_live_lock_is_not_broken(tmp_path):
+    _write_lock(tmp_path, os.getpid(), host='elsewhere', age=10)
+    assert not SingleFlight(str(tmp_path), FINGERPRINT, stale_after=60)._break_stale_lock()
+
+def test_timeout_while_holder_beats(tmp_path):
+    holder = SingleFlight(str(tmp_path), FINGERPRINT, stale_after=0.5, heartbeat=0.05)
+    assert holder.acquire()
+    try:
+        waiter = SingleFlight(str(tmp_path), FINGERPRINT, timeout=1, stale_after=0.5)
+        start = time.time()
+        with pytest.raises(SingleFlightTimeoutError):
+            waiter.acquire()
+        assert time.time() - start >= 1
+        # The heartbeat kept the lock from looking abandoned
+        assert not waiter.held
+        assert _owner(holder.lock_file)['token'] == holder._token
+    finally:
+        holder.release()
+    assert not os.path.exists(holder.lock_file)
+
+def test_publish_and_fetch(tmp_path):
+    root = str(tmp_path / 'flights')
+    holder = SingleFlight(root, FINGERPRINT)
+    assert holder.acquire()
+
+    waiter = SingleFlight(root, FINGERPRINT, timeout=10)
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(waiter.acquire()))
+    thread.start()
+    time.sleep(0.2)
+
+    output = tmp_path / 'spam.pyd'
+    output.write_bytes(b'spam')
+    (tmp_path / 'spam.pdb').write_bytes(b'pdb')
+    holder.publish([str(output), str(tmp_path / 'spam.pdb')])
+    holder.release()
+    thread.join(10)
+    assert acquired == [False]
+
+    copied = waiter.fetch(str(tmp_path / 'out'))
+    assert [os.path.basename(p) for p in copied] == ['spam.pyd', 'spam.pdb']
+    with open(copied[0], 'rb') as f:
+        assert f.read() == b'spam'
+
+def test_outputs_published_earlier_are_not_reused(tmp_path):
+    flight = SingleFlight(str(tmp_path), FINGERPRINT)
+    assert flight.acquire()
+    output = tmp_path / 'spam.pyd'
+    output.write_bytes(b'spam')
+    flight.publish([str(output)])
+    flight.release()
+    # A later build of the same fingerprint builds again
+    later = SingleFlight(str(tmp_path), FINGERPRINT)
+    assert later.acquire()
+    later.release()
+
+def test_release_leaves_lock_taken_by_another_process(tmp_path):
+    flight = SingleFlight(str(tmp_path), FINGERPRINT)
+    assert flight.acquire()
+    # Another process broke the lock as stale and took it
+    os.unlink(flight.lock_file)
+    lock = _write_lock(tmp_path, os.getpid() + 1, token='other')
+    flight.release()
+    assert _owner(lock)['token'] == 'other'
+
+# Stand-in for msbuild.exe that writes the output named by the project
+_MSBUILD = '''
+import re, sys
+with open(sys.argv[-1], encoding='utf-8') as f:
+    text = f.read()
+prop = lambda n: re.search('<%s>([^<]*)</%s>' % (n, n), text).group(1)
+with open(prop('OutDir') + prop('TargetName') + prop('TargetExt'), 'w') as f:
+    f.write('built')
+'''
+
+def test_link_async_uses_single_flight(tmp_path):
+    if sys.platform == 'win32':
+        pytest.skip('stub tools are shell scripts')
+    _support.patch_discovery(_support.fake_instances(write_stub_tool(tmp_path, 'msbuild', _MSBUILD)))
+    (tmp_path / 'spam.c').write_text('int spam;\n')
+    cc = MSBuildCompiler()
+    cc.single_flight_dir = str(tmp_path / 'flights')
+    cc.initialize('win-amd64')
+    build = str(tmp_path / 'build')
+    objs = cc.compile([str(tmp_path / 'spam.c')], output_dir=build)
+    result = asyncio.run(cc.link_async('shared_object', objs, 'spam.pyd', output_dir=build,
+                                       build_temp=build))
+    assert result.succeeded
+    published = [n for n in os.listdir(cc.single_flight_dir) if not n.endswith('.lock')]
+    assert len(published) == 1
+    with open(os.path.join(cc.single_flight_dir, published[0], 'manifest.json')) as f:
+        files = json.load(f)['files']
+    assert [ntpath.basename(n) for n in files] == ['spam.pyd']
@@ -0,0 +1,52 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import pytest
+
+import _support
+
+from pyfindvs.msbuildcompiler import MSBuildCompiler
+from pyfindvs.msbuildcompiler.template import Template
+
+_LISTS = ['AdditionalIncludeDirectories', 'PreprocessorDefinitions']
+
+def _project(tmp_path, shared_props):
+    cc = MSBuildCompiler()
+    cc.shared_props = shared_props
+    cc.initialize('win-amd64')
+    cc.cl_options._add_opt('AdditionalIncludeDirectories', ['C:\\shared'])
+    cc.cl_options._add_opt('PreprocessorDefinitions', ['SHARED=1'])
+    project, = cc.compile([str(tmp_path / 'spam.c')], output_dir=str(tmp_path / str(shared_props)),
+                          include_dirs=['C:\\inc'], macros=[('SPAM', '1')])
+    return Template(project)
+
+@pytest.fixture(autouse=True)
+def discovery(tmp_path):
+    _support.patch_discovery(_support.fake_instances(str(tmp_path / 'msbuild')))
+
+@pytest.mark.parametrize('item_type', ['ClCompile', 'ResourceCompile', 'Midl'])
+def test_shared_props_effective_values(tmp_path, item_type):
+    shared = _project(tmp_path, True).get_item_definitions(item_type)
+    own = _project(tmp_path, False).get_item_definitions(item_type)
+    assert {n: shared[n] for n in _LISTS} == {n: own[n] for n in _LISTS}
+    if item_type == 'ClCompile':
+        assert shared['AdditionalIncludeDirectories'] == '%(AdditionalIncludeDirectories);C:\\shared;C:\\inc'
+    for name in _LISTS:
+        entries = shared[name].split(';')
+        assert len(entries) == len(set(entries))
+
+def test_shared_props_written_as_additions(tmp_path):
+    t = _project(tmp_path, True)
+    idg = t.root.find('n:ItemDefinitionGroup/n:ClCompile', t._NSD)
+    written = {e.tag.rpartition('}')[2]: e.text for e in idg}
+    # The shared entries are inherited, not repeated
+    assert written == {
+        'AdditionalIncludeDirectories': '%(AdditionalIncludeDirectories);C:\\inc',
+        'PreprocessorDefinitions': '%(PreprocessorDefinitions);SPAM=1',
+    }
+    assert t.get_shared_definitions()['ClCompile']['PreprocessorDefinitions'] == \
+        '%(PreprocessorDefinitions);SHARED=1'
@@ -0,0 +1,73 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import json
+
+import pytest
+
+import _support
+
+from pyfindvs.msbuildcompiler import MSBuildCompiler
+from pyfindvs.toolindex import ToolIndex
+
+VC = 'C:\\VS\\VC\\Tools\\MSVC\\{}\\bin\\'
+
+def _paths(version):
+    vc = VC.format(version)
+    return {
+        'cl.exe': vc + 'HostX86\\x86\\cl.exe',
+        'cl.exe_x64': vc + 'HostX64\\x64\\cl.exe',
+        'cl.exe_x86_64': vc + 'HostX86\\x64\\cl.exe',
+    }
+
+def test_find_by_target():
+    index = ToolIndex.from_known_paths(_paths('14.16.27023'))
+    assert index.find('cl.exe') == VC.format('14.16.27023') + 'HostX86\\x86\\cl.exe'
+    assert index.find('cl.exe', host='x86', target='x64') == VC.format('14.16.27023') + 'HostX86\\x64\\cl.exe'
+    assert index.find('cl.exe', host='x64', target='x64') == VC.format('14.16.27023') + 'HostX64\\x64\\cl.exe'
+    assert index.find('cl.exe', host='x64', target='x86') is None
+
+def test_newest_toolset_preferred():
+    index = ToolIndex()
+    index.add(_paths('14.16.27023'))
+    index.add(_paths('14.20.27508'))
+    assert index.find('cl.exe', host='x64', target='x64').startswith(VC.format('14.20.27508'))
+    assert index.find('cl.exe', min_version=(14, 30)) is None
+
+def test_tools_without_variants_match_any_target():
+    index = ToolIndex.from_known_paths({'WinSDK.um': 'C:\\SDK\\um'})
+    assert index.resolve_platform('win-amd64') == {'WinSDK.um': 'C:\\SDK\\um'}
+
+def test_msbuild_is_host_neutral():
+    index = ToolIndex()
+    index.add({'msbuild.exe_x64': 'C:\\Old\\amd64\\MSBuild.exe'}, (15, 0))
+    index.add({'msbuild.exe': 'C:\\New\\MSBuild.exe'}, (16, 0))
+    # An x86 MSBuild builds x64 targets, so the newer install wins
+    assert index.find('msbuild.exe', target='x64') == 'C:\\New\\MSBuild.exe'
+    assert index.resolve_platform('win-amd64')['msbuild.exe'] == 'C:\\New\\MSBuild.exe'
+
+def test_resolve_platform_rejects_unknown():
+    with pytest.raises(ValueError):
+        ToolIndex().resolve_platform('linux-x86_64')
+
+def test_export_toolchain_lock_writes_resolved_tools(tmp_path, monkeypatch):
+    monkeypatch.delenv('PYFINDVS_TOOLCHAIN_LOCK', raising=False)
+    _support.patch_discovery(_support.fake_instances('C:\\VS\\MSBuild.exe'))
+    cc = MSBuildCompiler()
+    cc.initialize('win-amd64')
+    lock = str(tmp_path / 'toolchain.lock')
+    cc.export_toolchain_lock(lock)
+    with open(lock) as f:
+        tools = json.load(f)['tools']
+    assert tools == {'': cc.tools}
+    assert tools['']['cl.exe'].endswith('HostX64\\x64\\cl.exe')
+
+    locked = MSBuildCompiler()
+    locked.toolchain_lock = lock
+    locked.initialize('win-amd64')
+    assert locked.tools == cc.tools
+    assert locked.msbuild == cc.msbuild
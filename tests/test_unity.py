@@ -0,0 +1,41 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import os
+
+from pyfindvs.msbuildcompiler.unity import plan_batches, write_unity_files
+
+def test_plan_batches(tmp_path):
+    sources = {
+        'a.c': 'static int count;\n#define SIZE 4\n',
+        'b.c': '#define SIZE 4\nint b;\n',
+        'c.c': 'static int\ncount(void) { return 0; }\n',
+        'd.cpp': 'int d;\n',
+        'e.cxx': 'int e;\n',
+        'f.c': 'int f;\n',
+    }
+    for name, text in sources.items():
+        (tmp_path / name).write_text(text)
+    paths = {name: str(tmp_path / name) for name in sources}
+    batches, isolated = plan_batches(list(paths.values()), 3, exclude=['f.c'])
+    # c.c conflicts with the static in a.c
+    assert batches == [('.c', [paths['a.c'], paths['b.c']]), ('.cpp', [paths['d.cpp'], paths['e.cxx']])]
+    assert sorted(isolated) == [paths['c.c'], paths['f.c']]
+
+def test_write_unity_files(tmp_path):
+    batches = [('.c', ['a.c', 'b.c']), ('.cpp', ['d.cpp', 'e.cxx'])]
+    paths = write_unity_files(str(tmp_path / 'unity'), batches)
+    assert [os.path.basename(p) for p in paths] == ['unity_0.c', 'unity_1.cpp']
+    with open(paths[0], encoding='utf-8') as f:
+        assert f.read() == '/* Generated by pyfindvs */\n#include "a.c"\n#include "b.c"\n'
+
+    # Unchanged files are not rewritten, so they are not rebuilt
+    os.utime(paths[0], ns=(0, 0))
+    os.utime(paths[1], ns=(0, 0))
+    write_unity_files(str(tmp_path / 'unity'), [batches[0], ('.cpp', ['d.cpp'])])
+    assert os.stat(paths[0]).st_mtime_ns == 0
+    assert os.stat(paths[1]).st_mtime_ns != 0
@@ -0,0 +1,76 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import os
+import shutil
+
+import pytest
+
+import pyfindvs
+from pyfindvs import _find_vs2017
+
+BUILD_TOOLS = 'C:\\Program Files (x86)\\Microsoft Visual Studio\\2017\\BuildTools'
+
+@pytest.fixture
+def instances_dir(tmp_path, fixture_path):
+    # Recorded installer state: a Build Tools install, an IDE install
+    # with only a French title, and an install that has not finished
+    path = str(tmp_path / 'Packages' / '_Instances')
+    shutil.copytree(fixture_path('vs_instances'), path)
+    return path
+
+def test_read_state(fixture_path):
+    record = _find_vs2017.read_state(fixture_path('vs_instances', '3f6a1c9e', 'state.json'))
+    instance_id, name, version, path, packages = record
+    assert (instance_id, name, version, path) == (
+        '3f6a1c9e', 'Visual Studio Build Tools 2017', '15.9.28307.586', BUILD_TOOLS)
+    assert packages[:2] == ['Microsoft.VisualStudio.Product.BuildTools', 'Microsoft.Build']
+    # Packages without an id are skipped
+    assert len(packages) == 5
+
+def test_read_state_of_unfinished_install(fixture_path):
+    assert _find_vs2017.read_state(fixture_path('vs_instances', 'deadbeef', 'state.json')) is None
+
+def test_findall(instances_dir):
+    instances = _find_vs2017.findall(instances_dir)
+    assert [(i.instance_id, i.name, i.version) for i in instances] == [
+        ('3f6a1c9e', 'Visual Studio Build Tools 2017', '15.9.28307.586'),
+        ('a1b2c3d4', 'Visual Studio Community 2019', '16.0.28803.202'),
+    ]
+    assert 'Microsoft.Build' in instances[1].packages
+
+def test_findall_without_directory(tmp_path):
+    assert _find_vs2017.findall(str(tmp_path / 'missing')) is None
+
+def test_broken_state_files_are_skipped(instances_dir):
+    os.makedirs(os.path.join(instances_dir, '00000000'))
+    with open(os.path.join(instances_dir, '00000000', 'state.json'), 'w') as f:
+        f.write('{"installationPath": ')
+    os.makedirs(os.path.join(instances_dir, '11111111'))
+    assert len(_find_vs2017.findall(instances_dir)) == 2
+
+def test_unchanged_state_is_not_parsed_again(instances_dir, monkeypatch):
+    list(_find_vs2017.iterstates(instances_dir))
+    parsed = []
+    read_state = _find_vs2017.read_state
+    monkeypatch.setattr(_find_vs2017, 'read_state', lambda *a: parsed.append(a) or read_state(*a))
+    assert len(list(_find_vs2017.iterstates(instances_dir))) == 2
+    assert parsed == []
+
+    state = os.path.join(instances_dir, 'a1b2c3d4', 'state.json')
+    with open(state, 'a') as f:
+        f.write('\n')
+    list(_find_vs2017.iterstates(instances_dir))
+    assert [os.path.basename(os.path.dirname(a[0])) for a in parsed] == ['a1b2c3d4']
+
+def test_iterinstances_reads_program_data(tmp_path, instances_dir, monkeypatch):
+    program_data = tmp_path / 'ProgramData'
+    shutil.copytree(instances_dir, str(program_data / 'Microsoft' / 'VisualStudio' / 'Packages' / '_Instances'))
+    monkeypatch.setenv('ProgramData', str(program_data))
+    found = list(pyfindvs.iterinstances(reset_cache=True))
+    assert [i.instance_id for i in found][:2] == ['3f6a1c9e', 'a1b2c3d4']
+    assert pyfindvs.findall()[:2] == found[:2]
@@ -0,0 +1,76 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+from distutils.dist import Distribution
+
+import pytest
+from setuptools import Extension
+
+from pyfindvs.msbuildcompiler import MSBuildCompiler
+from pyfindvs.msbuildcompiler.depends import DependencyDatabase
+from pyfindvs.msbuildcompiler.watch import FileWatcher, watch
+
+def test_file_watcher_polls(tmp_path):
+    spam, eggs = tmp_path / 'spam.c', tmp_path / 'eggs.c'
+    spam.write_text('int spam;\n')
+    eggs.write_text('int eggs;\n')
+    watcher = FileWatcher(interval=0.01, debounce=0.01, native=False)
+    watcher.watch({str(spam), str(eggs), str(tmp_path / 'missing.h')})
+    eggs.write_text('int eggs = 1;\n')
+    (tmp_path / 'missing.h').write_text('')
+    changed, first = watcher.wait()
+    assert changed == {str(eggs), str(tmp_path / 'missing.h')}
+    # Files that are still watched keep their state
+    watcher.watch({str(spam), str(eggs)})
+    spam.write_text('int spam = 1;\n')
+    assert watcher.wait()[0] == {str(spam)}
+
+@pytest.fixture
+def rebuild(tmp_path, monkeypatch):
+    # Runs the watch command with a build profile until the first
+    # rebuild after *name* changes, and returns the rebuilt extensions
+    for name in ('a.c', 'b.c', 'a.h', 'b.txt'):
+        (tmp_path / name).write_text('\n')
+    dist = Distribution({'ext_modules': [
+        Extension('a', [str(tmp_path / 'a.c')]),
+        Extension('b', [str(tmp_path / 'b.c')], depends=[str(tmp_path / 'b.txt')]),
+    ]})
+    build_ext = dist.get_command_obj('build_ext')
+    build_ext.build_temp = str(tmp_path / 'build')
+    compiler = MSBuildCompiler()
+    compiler.build_profile = 'fast'
+    db = DependencyDatabase.load(compiler._int_dir(build_ext.build_temp))
+    db.record(str(tmp_path / 'a.c'), [str(tmp_path / 'a.h')])
+    db.save()
+
+    rebuilt = []
+    def build_extension(ext):
+        rebuilt.append(ext.name)
+        raise KeyboardInterrupt
+    monkeypatch.setattr(build_ext, 'run', lambda: setattr(build_ext, 'compiler', compiler))
+    monkeypatch.setattr(build_ext, 'build_extension', build_extension)
+
+    def run(name):
+        start_watching = FileWatcher.watch
+        def watch_then_change(self, paths):
+            assert str(tmp_path / name) in paths
+            start_watching(self, paths)
+            (tmp_path / name).write_text('int changed;\n')
+        monkeypatch.setattr(FileWatcher, 'watch', watch_then_change)
+        cmd = watch(dist)
+        cmd.interval = cmd.debounce = '0.01'
+        cmd.poll = 1
+        cmd.ensure_finalized()
+        cmd.run()
+        return rebuilt
+    return run
+
+@pytest.mark.parametrize('name, extensions', [
+    ('a.c', ['a']), ('a.h', ['a']), ('b.c', ['b']), ('b.txt', ['b']),
+])
+def test_rebuilds_affected_extension(rebuild, name, extensions):
+    assert rebuild(name) == extensions
@@ -0,0 +1,73 @@
+#-------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation
+# All rights reserved.
+#
+# Distributed under the terms of the MIT License
+#-------------------------------------------------------------------------
+
+import json
+import os
+
+import pytest
+
+from pyfindvs._find_winsdk import SDKIndex
+
+@pytest.fixture
+def kits_root(tmp_path, fixture_path):
+    # Recreates the files listed in a recorded Windows Kits 10 tree
+    root = tmp_path / 'Windows Kits' / '10'
+    with open(fixture_path('winkits10.json'), encoding='utf-8') as f:
+        files = json.load(f)['files']
+    for name in files:
+        path = root.joinpath(*name.split('/'))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'')
+    return str(root)
+
+def _path(root, *names):
+    return os.path.join(root, *names)
+
+def test_versions(kits_root):
+    index = SDKIndex.scan(kits_root)
+    # Include\wdf is not a version
+    assert index.versions == ['10.0.17763.0', '10.0.17134.0']
+    assert index.latest == '10.0.17763.0'
+    assert len(index) == 2 and '10.0.17134.0' in index
+
+def test_known_paths_of_latest(kits_root):
+    assert SDKIndex.scan(kits_root).known_paths() == {
+        'WinSDK.ucrt': _path(kits_root, 'Include', '10.0.17763.0', 'ucrt'),
+        'WinSDK.um': _path(kits_root, 'Include', '10.0.17763.0', 'um'),
+        'WinSDK.shared': _path(kits_root, 'Include', '10.0.17763.0', 'shared'),
+        'WinSDK.libucrt_x64': _path(kits_root, 'Lib', '10.0.17763.0', 'ucrt', 'x64'),
+        'WinSDK.lib_x64': _path(kits_root, 'Lib', '10.0.17763.0', 'um', 'x64'),
+        # Versioned tools replace those in the unversioned bin directory
+        'rc.exe': _path(kits_root, 'bin', '10.0.17763.0', 'x86', 'rc.exe'),
+        'rc.exe_x64': _path(kits_root, 'bin', '10.0.17763.0', 'x64', 'rc.exe'),
+        'signtool.exe': _path(kits_root, 'bin', '10.0.17763.0', 'x86', 'signtool.exe'),
+        'midl.exe_x64': _path(kits_root, 'bin', '10.0.17763.0', 'x64', 'midl.exe'),
+        'mc.exe': _path(kits_root, 'bin', 'x86', 'mc.exe'),
+    }
+
+def test_known_paths_of_older_version(kits_root):
+    paths = SDKIndex.scan(kits_root).known_paths('10.0.17134.0')
+    assert paths['WinSDK.lib'] == _path(kits_root, 'Lib', '10.0.17134.0', 'um', 'x86')
+    assert paths['WinSDK.libucrt'] == _path(kits_root, 'Lib', '10.0.17134.0', 'ucrt', 'x86')
+    assert paths['rc.exe'] == _path(kits_root, 'bin', 'x86', 'rc.exe')
+    assert paths['rc.exe_x64'] == _path(kits_root, 'bin', 'x64', 'rc.exe')
+    assert 'signtool.exe' not in paths
+
+def test_instances(kits_root):
+    instances = SDKIndex.scan(kits_root).instances()
+    assert [(i.instance_id, i.version) for i in instances] == [
+        ('winsdk10', '10.0.17763.0'), ('winsdk10', '10.0.17134.0')]
+    assert instances[0].version_info == (10, 0, 17763, 0)
+    assert 'WinSDK' in instances[0].packages
+
+def test_unknown_version(kits_root):
+    with pytest.raises(KeyError):
+        SDKIndex.scan(kits_root).known_paths('10.0.10240.0')
+
+def test_missing_root(tmp_path):
+    index = SDKIndex.scan(str(tmp_path / 'missing'))
+    assert len(index) == 0 and index.latest is None and index.instances() == []